@@ -35,6 +35,14 @@ def get_reaction_enum():
     return import_string(settings.COMMENTS_XTD_REACTION_ENUM)
 
 
+def get_tree_backend():
+    """Returns an instance of the backend that stores the comment threads."""
+    from django.utils.module_loading import import_string
+    from django_comments_xtd.conf import settings
+
+    return import_string(settings.COMMENTS_XTD_TREE_BACKEND)()
+
+
 def get_flag_url(comment):
     """Get the URL for the "flag this comment" view."""
     from django.urls import reverse
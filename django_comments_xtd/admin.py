@@ -4,7 +4,11 @@ from django_comments import get_model
 from django_comments.admin import CommentsAdmin
 from django_comments.models import CommentFlag
 
-from django_comments_xtd.models import BlackListedDomain, XtdComment
+from django_comments_xtd.models import (
+    BlackListedDomain,
+    FollowupNotification,
+    XtdComment,
+)
 
 
 class XtdCommentsAdmin(CommentsAdmin):
@@ -78,7 +82,21 @@ class BlackListedDomainAdmin(admin.ModelAdmin):
     search_fields = ["domain"]
 
 
+class FollowupNotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "comment",
+        "follower_comment",
+        "created",
+        "send_after",
+        "attempts",
+        "failed",
+    )
+    list_filter = ("failed",)
+    raw_id_fields = ("comment", "follower_comment")
+
+
 if get_model() is XtdComment:
     admin.site.register(XtdComment, XtdCommentsAdmin)
     admin.site.register(CommentFlag)
     admin.site.register(BlackListedDomain, BlackListedDomainAdmin)
+    admin.site.register(FollowupNotification, FollowupNotificationAdmin)
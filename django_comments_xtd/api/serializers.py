@@ -1,17 +1,23 @@
+from collections import defaultdict
 from typing import ClassVar
 
+from asgiref.sync import sync_to_async
 from django.apps import apps
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
-from django.utils import formats, timezone
+from django.db.models import F, QuerySet, Window
+from django.db.models.functions import RowNumber
+from django.urls import NoReverseMatch, reverse
+from django.utils import dateformat, formats, timezone
+from django.utils.functional import cached_property
 from django.utils.html import escape
-from django.utils.translation import activate, get_language
 from django.utils.translation import gettext as _
 from django_comments import get_form
 from django_comments.forms import CommentSecurityForm
 from django_comments.models import CommentFlag
 from django_comments.signals import comment_was_posted, comment_will_be_posted
-from rest_framework import exceptions, serializers
+from rest_framework import ISO_8601, exceptions, serializers
 
 from django_comments_xtd import get_model, get_reaction_enum, signed
 from django_comments_xtd.conf import settings
@@ -203,10 +209,8 @@ class WriteCommentSerializer(serializers.Serializer):
                 else:
                     resp["code"] = 202
         else:
-            key = signed.dumps(
-                resp["comment"],
-                compress=True,
-                extra_key=settings.COMMENTS_XTD_SALT,
+            key = signed.dumps_comment(
+                resp["comment"], extra_key=settings.COMMENTS_XTD_SALT
             )
             send_email_confirmation_request(resp["comment"], key, site)
             resp["code"] = 204  # Confirmation sent by mail.
@@ -236,7 +240,7 @@ class ReadReactionsField(serializers.RelatedField):
     def to_representation(self, value):
         reaction_item = get_reaction_enum()(value.reaction)
         max_users_listed = getattr(
-            settings, "COMMENTS_INK_MAX_USERS_IN_TOOLTIP", 10
+            settings, "COMMENTS_XTD_MAX_USERS_IN_TOOLTIP", 10
         )
         return {
             "reaction": value.reaction,
@@ -248,7 +252,7 @@ class ReadReactionsField(serializers.RelatedField):
                     "id": author.id,
                     "author": settings.COMMENTS_XTD_FN_USER_REPR(author),
                 }
-                for author in value.authors.all()[:max_users_listed]
+                for author in value.get_listed_authors(max_users_listed)
             ],
         }
 
@@ -283,20 +287,77 @@ class ReadCommentSerializer(serializers.ModelSerializer):
             "reactions",
         )
 
+    # Digits that replace the arguments of the URL `comments-url-redirect`
+    # to build the template of the permalinks.
+    permalink_sentinels: ClassVar[dict[str, str]] = {
+        "content_type_id": "900000001",
+        "object_pk": "900000002",
+        "id": "900000003",
+    }
+
     def __init__(self, *args, **kwargs):
         self.request = kwargs["context"]["request"]
         super().__init__(*args, **kwargs)
 
-    def get_submit_date(self, obj):
-        activate(get_language())
+    @cached_property
+    def datetime_format(self):
+        """
+        The format of `submit_date`, resolved once per serializer, rather
+        than once per comment, for the active language.
+        """
+        return settings.COMMENTS_XTD_API_DATETIME_FORMAT or formats.get_format(
+            "DATETIME_FORMAT", use_l10n=True
+        )
+
+    @cached_property
+    def permalink_template(self):
+        """
+        Returns the permalink of comments as a format string, reversing the
+        URL only once per serializer. Returns None when the URL can't be
+        turned into a template.
+        """
+        sentinels = self.permalink_sentinels
+        try:
+            url = reverse(
+                "comments-url-redirect", args=list(sentinels.values())
+            )
+        except NoReverseMatch:
+            return None
+        if any(url.count(digits) != 1 for digits in sentinels.values()):
+            return None
+        url = url.replace("{", "{{").replace("}", "}}")
+        for name, digits in sentinels.items():
+            url = url.replace(digits, f"{{{name}}}")
+        return url + "#comment-{id}"
+
+    def format_submit_date(self, submit_date):
         if settings.USE_TZ:
-            submit_date = timezone.localtime(obj.submit_date)
-        else:
-            submit_date = obj.submit_date
-        return formats.date_format(
-            submit_date, "DATETIME_FORMAT", use_l10n=True
+            submit_date = timezone.localtime(submit_date)
+        if self.datetime_format == ISO_8601:
+            return submit_date.isoformat()
+        return dateformat.format(submit_date, self.datetime_format)
+
+    def format_permalink(self, content_type_id, object_pk, comment_id):
+        # Only digits can take the place of the sentinels as they are.
+        # Other values are checked and quoted by reverse().
+        object_pk = str(object_pk)
+        if self.permalink_template is None or not (
+            object_pk.isascii() and object_pk.isdigit()
+        ):
+            return (
+                reverse(
+                    "comments-url-redirect",
+                    args=(content_type_id, object_pk, comment_id),
+                )
+                + f"#comment-{comment_id}"
+            )
+        return self.permalink_template.format(
+            content_type_id=content_type_id, object_pk=object_pk, id=comment_id
         )
 
+    def get_submit_date(self, obj):
+        return self.format_submit_date(obj.submit_date)
+
     def get_comment(self, obj):
         if obj.is_removed:
             return _("This comment has been removed.")
@@ -307,20 +368,224 @@ class ReadCommentSerializer(serializers.ModelSerializer):
         return obj.allow_thread()
 
     def get_permalink(self, obj):
-        return obj.get_absolute_url()
+        # Comment models may build their own permalinks.
+        if type(obj).get_absolute_url is not XtdComment.get_absolute_url:
+            return obj.get_absolute_url()
+        return self.format_permalink(obj.content_type_id, obj.object_pk, obj.pk)
 
     def get_flags(self, obj):
-        qs = obj.flags.filter(flag=CommentFlag.SUGGEST_REMOVAL)
         return [
             {
                 "flag": "removal",
-                "user": settings.COMMENTS_XTD_FN_USER_REPR(flag.user),
-                "id": flag.user.id,
+                "user": settings.COMMENTS_XTD_FN_USER_REPR(user),
+                "id": user.id,
             }
-            for flag in qs
+            for user in obj.get_flags()["users"]
         ]
 
 
+class ValuesCommentListSerializer(serializers.ListSerializer):
+    """
+    Serializes a queryset of comments into the same data as a list of
+    `ReadCommentSerializer`, reading the comments, their flags and their
+    reactions with `values()` queries, instead of building model instances.
+    Comments are read in chunks of `chunk_size` comments, and flags and
+    reactions with a few queries per chunk. `aiter_representation` reads
+    them with the async ORM.
+    """
+
+    chunk_size = 2000
+    comment_fields = (
+        "id",
+        "user_name",
+        "user_url",
+        "content_type_id",
+        "object_pk",
+        "comment",
+        "submit_date",
+        "parent_id",
+        "level",
+        "is_removed",
+    )
+
+    def to_representation(self, data):
+        if not isinstance(data, QuerySet):
+            return super().to_representation(data)
+        return list(self.iter_representation(data))
+
+    def iter_representation(self, queryset, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        # Comment models may build their own permalinks.
+        if queryset.model.get_absolute_url is not XtdComment.get_absolute_url:
+            objects = queryset.iterator(chunk_size=chunk_size)
+            for obj in objects:
+                yield self.child.to_representation(obj)
+            return
+
+        rows = (
+            queryset.prefetch_related(None)
+            .values(*self.comment_fields)
+            .iterator(chunk_size=chunk_size)
+        )
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield from self.chunk_to_representation(chunk)
+                chunk = []
+        yield from self.chunk_to_representation(chunk)
+
+    async def aiter_representation(self, queryset, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        # Comment models may build their own permalinks, with the sync ORM.
+        if queryset.model.get_absolute_url is not XtdComment.get_absolute_url:
+            items = await sync_to_async(list)(
+                self.iter_representation(queryset, chunk_size)
+            )
+            for item in items:
+                yield item
+            return
+
+        rows = (
+            queryset.prefetch_related(None)
+            .values(*self.comment_fields)
+            .aiterator(chunk_size=chunk_size)
+        )
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                for item in await self.achunk_to_representation(chunk):
+                    yield item
+                chunk = []
+        for item in await self.achunk_to_representation(chunk):
+            yield item
+
+    def get_flags_queryset(self, comment_ids):
+        return (
+            CommentFlag.objects.filter(
+                comment_id__in=comment_ids, flag=CommentFlag.SUGGEST_REMOVAL
+            )
+            .order_by("pk")
+            .values_list("comment_id", "user_id")
+        )
+
+    def get_reactions_queryset(self, comment_ids):
+        return (
+            CommentReaction.objects.filter(comment_id__in=comment_ids)
+            .order_by("reaction")
+            .values_list("id", "comment_id", "reaction", "counter")
+        )
+
+    def get_authors_queryset(self, reactions):
+        max_users_listed = getattr(
+            settings, "COMMENTS_XTD_MAX_USERS_IN_TOOLTIP", 10
+        )
+        return (
+            CommentReactionAuthor.objects.filter(
+                reaction_id__in=[reaction[0] for reaction in reactions]
+            )
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=[F("reaction_id")],
+                    order_by=F("author_id").asc(),
+                )
+            )
+            .filter(position__lte=max_users_listed)
+            .order_by("reaction_id", "author_id")
+            .values_list("reaction_id", "author_id")
+        )
+
+    def chunk_to_representation(self, chunk):
+        if not chunk:
+            return
+        comment_ids = [row["id"] for row in chunk]
+        flags = list(self.get_flags_queryset(comment_ids))
+        reactions = list(self.get_reactions_queryset(comment_ids))
+        authors = list(self.get_authors_queryset(reactions))
+        users = get_user_model().objects.in_bulk(
+            {pair[1] for pair in flags + authors}
+        )
+        yield from self.rows_to_representation(
+            chunk, flags, reactions, authors, users
+        )
+
+    async def achunk_to_representation(self, chunk):
+        if not chunk:
+            return []
+        comment_ids = [row["id"] for row in chunk]
+        flags = [flag async for flag in self.get_flags_queryset(comment_ids)]
+        reactions = [
+            reaction
+            async for reaction in self.get_reactions_queryset(comment_ids)
+        ]
+        authors = [
+            author async for author in self.get_authors_queryset(reactions)
+        ]
+        users = await get_user_model().objects.ain_bulk(
+            {pair[1] for pair in flags + authors}
+        )
+        return list(
+            self.rows_to_representation(chunk, flags, reactions, authors, users)
+        )
+
+    def rows_to_representation(self, chunk, flags, reactions, authors, users):
+        user_repr = {
+            user_id: settings.COMMENTS_XTD_FN_USER_REPR(user)
+            for user_id, user in users.items()
+        }
+
+        flags_map = defaultdict(list)
+        for comment_id, user_id in flags:
+            flags_map[comment_id].append(
+                {"flag": "removal", "user": user_repr[user_id], "id": user_id}
+            )
+        authors_map = defaultdict(list)
+        for reaction_id, user_id in authors:
+            authors_map[reaction_id].append(
+                {"id": user_id, "author": user_repr[user_id]}
+            )
+        reactions_map = defaultdict(list)
+        for reaction_id, comment_id, reaction, counter in reactions:
+            reaction_item = get_reaction_enum()(reaction)
+            reactions_map[comment_id].append(
+                {
+                    "reaction": reaction,
+                    "label": reaction_item.label,
+                    "icon": reaction_item.icon,
+                    "counter": counter,
+                    "authors": authors_map[reaction_id],
+                }
+            )
+
+        child = self.child
+        for row in chunk:
+            max_thread_level = get_max_thread_level(
+                ContentType.objects.get_for_id(row["content_type_id"])
+            )
+            yield {
+                "id": row["id"],
+                "user_name": row["user_name"],
+                "user_url": row["user_url"],
+                "permalink": child.format_permalink(
+                    row["content_type_id"], row["object_pk"], row["id"]
+                ),
+                "comment": (
+                    _("This comment has been removed.")
+                    if row["is_removed"]
+                    else row["comment"]
+                ),
+                "submit_date": child.format_submit_date(row["submit_date"]),
+                "parent_id": row["parent_id"],
+                "level": row["level"],
+                "is_removed": row["is_removed"],
+                "allow_reply": row["level"] < max_thread_level,
+                "flags": flags_map[row["id"]],
+                "reactions": reactions_map[row["id"]],
+            }
+
+
 class WriteCommentReactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = CommentReaction
@@ -1,14 +1,27 @@
 from django.urls import path, re_path
 
+from django_comments_xtd.conf import settings
+
 from .views import (
+    AsyncCommentCount,
+    AsyncCommentList,
     CommentCount,
+    CommentCounts,
     CommentCreate,
+    CommentExport,
     CommentList,
     CommentReactionAuthorsList,
     CreateReportFlag,
     PostCommentReaction,
 )
 
+if settings.COMMENTS_XTD_ASYNC_VIEWS:
+    comment_list_view = AsyncCommentList.as_view()
+    comment_count_view = AsyncCommentCount.as_view()
+else:
+    comment_list_view = CommentList.as_view()
+    comment_count_view = CommentCount.as_view()
+
 urlpatterns = [
     path("comment/", CommentCreate.as_view(), name="comments-xtd-api-create"),
     path(
@@ -17,25 +30,37 @@ urlpatterns = [
         name="comments-xtd-api-react",
     ),
     path("flag/", CreateReportFlag.as_view(), name="comments-xtd-api-flag"),
+    # Number of comments sent to many objects, given in the query string.
+    path(
+        "counts/",
+        CommentCounts.as_view(),
+        name="comments-xtd-api-counts",
+    ),
     re_path(
         r"^(?P<comment_pk>[\d]+)/(?P<reaction_value>[\w\+\-]+)/$",
         CommentReactionAuthorsList.as_view(),
         name="comments-xtd-comment-reaction-authors",
     ),
     # -----------------------------------------------------------------
-    # The following 3 re_path entries read the content type as
+    # The following 4 re_path entries read the content type as
     # <applabel>-<model>, and the object ID to which comments
     # have been sent.
     # List the comments sent to the <ctype>/<object_pk>.
     re_path(
         r"^(?P<content_type>\w+[-]{1}\w+)/(?P<object_pk>[-\w]+)/$",
-        CommentList.as_view(),
+        comment_list_view,
         name="comments-xtd-api-list",
     ),
+    # Stream all the comments sent to the <ctype>/<object_pk>.
+    re_path(
+        r"^(?P<content_type>\w+[-]{1}\w+)/(?P<object_pk>[-\w]+)/export/$",
+        CommentExport.as_view(),
+        name="comments-xtd-api-export",
+    ),
     # Number of comments sent to the <ctype>/<object_pk>.
     re_path(
         r"^(?P<content_type>\w+[-]{1}\w+)/(?P<object_pk>[-\w]+)/count/$",
-        CommentCount.as_view(),
+        comment_count_view,
         name="comments-xtd-api-count",
     ),
 ]
@@ -1,17 +1,43 @@
+import binascii
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from asgiref.sync import sync_to_async
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import F
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy as _
+from django.views.generic import View
 from django_comments.views.moderation import perform_flag
 from rest_framework import generics, mixins, permissions, status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.schemas.openapi import AutoSchema as DRFAutoSchema
+from rest_framework.utils import encoders
+from rest_framework.utils.urls import replace_query_param
 
-from django_comments_xtd import get_model
+from django_comments_xtd import get_model, get_tree_backend
 from django_comments_xtd.api import serializers
 from django_comments_xtd.conf import settings
-from django_comments_xtd.models import CommentReaction
-from django_comments_xtd.utils import check_option, get_current_site_id
+from django_comments_xtd.models import (
+    CommentObjectStats,
+    CommentReaction,
+    get_comment_counts,
+)
+from django_comments_xtd.signals import comment_got_a_reaction
+from django_comments_xtd.utils import (
+    check_option,
+    get_current_site_id,
+    get_list_order,
+)
 
 try:  # pragma: no cover
     from drf_spectacular.openapi import AutoSchema as SpectacularAutoSchema
@@ -71,36 +97,351 @@ class CommentCreate(generics.CreateAPIView):
         self.resp_dict = serializer.save()
 
 
-class CommentList(generics.ListAPIView):
-    """List all comments for a given ContentType and object ID."""
+class ThreadCursorPagination(BasePagination):
+    """
+    Paginate comment lists with a cursor, putting whole top-level threads
+    in every page. The cursor holds the ID of the first or the last thread
+    of a page, so pages don't change while new comments are posted.
+
+    Threads are listed by ID, in the direction given by `thread__id` in the
+    list order. Comments within each thread keep the order of the tree.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def get_page_size(self, request):
+        return settings.COMMENTS_XTD_API_THREADS_PER_PAGE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        thread_qs = self.get_thread_queryset(queryset, request, view)
+        if thread_qs is None:
+            return None
+        thread_ids = list(thread_qs[: self.page_size + 1])
+        return self.get_page_queryset(queryset, thread_ids)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of `paginate_queryset`."""
+        thread_qs = self.get_thread_queryset(queryset, request, view)
+        if thread_qs is None:
+            return None
+        thread_ids = [
+            thread_id async for thread_id in thread_qs[: self.page_size + 1]
+        ]
+        return self.get_page_queryset(queryset, thread_ids)
+
+    def get_thread_queryset(self, queryset, request, view=None):
+        """
+        Returns the queryset of the thread IDs from the cursor on, in the
+        order of the list, or None when comments are not paginated.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        # The view orders the comments with the list order of their model.
+        get_content_type = getattr(view, "get_content_type", None)
+        content_type = get_content_type() if get_content_type else None
+        self.descending = "-thread__id" in get_list_order(content_type)
+        self.cursor = cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[1]
+
+        # Scan the threads forwards, or backwards for the previous page.
+        if self.descending != reverse:
+            lookup, thread_order = "thread_id__lt", "-thread_id"
+        else:
+            lookup, thread_order = "thread_id__gt", "thread_id"
+        thread_qs = (
+            queryset.prefetch_related(None)
+            .order_by(thread_order)
+            .values_list("thread_id", flat=True)
+            .distinct()
+        )
+        if cursor is not None:
+            thread_qs = thread_qs.filter(**{lookup: cursor[0]})
+        return thread_qs
+
+    def get_page_queryset(self, queryset, thread_ids):
+        cursor = self.cursor
+        reverse = cursor is not None and cursor[1]
+        has_more = len(thread_ids) > self.page_size
+        thread_ids = thread_ids[: self.page_size]
+        if reverse:
+            thread_ids.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.thread_ids = thread_ids
+
+        thread_key = "-thread__id" if self.descending else "thread__id"
+        return queryset.filter(thread_id__in=thread_ids).order_by(
+            thread_key, get_tree_backend().order_field
+        )
+
+    def decode_cursor(self, request):
+        """Returns a tuple (thread_id, reverse), or None for the 1st page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            thread_id = int(tokens["t"][0])
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message) from None
+        return thread_id, reverse
+
+    def encode_cursor(self, thread_id, reverse):
+        tokens = {"t": thread_id}
+        if reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.thread_ids:
+            return None
+        return self.encode_cursor(self.thread_ids[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.thread_ids:
+            return None
+        return self.encode_cursor(self.thread_ids[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+
+def dumps_item(data):
+    """Returns the compact JSON of an item of a streamed list."""
+    return json.dumps(
+        data,
+        cls=encoders.JSONEncoder,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+class StreamingListMixin:
+    """
+    Write the list of serialized objects to a `StreamingHttpResponse`, as a
+    JSON array, one item at a time. The queryset is read in chunks of
+    `COMMENTS_XTD_API_STREAM_CHUNK_SIZE` rows, so that the memory used
+    doesn't grow with the number of objects.
+    """
+
+    def iter_representation(self, queryset, chunk_size):
+        serializer = self.get_serializer(many=True)
+        if hasattr(serializer, "iter_representation"):
+            yield from serializer.iter_representation(queryset, chunk_size)
+        else:
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                yield serializer.child.to_representation(obj)
+
+    def stream_list(self, queryset):
+        chunk_size = settings.COMMENTS_XTD_API_STREAM_CHUNK_SIZE
+        # The response is consumed after the view returns.
+        language = translation.get_language()
+
+        def stream():
+            yield "["
+            with translation.override(language):
+                items = self.iter_representation(queryset, chunk_size)
+                for index, data in enumerate(items):
+                    item = dumps_item(data)
+                    yield f",{item}" if index else item
+            yield "]"
+
+        return StreamingHttpResponse(stream(), content_type="application/json")
+
+
+def get_content_type(content_type_arg):
+    """Returns the ContentType of an `<app_label>-<model>` arg, or None."""
+    app_label, model = content_type_arg.split("-")
+    try:
+        return ContentType.objects.get_by_natural_key(app_label, model)
+    except ContentType.DoesNotExist:
+        return None
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests using the `CommentObjectStats` of the
+    object the comments are posted to. Its `last_modified` date changes with
+    every change in the comments of the object or in their feedback, so
+    unchanged content gets a `304 Not Modified` response without querying
+    or serializing comments. Objects without stats are served as usual.
+    """
+
+    conditional_get = True
+
+    def get_object_stats(self):
+        """
+        Returns the `CommentObjectStats` of the object given by the URL
+        arguments `content_type`, as `<app_label>-<model>`, and `object_pk`,
+        or None. Views with other URL arguments override it.
+        """
+        content_type_arg = self.kwargs.get("content_type", None)
+        if content_type_arg is None:
+            return None
+        content_type = get_content_type(content_type_arg)
+        if content_type is None:
+            return None
+        return CommentObjectStats.objects.filter(
+            content_type=content_type,
+            object_pk=self.kwargs.get("object_pk", None),
+            site_id=get_current_site_id(self.request),
+        ).first()
+
+    def get_etag(self, stats):
+        request = self.request
+        key = "|".join(
+            [
+                str(stats.pk),
+                stats.last_modified.isoformat(),
+                request.get_full_path(),
+                request.META.get("HTTP_ACCEPT", ""),
+                translation.get_language() or "",
+            ]
+        )
+        return f'"{hashlib.md5(key.encode("utf-8")).hexdigest()}"'
+
+    def get_not_modified_response(self, stats):
+        """Returns a 304 response, or None if the content has changed."""
+        return get_conditional_response(
+            self.request,
+            etag=self.get_etag(stats),
+            last_modified=int(stats.last_modified.timestamp()),
+        )
+
+    def set_validators(self, response, stats):
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response.headers.setdefault("ETag", self.get_etag(stats))
+            response.headers.setdefault(
+                "Last-Modified",
+                http_date(int(stats.last_modified.timestamp())),
+            )
+        return response
+
+    def get(self, request, *args, **kwargs):
+        stats = self.get_object_stats() if self.conditional_get else None
+        if stats is None:
+            return super().get(request, *args, **kwargs)
+
+        response = self.get_not_modified_response(stats)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return self.set_validators(response, stats)
+
+
+class CommentList(
+    ConditionalGetMixin, StreamingListMixin, generics.ListAPIView
+):
+    """
+    List all comments for a given ContentType and object ID. The list is
+    streamed when the query string contains `stream=1`.
+    """
 
     serializer_class = serializers.ReadCommentSerializer
     permission_classes = (permissions.AllowAny,)
+    pagination_class = ThreadCursorPagination
+
+    def get_content_type(self):
+        return get_content_type(self.kwargs.get("content_type", None))
 
     def get_queryset(self, **kwargs):
-        content_type_arg = self.kwargs.get("content_type", None)
-        object_pk_arg = self.kwargs.get("object_pk", None)
-        app, model = content_type_arg.split("-")
-        site_id = get_current_site_id(self.request)
-        try:
-            content_type = ContentType.objects.get_by_natural_key(app, model)
-        except ContentType.DoesNotExist:
+        content_type = self.get_content_type()
+        if content_type is None:
             return XtdComment.objects.none()
-        else:
-            return XtdComment.get_queryset(
+        return XtdComment.get_queryset(
+            content_type=content_type,
+            object_pk=self.kwargs.get("object_pk", None),
+            site_id=get_current_site_id(self.request),
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get("many") and settings.COMMENTS_XTD_API_VALUES_SERIALIZER:
+            kwargs.pop("many")
+            context = self.get_serializer_context()
+            return serializers.ValuesCommentListSerializer(
+                *args,
+                child=self.get_serializer_class()(context=context),
+                context=context,
+                **kwargs,
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") in ("1", "true"):
+            return self.stream_list(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+
+class CommentExport(CommentList):
+    """
+    Stream all comments for a given ContentType and object ID, including
+    those that are not public or have been removed. For staff users only.
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+    pagination_class = None
+
+    def get_queryset(self, **kwargs):
+        content_type = self.get_content_type()
+        if content_type is None:
+            return XtdComment.objects.none()
+        return (
+            XtdComment.objects.filter(
                 content_type=content_type,
-                object_pk=object_pk_arg,
-                site_id=site_id,
+                object_pk=self.kwargs.get("object_pk", None),
+                site__pk=get_current_site_id(self.request),
             )
+            .select_related("user")
+            .prefetch_related(*XtdComment.get_prefetch_lookups())
+            .order_by(*get_list_order(content_type))
+        )
 
+    def list(self, request, *args, **kwargs):
+        return self.stream_list(self.filter_queryset(self.get_queryset()))
 
-class CommentCount(generics.GenericAPIView):
+
+class CommentCount(ConditionalGetMixin, generics.RetrieveAPIView):
     """Get number of comments posted to a given ContentType and object ID."""
 
     serializer_class = serializers.ReadCommentSerializer
     permission_classes = (permissions.AllowAny,)
 
-    def get_queryset(self):
+    def get_filter_kwargs(self):
         content_type_arg = self.kwargs.get("content_type", None)
         object_pk_arg = self.kwargs.get("object_pk", None)
         app_label, model = content_type_arg.split("-")
@@ -108,18 +449,75 @@ class CommentCount(generics.GenericAPIView):
         site_id = getattr(settings, "SITE_ID", None)
         if not site_id:
             site_id = get_current_site_id(self.request)
-        fkwds = {
+        return {
             "content_type": content_type,
             "object_pk": object_pk_arg,
             "site__pk": site_id,
-            "is_public": True,
         }
+
+    def get_object_stats(self):
+        fkwds = self.get_filter_kwargs()
+        return CommentObjectStats.objects.filter(
+            content_type=fkwds["content_type"],
+            object_pk=fkwds["object_pk"],
+            site_id=fkwds["site__pk"],
+        ).first()
+
+    def get_queryset(self):
+        fkwds = {**self.get_filter_kwargs(), "is_public": True}
         if getattr(settings, "COMMENTS_HIDE_REMOVED", True):
             fkwds["is_removed"] = False
         return get_model().objects.filter(**fkwds)
 
+    def retrieve(self, request, *args, **kwargs):
+        count = None
+        # Read the count from the object's stats, if available.
+        if getattr(settings, "COMMENTS_HIDE_REMOVED", True):
+            fkwds = self.get_filter_kwargs()
+            count = CommentObjectStats.objects.get_public_count(
+                fkwds["content_type"], fkwds["object_pk"], fkwds["site__pk"]
+            )
+        if count is None:
+            count = self.get_queryset().count()
+        return Response({"count": count})
+
+
+class CommentCounts(generics.GenericAPIView):
+    """
+    Get number of comments posted to many objects of a given ContentType.
+    The content type and the object IDs are given in the query string:
+    `?ct=<app_label>-<model>&pk=<pk1>,<pk2>,...`.
+    """
+
+    serializer_class = serializers.ReadCommentSerializer
+    permission_classes = (permissions.AllowAny,)
+    max_object_pks = 100
+
     def get(self, request, *args, **kwargs):
-        return Response({"count": self.get_queryset().count()})
+        try:
+            app_label, model = request.query_params.get("ct", "").split("-")
+            content_type = ContentType.objects.get_by_natural_key(
+                app_label, model
+            )
+        except (ValueError, ContentType.DoesNotExist):
+            return Response(
+                {"detail": "Invalid content type."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        pk_arg = request.query_params.get("pk", "")
+        object_pks = [pk for pk in pk_arg.split(",") if pk]
+        if len(object_pks) > self.max_object_pks:
+            return Response(
+                {"detail": f"No more than {self.max_object_pks} IDs allowed."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        site_id = getattr(settings, "SITE_ID", None)
+        if not site_id:
+            site_id = get_current_site_id(request)
+        counts = get_comment_counts(content_type, object_pks, site_id)
+        return Response({"counts": counts})
 
 
 class CreateReportFlag(generics.CreateAPIView):
@@ -153,6 +551,14 @@ class PostCommentReaction(mixins.CreateModelMixin, generics.GenericAPIView):
         )
         check_option("comments_reacting_enabled", comment=comment)
         self.create(request, *args, **kwargs)
+        comment_got_a_reaction.send(
+            sender=comment.__class__,
+            comment=comment,
+            reaction=request.data["reaction"],
+            created=self.created,
+            operation="add" if self.created else "del",
+            request=request,
+        )
         # Create a new response object with the list of reactions the
         # comment has received. If other users sent reactions they all will
         # be reflected in the comment, not only the reaction sent with this
@@ -188,13 +594,23 @@ class AuthorListPagination(PageNumberPagination):
     page_size = settings.COMMENTS_XTD_REACTION_AUTHORS_PER_PAGE
 
 
-class CommentReactionAuthorsList(generics.ListAPIView):
+class CommentReactionAuthorsList(ConditionalGetMixin, generics.ListAPIView):
     """List all CommentReactionAuthor for a given comment_pk and reaction."""
 
     serializer_class = serializers.ReadCommentReactionAuthorSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = AuthorListPagination
 
+    def get_object_stats(self):
+        comment = (
+            XtdComment.objects.filter(pk=self.kwargs.get("comment_pk", None))
+            .values("content_type_id", "object_pk", "site_id")
+            .first()
+        )
+        if comment is None:
+            return None
+        return CommentObjectStats.objects.filter(**comment).first()
+
     def get_queryset(self):
         comment_pk_arg = self.kwargs.get("comment_pk", None)
         reaction_value_arg = self.kwargs.get("reaction_value", None)
@@ -210,3 +626,154 @@ class CommentReactionAuthorsList(generics.ListAPIView):
             return comment_reaction.authors.order_by(
                 *settings.COMMENTS_XTD_REACTION_AUTHORS_LIST_ORDER
             )
+
+
+# ---------------------------------------------------------------------
+# Async views, for projects served with ASGI. See COMMENTS_XTD_ASYNC_VIEWS.
+
+
+async def aget_content_type(content_type_arg):
+    """Returns the ContentType of an `<app_label>-<model>` arg, or None."""
+    return await sync_to_async(get_content_type)(content_type_arg)
+
+
+class AsyncCommentList(ConditionalGetMixin, View):
+    """
+    Async counterpart of `CommentList`, built on the async ORM. Comments are
+    read and serialized by `ValuesCommentListSerializer`, and paginated by
+    `ThreadCursorPagination`. The list is streamed when the query string
+    contains `stream=1`.
+    """
+
+    http_method_names = ("get",)
+    pagination_class = ThreadCursorPagination
+
+    def get_content_type(self):
+        # Read by the pagination, once `get` has loaded it.
+        return self.content_type
+
+    async def aget_object_stats(self):
+        if self.content_type is None:
+            return None
+        return await CommentObjectStats.objects.filter(
+            content_type=self.content_type,
+            object_pk=self.kwargs["object_pk"],
+            site_id=self.site_id,
+        ).afirst()
+
+    def get_queryset(self):
+        if self.content_type is None:
+            return XtdComment.objects.none()
+        return XtdComment.get_queryset(
+            content_type=self.content_type,
+            object_pk=self.kwargs["object_pk"],
+            site_id=self.site_id,
+        )
+
+    def get_serializer(self, request):
+        context = {"request": request, "format": None, "view": self}
+        return serializers.ValuesCommentListSerializer(
+            child=serializers.ReadCommentSerializer(context=context),
+            context=context,
+        )
+
+    async def astream_list(self, serializer, queryset):
+        chunk_size = settings.COMMENTS_XTD_API_STREAM_CHUNK_SIZE
+        # The response is consumed after the view returns.
+        language = translation.get_language()
+        yield "["
+        with translation.override(language):
+            index = 0
+            items = serializer.aiter_representation(queryset, chunk_size)
+            async for data in items:
+                item = dumps_item(data)
+                yield f",{item}" if index else item
+                index += 1
+        yield "]"
+
+    async def alist(self, request):
+        queryset = self.get_queryset()
+        serializer = self.get_serializer(request)
+        if request.query_params.get("stream") in ("1", "true"):
+            return StreamingHttpResponse(
+                self.astream_list(serializer, queryset),
+                content_type="application/json",
+            )
+
+        paginator = self.pagination_class()
+        try:
+            page = await paginator.apaginate_queryset(queryset, request, self)
+        except NotFound as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        results = [
+            item
+            async for item in serializer.aiter_representation(
+                queryset if page is None else page
+            )
+        ]
+        if page is None:
+            return JsonResponse(results, safe=False)
+        return JsonResponse(
+            {
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+                "results": results,
+            }
+        )
+
+    async def get(self, request, *args, **kwargs):
+        self.content_type = await aget_content_type(self.kwargs["content_type"])
+        self.site_id = await sync_to_async(get_current_site_id)(request)
+        stats = await self.aget_object_stats()
+        response = None
+        if stats is not None:
+            response = self.get_not_modified_response(stats)
+        if response is None:
+            response = await self.alist(Request(request))
+        if stats is not None:
+            self.set_validators(response, stats)
+        return response
+
+
+class AsyncCommentCount(ConditionalGetMixin, View):
+    """
+    Async counterpart of `CommentCount`, that reads the count from the
+    object's stats with the async ORM.
+    """
+
+    http_method_names = ("get",)
+
+    async def get(self, request, content_type, object_pk):
+        ctype = await aget_content_type(content_type)
+        if ctype is None:
+            raise Http404(_("Unknown content type."))
+        site_id = getattr(settings, "SITE_ID", None)
+        if not site_id:
+            site_id = await sync_to_async(get_current_site_id)(request)
+
+        stats = await CommentObjectStats.objects.filter(
+            content_type=ctype, object_pk=object_pk, site_id=site_id
+        ).afirst()
+        if stats is not None:
+            response = self.get_not_modified_response(stats)
+            if response is not None:
+                return self.set_validators(response, stats)
+
+        # Read the count from the object's stats, if available.
+        hide_removed = getattr(settings, "COMMENTS_HIDE_REMOVED", True)
+        if stats is not None and hide_removed:
+            count = stats.public_count
+        else:
+            fkwds = {
+                "content_type": ctype,
+                "object_pk": object_pk,
+                "site__pk": site_id,
+                "is_public": True,
+            }
+            if hide_removed:
+                fkwds["is_removed"] = False
+            count = await get_model().objects.filter(**fkwds).acount()
+        response = JsonResponse({"count": count})
+        if stats is not None:
+            self.set_validators(response, stats)
+        return response
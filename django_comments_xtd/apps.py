@@ -1,7 +1,12 @@
 # ruff:noqa: PLC0415
 
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
 
 
 class CommentsXtdConfig(AppConfig):
@@ -10,14 +15,89 @@ class CommentsXtdConfig(AppConfig):
     verbose_name = "Comments Xtd"
 
     def ready(self):
+        from django_comments.models import CommentFlag
+        from django_comments.signals import comment_was_flagged
+
         from django_comments_xtd import get_model
+        from django_comments_xtd.blacklist import (
+            bump_blacklist_version_on_change,
+        )
+        from django_comments_xtd.cache import (
+            bump_list_version_on_comment_change,
+            bump_list_version_on_feedback_change,
+        )
         from django_comments_xtd.conf import settings
-        from django_comments_xtd.models import publish_or_withhold_on_pre_save
+        from django_comments_xtd.events import (
+            publish_moderation_event,
+            publish_new_comment_event,
+            publish_reaction_event,
+            publish_vote_event,
+        )
+        from django_comments_xtd.models import (
+            BlackListedDomain,
+            CommentReaction,
+            CommentVote,
+            publish_or_withhold_on_pre_save,
+            store_object_stats_state_on_pre_save,
+            touch_object_stats_on_feedback_change,
+            update_object_stats_on_post_save,
+        )
+        from django_comments_xtd.signals import (
+            comment_got_a_reaction,
+            comment_got_a_vote,
+        )
+
+        model_app_label = get_model()._meta.label
+        pre_save.connect(
+            store_object_stats_state_on_pre_save, sender=model_app_label
+        )
+        post_save.connect(
+            update_object_stats_on_post_save, sender=model_app_label
+        )
+
+        # Discard cached comment lists when comments or their feedback change.
+        for signal in [post_save, post_delete]:
+            signal.connect(
+                bump_list_version_on_comment_change, sender=model_app_label
+            )
+            for feedback_model in [CommentReaction, CommentVote, CommentFlag]:
+                signal.connect(
+                    bump_list_version_on_feedback_change, sender=feedback_model
+                )
+        m2m_changed.connect(
+            bump_list_version_on_feedback_change,
+            sender=CommentReaction.authors.through,
+        )
+
+        # Keep the last modification date of the object's comments, used by
+        # the web API to answer conditional requests, up to date with their
+        # feedback. Comment changes already update the object's stats.
+        for signal in [post_save, post_delete]:
+            for feedback_model in [CommentReaction, CommentVote, CommentFlag]:
+                signal.connect(
+                    touch_object_stats_on_feedback_change,
+                    sender=feedback_model,
+                )
+        m2m_changed.connect(
+            touch_object_stats_on_feedback_change,
+            sender=CommentReaction.authors.through,
+        )
+
+        # Reload the index of blacklisted domains when they change.
+        for signal in [post_save, post_delete]:
+            signal.connect(
+                bump_blacklist_version_on_change, sender=BlackListedDomain
+            )
+
+        # Publish the live events of comments.
+        post_save.connect(publish_new_comment_event, sender=model_app_label)
+        comment_was_flagged.connect(publish_moderation_event)
+        comment_got_a_reaction.connect(publish_reaction_event)
+        comment_got_a_vote.connect(publish_vote_event)
 
         if getattr(settings, "COMMENTS_HIDE_REMOVED", True) or getattr(
             settings, "COMMENTS_XTD_PUBLISH_OR_WITHHOLD_NESTED", True
         ):
-            model_app_label = get_model()._meta.label
             pre_save.connect(
                 publish_or_withhold_on_pre_save, sender=model_app_label
             )
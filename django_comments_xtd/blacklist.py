@@ -0,0 +1,93 @@
+"""
+Index of the blacklisted domains checked by `moderation.SpamModerator`.
+
+Every process keeps the domains of the `BlackListedDomain` table in a set,
+loaded on first use, so checking a domain doesn't query the database. The
+index has a version number stored in the cache framework, that changes
+every time the save or deletion of a blacklisted domain is committed, or
+domains are loaded with the management command `load_blacklisted_domains`.
+Processes reload their index when the version in the cache no longer
+matches theirs.
+"""
+
+import threading
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+
+from django_comments_xtd.conf import settings
+from django_comments_xtd.models import BlackListedDomain
+
+VERSION_KEY = "djcx:blacklist-version"
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_blacklist_cache():
+    return caches[settings.COMMENTS_XTD_BLACKLIST_CACHE_ALIAS]
+
+
+def normalize_domain(domain):
+    return domain.strip().rstrip(".").lower()
+
+
+class DomainIndex:
+    """Set of blacklisted domains, that also matches their subdomains."""
+
+    def __init__(self, domains, version):
+        self.domains = frozenset(normalize_domain(domain) for domain in domains)
+        self.version = version
+
+    def __contains__(self, domain):
+        labels = normalize_domain(domain).split(".")
+        return any(
+            ".".join(labels[i:]) in self.domains for i in range(len(labels))
+        )
+
+
+def get_blacklist_version():
+    """Returns the current version of the index of blacklisted domains."""
+    version = get_blacklist_cache().get(VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        get_blacklist_cache().set(VERSION_KEY, version, None)
+    return version
+
+
+def bump_blacklist_version():
+    """Makes every process reload its index of blacklisted domains."""
+    get_blacklist_cache().set(VERSION_KEY, uuid4().hex, None)
+
+
+def get_domain_index():
+    """Returns the index of blacklisted domains, reloaded if outdated."""
+    global _index
+    version = get_blacklist_version()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            index = _index
+            if index is None or index.version != version:
+                domains = BlackListedDomain.objects.values_list(
+                    "domain", flat=True
+                )
+                index = _index = DomainIndex(
+                    domains.iterator(chunk_size=10000), version
+                )
+    return index
+
+
+def is_blacklisted_domain(domain):
+    """
+    Returns True when `domain`, or any of the domains it is a subdomain of,
+    is blacklisted.
+    """
+    return domain in get_domain_index()
+
+
+def bump_blacklist_version_on_change(sender, instance, using, **kwargs):
+    # Bumped once the change is committed, otherwise another process could
+    # reload the index before, and keep the old domains with the new version.
+    transaction.on_commit(bump_blacklist_version, using=using)
@@ -0,0 +1,143 @@
+"""
+Cache of the comment lists rendered with the template tag
+`render_xtdcomment_list`.
+
+Rendered lists are cached per object, and the cache key contains a version
+number that changes every time a comment posted to the object, or any of
+its reactions, votes or flags, changes. Cached lists are therefore never
+invalidated explicitly, they simply stop being used.
+
+Lists rendered for logged in users are shared by all of them too. They
+are rendered with no feedback of any user, and the parts of the list
+that show the feedback of the user, marked with the template tag
+`user_feedback`, are rendered again for each request.
+"""
+
+import hashlib
+import re
+from uuid import uuid4
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.utils import translation
+
+from django_comments_xtd.conf import settings
+
+# Rendered in place of the CSRF token, to be replaced with
+# the token of each request when the cached list is used.
+CSRF_TOKEN_PLACEHOLDER = "djcx-csrf-token-placeholder"
+
+USER_FEEDBACK_RE = re.compile(
+    r"<!--djcx-user-feedback:(?P<template_name>[^>]+):(?P<comment_id>\d+)-->"
+    r"(?P<html>.*?)<!--/djcx-user-feedback-->",
+    re.DOTALL,
+)
+
+
+class SharedListUser(AnonymousUser):
+    """
+    The user that lists shared by all the logged in users are rendered
+    for. It's authenticated, but has no name, permissions nor feedback.
+    """
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_authenticated(self):
+        return True
+
+
+def is_list_cache_enabled():
+    return bool(settings.COMMENTS_XTD_LIST_CACHE_TIMEOUT)
+
+
+def get_list_cache():
+    return caches[settings.COMMENTS_XTD_LIST_CACHE_ALIAS]
+
+
+def get_list_version_key(content_type_id, object_pk, site_id):
+    return f"djcx:list-version:{content_type_id}:{object_pk}:{site_id}"
+
+
+def get_list_version(content_type_id, object_pk, site_id):
+    """Returns the current version of the comment list of an object."""
+    key = get_list_version_key(content_type_id, object_pk, site_id)
+    version = get_list_cache().get(key)
+    if version is None:
+        version = uuid4().hex
+        get_list_cache().set(key, version, None)
+    return version
+
+
+def bump_list_version(content_type_id, object_pk, site_id):
+    """Discards the cached comment lists of an object."""
+    key = get_list_version_key(content_type_id, object_pk, site_id)
+    get_list_cache().set(key, uuid4().hex, None)
+
+
+def get_list_cache_key(
+    content_type_id, object_pk, site_id, theme, options, is_authenticated
+):
+    """
+    Returns the key of a rendered comment list, made of the object, its
+    current version, the theme, the active language, the options that
+    the list is rendered with, and whether it's rendered for logged in
+    users.
+    """
+    version = get_list_version(content_type_id, object_pk, site_id)
+    options_hash = hashlib.md5(
+        repr(sorted(options.items())).encode("utf-8")
+    ).hexdigest()
+    audience = "users" if is_authenticated else "anonymous"
+    return (
+        f"djcx:list:{content_type_id}:{object_pk}:{site_id}:{version}:"
+        f"{theme}:{translation.get_language()}:{options_hash}:{audience}"
+    )
+
+
+def mark_user_feedback(html, template_name, comment_id):
+    """
+    Wraps `html`, the part of the template `template_name` rendered for
+    the comment `comment_id` that shows the feedback of the user.
+    """
+    return (
+        f"<!--djcx-user-feedback:{template_name}:{comment_id}-->"
+        f"{html}<!--/djcx-user-feedback-->"
+    )
+
+
+def replace_user_feedback(liststr, render_func):
+    """
+    Replaces the parts of `liststr` wrapped by `mark_user_feedback` with
+    the result of `render_func(template_name, comment_id)`, or with the
+    part itself, without the marks, when it returns None.
+    """
+
+    def replace(match):
+        html = render_func(
+            match.group("template_name"), int(match.group("comment_id"))
+        )
+        return match.group("html") if html is None else html
+
+    return USER_FEEDBACK_RE.sub(replace, liststr)
+
+
+def bump_list_version_on_comment_change(sender, instance, **kwargs):
+    if is_list_cache_enabled():
+        bump_list_version(
+            instance.content_type_id, instance.object_pk, instance.site_id
+        )
+
+
+def bump_list_version_on_feedback_change(sender, instance, **kwargs):
+    """Handles changes in comment reactions, votes and flags."""
+    # Imported here, as the models module imports this one.
+    from django_comments_xtd.models import get_feedback_object_lookup
+
+    if not is_list_cache_enabled():
+        return
+    lookup = get_feedback_object_lookup(instance, **kwargs)
+    if lookup:
+        bump_list_version(**lookup)
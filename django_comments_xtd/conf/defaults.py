@@ -5,6 +5,10 @@ COMMENT_MAX_LENGTH = 3000
 # Extra key to salt the XtdCommentForm.
 COMMENTS_XTD_SALT = b""
 
+# Whether to accept the pickled keys of the confirmation and mute URLs
+# sent by previous versions. Set it to False once those URLs expire.
+COMMENTS_XTD_ACCEPT_PICKLED_KEYS = True
+
 # Whether comment posts should be confirmed by email.
 COMMENTS_XTD_CONFIRM_EMAIL = True
 
@@ -40,6 +44,49 @@ COMMENTS_XTD_MODEL = "django_comments_xtd.models.XtdComment"
 # Enum class for comment reactions.
 COMMENTS_XTD_REACTION_ENUM = "django_comments_xtd.models.ReactionEnum"
 
+# Number of nested comments deleted per query
+# when the comment they are nested to is deleted.
+COMMENTS_XTD_DELETE_BATCH_SIZE = 500
+
+# Number of seconds that lists rendered with the template tag
+# `render_xtdcomment_list` for anonymous users are kept in cache.
+# Caching is disabled when the value is 0.
+COMMENTS_XTD_LIST_CACHE_TIMEOUT = 0
+
+# Alias of the cache, in the CACHES setting, to store comment lists.
+COMMENTS_XTD_LIST_CACHE_ALIAS = "default"
+
+# Alias of the cache, in the CACHES setting, that stores the version of the
+# index of blacklisted domains. Use a cache shared by every process.
+COMMENTS_XTD_BLACKLIST_CACHE_ALIAS = "default"
+
+# Number of replies per thread rendered by `render_xtdcomment_list`. The
+# rest of the replies of each thread are replaced with a link to load
+# them, in slices of this size. 0 renders all the replies.
+COMMENTS_XTD_LIST_MAX_REPLIES = 0
+
+# When True, the URLs of the app use the async views to post comments,
+# react and vote, and the async API views to list and count comments.
+COMMENTS_XTD_ASYNC_VIEWS = False
+
+# Broker that delivers the live events of the comments posted to an
+# object, streamed by the `comments-xtd-events` view. Use
+# "django_comments_xtd.events.InMemoryBroker" for a single process server,
+# or "django_comments_xtd.events.RedisBroker" for many. None disables them.
+COMMENTS_XTD_EVENTS_BROKER = None
+
+# Keyword arguments to instantiate the events broker with, like
+# {"url": "redis://localhost:6379/0"} for the RedisBroker.
+COMMENTS_XTD_EVENTS_BROKER_OPTIONS = {}
+
+# Seconds between the keep-alive comments sent to idle event streams.
+COMMENTS_XTD_EVENTS_KEEPALIVE = 15
+
+# Backend to store the tree structure of comment threads. Use
+# "django_comments_xtd.tree.PathTreeBackend" to keep a materialized path
+# per comment, after running the `initialize_thread_path` command.
+COMMENTS_XTD_TREE_BACKEND = "django_comments_xtd.tree.OrderTreeBackend"
+
 # Target URL for the "flag this comment" view.
 COMMENTS_XTD_FLAG_URL = "comments-flag"
 
@@ -63,6 +110,19 @@ COMMENTS_XTD_SEND_HTML_EMAIL = True
 # your own celery app.
 COMMENTS_XTD_THREADED_EMAILS = True
 
+# Number of threads that send emails when COMMENTS_XTD_THREADED_EMAILS
+# is True. Each thread reuses its own connection to the email backend.
+COMMENTS_XTD_EMAIL_WORKERS = 2
+
+# Number of emails that can wait for a thread. Sending more emails blocks
+# until a thread is available.
+COMMENTS_XTD_EMAIL_QUEUE_SIZE = 100
+
+# Whether to store follow-up notifications in the FollowupNotification
+# outbox instead of sending them while the comment is posted. The outbox
+# is drained by the management command `send_followup_notifications`.
+COMMENTS_XTD_FOLLOWUP_OUTBOX = False
+
 # Define what commenting features a pair app_label.model can have.
 COMMENTS_XTD_APP_MODEL_CONFIG = {
     "default": {
@@ -109,6 +169,24 @@ COMMENTS_XTD_MAX_USERS_IN_TOOLTIP = 10
 # How many users are listed per page in the `list_reacted` API view.
 COMMENTS_XTD_REACTION_AUTHORS_PER_PAGE = 30
 
+# How many top-level threads are listed per page in the `CommentList`
+# API view. Pages are delimited with a cursor. 0 disables pagination.
+COMMENTS_XTD_API_THREADS_PER_PAGE = 0
+
+# Number of comments read from the database per query when the
+# `CommentList` and `CommentExport` API views stream their response.
+COMMENTS_XTD_API_STREAM_CHUNK_SIZE = 500
+
+# When True the `CommentList` and `CommentExport` API views serialize
+# comments with `ValuesCommentListSerializer`, that reads their columns
+# with `values()` instead of building model instances.
+COMMENTS_XTD_API_VALUES_SERIALIZER = False
+
+# Format of the `submit_date` of comments in the web API. None uses the
+# DATETIME_FORMAT of the active language, "iso-8601" returns ISO 8601
+# timestamps, any other value is a Django date format string.
+COMMENTS_XTD_API_DATETIME_FORMAT = None
+
 # When listing reaction authors, the list of
 # authors is ordered using the following list.
 COMMENTS_XTD_REACTION_AUTHORS_LIST_ORDER = ("-id",)
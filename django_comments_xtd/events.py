@@ -0,0 +1,198 @@
+"""
+Live events of the comments posted to an object, pushed to clients with
+Server-Sent Events by the view `views.comment_events`.
+
+Events are published to a broker, in a channel per object, when comments
+are posted, published, removed, reacted to or voted. Every client listening
+to the object waits on the broker, so idle clients cost no database queries.
+The broker is given in the setting `COMMENTS_XTD_EVENTS_BROKER`:
+
+* `InMemoryBroker` delivers events to the clients connected to the same
+  process. It suits a single process server and tests.
+* `RedisBroker` delivers events through Redis Pub/Sub, to the clients
+  connected to any process. It requires the `redis` package.
+"""
+
+import asyncio
+import contextlib
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django_comments.models import CommentFlag
+
+from django_comments_xtd.conf import settings
+
+
+class BaseBroker:
+    """
+    Interface of the brokers. `publish` is called from synchronous code,
+    `listen` from the asynchronous view that streams the events.
+    """
+
+    def publish(self, channel, message):
+        """Sends the string `message` to the clients listening `channel`."""
+        raise NotImplementedError
+
+    async def listen(self, channel, timeout):
+        """
+        Asynchronous generator of the messages published to `channel`.
+        Yields None when no message arrives for `timeout` seconds.
+        """
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class InMemoryBroker(BaseBroker):
+    """Delivers events to the clients connected to the current process."""
+
+    # Messages kept for a client that doesn't read them fast enough.
+    # Newer messages are dropped when the queue is full.
+    max_queue_size = 100
+
+    def __init__(self):
+        self._queues = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            queues = list(self._queues.get(channel, ()))
+        for loop, queue in queues:
+            # Signals may be sent from a thread other than the event loop's.
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    @staticmethod
+    def _put(queue, message):
+        with contextlib.suppress(asyncio.QueueFull):
+            queue.put_nowait(message)
+
+    @staticmethod
+    async def _get(queue, timeout):
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+    async def listen(self, channel, timeout):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue_size))
+        with self._lock:
+            self._queues[channel].add(entry)
+        try:
+            while True:
+                yield await self._get(entry[1], timeout)
+        finally:
+            with self._lock:
+                self._queues[channel].discard(entry)
+                if not self._queues[channel]:
+                    del self._queues[channel]
+
+
+class RedisBroker(BaseBroker):
+    """Delivers events through Redis Pub/Sub."""
+
+    def __init__(self, url="redis://localhost:6379/0"):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "RedisBroker requires the 'redis' package."
+            ) from exc
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.async_client_class = redis.asyncio.Redis
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    async def listen(self, channel, timeout):
+        client = self.async_client_class.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(timeout=timeout)
+                if message is None:
+                    yield None
+                else:
+                    yield message["data"].decode("utf-8")
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache
+def load_broker(path, **options):
+    return import_string(path)(**options)
+
+
+def get_broker():
+    """Returns the broker in settings, or None if events are disabled."""
+    path = settings.COMMENTS_XTD_EVENTS_BROKER
+    if not path:
+        return None
+    return load_broker(path, **settings.COMMENTS_XTD_EVENTS_BROKER_OPTIONS)
+
+
+def get_channel(content_type_id, object_pk, site_id):
+    return f"djcx:events:{content_type_id}:{object_pk}:{site_id}"
+
+
+def format_event(event, data):
+    """Returns the event in the Server-Sent Events format."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def publish_event(comment, event, **data):
+    """Publishes `event` about `comment`, once the transaction commits."""
+    broker = get_broker()
+    if broker is None:
+        return
+
+    def publish():
+        channel = get_channel(
+            comment.content_type_id, comment.object_pk, comment.site_id
+        )
+        message = format_event(
+            event,
+            {
+                "id": comment.pk,
+                "parent_id": comment.parent_id,
+                "thread_id": comment.thread_id,
+                "level": comment.level,
+                **data,
+            },
+        )
+        broker.publish(channel, message)
+
+    transaction.on_commit(publish)
+
+
+# Signal receivers.
+
+
+def publish_new_comment_event(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.is_public and not instance.is_removed:
+        publish_event(instance, "new")
+
+
+def publish_moderation_event(sender, comment, flag, created, **kwargs):
+    if flag is None:
+        return
+    if flag.flag == CommentFlag.MODERATOR_APPROVAL:
+        publish_event(comment, "published")
+    elif flag.flag == CommentFlag.MODERATOR_DELETION:
+        publish_event(comment, "removed")
+
+
+def publish_reaction_event(sender, comment, reaction, operation, **kwargs):
+    publish_event(comment, "reacted", reaction=reaction, operation=operation)
+
+
+def publish_vote_event(sender, comment, vote, **kwargs):
+    publish_event(comment, "voted", vote=vote, score=comment.thread.score)
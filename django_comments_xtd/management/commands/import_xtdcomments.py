@@ -0,0 +1,395 @@
+import csv
+import json
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django_comments.models import Comment
+
+from django_comments_xtd.conf import settings
+from django_comments_xtd.models import CommentThread, XtdComment
+from django_comments_xtd.tree import PathTreeBackend
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+
+# Columns of the XtdComment table, written after the Comment rows.
+XTDCOMMENT_FIELDS = (
+    "comment_ptr",
+    "thread",
+    "parent_id",
+    "level",
+    "order",
+    "path",
+    "followup",
+    "nested_count",
+)
+
+
+class Thread:
+    """Comments of a thread, read from the file, in the order of the file."""
+
+    def __init__(self, first_record):
+        # Index of the first record of the thread in the file.
+        self.first_record = first_record
+        self.comments = []
+        self.children = {}
+
+    def __contains__(self, source_id):
+        return source_id in self.children
+
+    def add(self, comment, parent_source_id=None):
+        self.comments.append(comment)
+        self.children[comment["source_id"]] = []
+        if parent_source_id is not None:
+            self.children[parent_source_id].append(comment)
+
+    def set_tree_data(self, tree_backend):
+        """
+        Sets the `thread`, `parent_id`, `level`, `order`, `path` and
+        `nested_count` of the comments, as if they were posted one by one.
+        """
+        root = self.comments[0]
+        root.update(
+            parent_id=root["id"],
+            level=0,
+            path=tree_backend.get_path_step(root["id"]),
+        )
+        # Walk the thread depth-first, replies in the order of the file.
+        order = 0
+        stack = [(root, False)]
+        while stack:
+            comment, visited = stack.pop()
+            children = self.children[comment["source_id"]]
+            if visited:
+                comment["nested_count"] = sum(
+                    child["nested_count"] + 1 for child in children
+                )
+                continue
+            order += 1
+            comment.update(thread_id=root["id"], order=order)
+            stack.append((comment, True))
+            for child in reversed(children):
+                child.update(
+                    parent_id=comment["id"],
+                    level=comment["level"] + 1,
+                    path=(
+                        f"{comment['path']}{tree_backend.path_separator}"
+                        f"{tree_backend.get_path_step(child['id'])}"
+                    ),
+                )
+                stack.append((child, False))
+
+
+class Command(BaseCommand):
+    help = (
+        "Import comments from a JSONL or CSV file. The comments of a thread "
+        "must be contiguous in the file, and replies must follow their "
+        "parent comment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str)
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="Format of the file. By default given by its extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of comments to create per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help=(
+                "File that records the progress of the import. When it "
+                "exists, the import resumes after the last batch saved."
+            ),
+        )
+        parser.add_argument(
+            "--content-type",
+            type=str,
+            help="Content type, as 'app_label.model', of records without it.",
+        )
+        parser.add_argument(
+            "--site",
+            type=int,
+            help="Site id of records without it. Defaults to SITE_ID.",
+        )
+        parser.add_argument(
+            "--allow-orphans",
+            action="store_true",
+            help=(
+                "Import replies whose parent comment is not in their thread "
+                "as top-level comments, instead of stopping the import."
+            ),
+        )
+
+    # Reading.
+
+    def read_records(self, path, file_format):
+        with path.open(encoding="utf-8", newline="") as f:
+            if file_format == "csv":
+                records = csv.DictReader(f)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            number = 1
+            try:
+                for record in records:
+                    yield record
+                    number += 1
+            except (csv.Error, json.JSONDecodeError) as exc:
+                raise CommandError(f"Invalid record {number}: {exc}") from exc
+
+    def get_content_type_id(self, value):
+        value = value or self.default_content_type
+        if not value:
+            raise CommandError("Record without content_type.")
+        try:
+            return ContentType.objects.get_by_natural_key(
+                *value.split(".", 1)
+            ).id
+        except (ContentType.DoesNotExist, TypeError) as exc:
+            raise CommandError(f"Unknown content type '{value}'.") from exc
+
+    def parse_bool(self, value, default):
+        if value is None or value == "":
+            return default
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in TRUE_VALUES
+
+    def parse_date(self, value):
+        date = datetime.fromisoformat(value)
+        if settings.USE_TZ and timezone.is_naive(date):
+            date = timezone.make_aware(date, dt_timezone.utc)
+        return date
+
+    def parse_record(self, record):
+        return {
+            "source_id": str(record["id"]),
+            "content_type_id": self.get_content_type_id(
+                record.get("content_type")
+            ),
+            "object_pk": str(record["object_pk"]),
+            "site_id": int(record.get("site_id") or self.default_site_id),
+            "user_id": record.get("user_id") or None,
+            "user_name": record.get("user_name") or "",
+            "user_email": record.get("user_email") or "",
+            "user_url": record.get("user_url") or "",
+            "comment": record.get("comment") or "",
+            "submit_date": self.parse_date(record["submit_date"]),
+            "ip_address": record.get("ip_address") or None,
+            "is_public": self.parse_bool(record.get("is_public"), True),
+            "is_removed": self.parse_bool(record.get("is_removed"), False),
+            "followup": self.parse_bool(record.get("followup"), False),
+        }
+
+    def check_threads(self, path, file_format, skip):
+        """
+        Raises CommandError at the first reply, after the first `skip`
+        records, whose parent comment is not in its thread.
+        """
+        source_ids = set()
+        for index, record in enumerate(self.read_records(path, file_format)):
+            if index < skip:
+                continue
+            parent_source_id = str(record.get("parent_id") or "") or None
+            if parent_source_id is None:
+                source_ids = set()
+            elif parent_source_id not in source_ids:
+                raise CommandError(
+                    f"Record {index + 1} replies to '{parent_source_id}', "
+                    "which is not in its thread. Sort the file by thread, "
+                    "or use --allow-orphans to import it as a top-level "
+                    "comment."
+                )
+            source_ids.add(str(record.get("id")))
+
+    def read_threads(self, path, file_format, skip):
+        """Yields the threads of the file, after the first `skip` records."""
+        thread = None
+        for index, record in enumerate(self.read_records(path, file_format)):
+            if index < skip:
+                continue
+            try:
+                comment = self.parse_record(record)
+            except (KeyError, TypeError, ValueError) as exc:
+                raise CommandError(
+                    f"Invalid record {index + 1}: {exc!r}"
+                ) from exc
+            parent_source_id = str(record.get("parent_id") or "") or None
+            if parent_source_id is not None and (
+                thread is None or parent_source_id not in thread
+            ):
+                # The parent is missing, or in an earlier thread.
+                self.orphans += 1
+                parent_source_id = None
+            if parent_source_id is None:
+                if thread is not None:
+                    yield thread
+                thread = Thread(first_record=index)
+            thread.add(comment, parent_source_id)
+        if thread is not None:
+            yield thread
+
+    # Writing.
+
+    def insert_xtdcomments(self, connection, comments):
+        opts = XtdComment._meta
+        qn = connection.ops.quote_name
+        columns = ", ".join(
+            qn(opts.get_field(name).column) for name in XTDCOMMENT_FIELDS
+        )
+        placeholders = ", ".join(["%s"] * len(XTDCOMMENT_FIELDS))
+        sql = (
+            f"INSERT INTO {qn(opts.db_table)} ({columns}) "
+            f"VALUES ({placeholders})"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql,
+                [
+                    (
+                        cm["id"],
+                        cm["thread_id"],
+                        cm["parent_id"],
+                        cm["level"],
+                        cm["order"],
+                        cm["path"],
+                        cm["followup"],
+                        cm["nested_count"],
+                    )
+                    for cm in comments
+                ],
+            )
+
+    def save_batch(self, threads, checkpoint):
+        comments = [cm for thread in threads for cm in thread.comments]
+        connection = connections[self.using]
+        state = {
+            "records": threads[-1].first_record + len(threads[-1].comments),
+            "imported": self.state["imported"] + len(comments),
+        }
+        with transaction.atomic(using=self.using):
+            # The comments take the ids following the last comment in the
+            # database, so that comments posted since the previous batch
+            # don't collide with them.
+            max_id = Comment.objects.using(self.using).aggregate(Max("id"))
+            for comment_id, cm in enumerate(
+                comments, start=(max_id["id__max"] or 0) + 1
+            ):
+                cm["id"] = comment_id
+            for thread in threads:
+                thread.set_tree_data(self.tree_backend)
+            CommentThread.objects.using(self.using).bulk_create(
+                CommentThread(id=thread.comments[0]["id"]) for thread in threads
+            )
+            Comment.objects.using(self.using).bulk_create(
+                Comment(
+                    id=cm["id"],
+                    **{
+                        field: cm[field]
+                        for field in cm
+                        if field in self.comment_fields
+                    },
+                )
+                for cm in comments
+            )
+            self.insert_xtdcomments(connection, comments)
+            # Move the sequences past the batch before it's committed.
+            self.reset_sequences()
+            self.write_checkpoint(checkpoint, state, batch_id=comments[0]["id"])
+        self.state = state
+
+    # Checkpoint.
+
+    def read_checkpoint(self, checkpoint):
+        if checkpoint is None or not checkpoint.exists():
+            return {"records": 0, "imported": 0}
+        state = json.loads(checkpoint.read_text())
+        # The checkpoint is written before its batch is committed. If the
+        # first comment of the batch doesn't exist, the batch was rolled
+        # back and the import resumes from the previous checkpoint.
+        if (
+            not Comment.objects.using(self.using)
+            .filter(id=state["batch_id"])
+            .exists()
+        ):
+            state = state["previous"]
+        return state
+
+    def write_checkpoint(self, checkpoint, state, batch_id):
+        if checkpoint is not None:
+            checkpoint.write_text(
+                json.dumps(
+                    {**state, "batch_id": batch_id, "previous": self.state}
+                )
+            )
+
+    def reset_sequences(self):
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), [Comment])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"Can't read '{path}', file does not exist.")
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in ("jsonl", "csv"):
+            raise CommandError("Use --format to give the format of the file.")
+        checkpoint = (
+            Path(options["checkpoint"]) if options["checkpoint"] else None
+        )
+        batch_size = options["batch_size"]
+
+        self.using = "default"
+        self.default_content_type = options["content_type"]
+        self.default_site_id = options["site"] or settings.SITE_ID
+        self.comment_fields = {
+            f.attname for f in Comment._meta.concrete_fields
+        } - {"id"}
+        self.orphans = 0
+        self.tree_backend = PathTreeBackend()
+
+        self.state = self.read_checkpoint(checkpoint)
+        skip = self.state["records"]
+        if not options["allow_orphans"]:
+            self.check_threads(path, file_format, skip)
+        if skip:
+            self.stdout.write(f"Resuming the import after record {skip}.")
+
+        batch, batch_count = [], 0
+        for thread in self.read_threads(path, file_format, skip):
+            if batch and batch_count + len(thread.comments) > batch_size:
+                self.save_batch(batch, checkpoint)
+                batch, batch_count = [], 0
+            batch.append(thread)
+            batch_count += len(thread.comments)
+        if batch:
+            self.save_batch(batch, checkpoint)
+        if checkpoint is not None and checkpoint.exists():
+            checkpoint.unlink()
+
+        if self.orphans:
+            self.stdout.write(
+                f"{self.orphans} replies without a parent comment in "
+                "their thread were imported as top-level comments."
+            )
+        self.stdout.write(
+            f"Imported {self.state['imported']} XtdComment object(s). Run "
+            "the command 'rebuild_comment_stats' to update the comment "
+            "counters."
+        )
@@ -1,7 +1,11 @@
 # ruff: noqa: N806
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from django.contrib.contenttypes.models import ContentType
-from django.core.management.base import BaseCommand
-from django.db.models import Q
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, Q
 from django.db.utils import ConnectionDoesNotExist
 
 from django_comments_xtd import utils
@@ -9,14 +13,87 @@ from django_comments_xtd.conf import settings
 from django_comments_xtd.models import XtdComment
 
 
+def update_nested_count(using, groups, batch_size, shard=None, shards=None):
+    """
+    Computes the nested_count of the comments of each group, and returns
+    the number of comments processed per group. With `shards`, only the
+    threads whose id modulo `shards` is `shard` are processed.
+    """
+    command = Command()
+    return [
+        command.process_queryset(
+            command.get_queryset(using, q, shard, shards), batch_size
+        )
+        for _, q in groups
+    ]
+
+
+def update_shard(*args):
+    # Forked workers must not share the connections of the parent process.
+    connections.close_all()
+    try:
+        return update_nested_count(*args)
+    finally:
+        connections.close_all()
+
+
 class Command(BaseCommand):
     help = "Initialize the nested_count field for all the comments in the DB."
 
     def add_arguments(self, parser):
         parser.add_argument("using", nargs="*", type=str)
-
-    def initialize_nested_count(self, using):
-        total = 0
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of comments to update per query.",
+        )
+        parser.add_argument(
+            "--threads",
+            nargs="+",
+            type=int,
+            help="Process only the comments of the given thread ids.",
+        )
+        parser.add_argument(
+            "--content-type",
+            action="append",
+            help=(
+                "Process only the comments sent to the given content type, "
+                "as 'app_label.model'. Can be given more than once."
+            ),
+        )
+        parser.add_argument(
+            "--parallel",
+            type=int,
+            default=1,
+            help="Number of worker processes sharing the threads.",
+        )
+
+    def get_filter(self, options):
+        q = Q()
+        if options["threads"]:
+            q &= Q(thread_id__in=options["threads"])
+        if options["content_type"]:
+            ctype_ids = []
+            for app_model in options["content_type"]:
+                try:
+                    ctype = ContentType.objects.get_by_natural_key(
+                        *app_model.split(".", 1)
+                    )
+                except (ContentType.DoesNotExist, TypeError) as exc:
+                    raise CommandError(
+                        f"Unknown content type '{app_model}'."
+                    ) from exc
+                ctype_ids.append(ctype.pk)
+            q &= Q(content_type__in=ctype_ids)
+        return q
+
+    def get_groups(self, base_q):
+        """
+        Returns the groups of comments to process, as (app_model, Q) pairs.
+        The last group, with app_model None, holds the rest of comments.
+        """
+        groups = []
         ctype_list = []
 
         # Check if the `max_thread_level` is provided for each app_model
@@ -35,7 +112,7 @@ class Command(BaseCommand):
             app, model = ".".join(bits[:-1]), bits[-1]
             try:
                 ctype = ContentType.objects.get(app_label=app, model=model)
-                ctype_list.append(ctype)
+                ctype_list.append(ctype.pk)
             except ContentType.DoesNotExist:
                 self.stderr.write(
                     f"app.model '{app_model}' listed in "
@@ -44,72 +121,112 @@ class Command(BaseCommand):
                 )
             else:
                 mtl = utils.get_max_thread_level(ctype)
-                qs = (
-                    XtdComment.objects.using(using)
-                    .filter(content_type=ctype, level__lte=mtl)
-                    .order_by("thread__id", "-order")
-                )
-                count = self.process_queryset(qs)
-                total += count
-                self.stdout.write(
-                    f"Updated {count} XtdComments for {app_model}."
+                groups.append(
+                    (
+                        app_model,
+                        base_q & Q(content_type=ctype.pk, level__lte=mtl),
+                    )
                 )
 
-        # 2nd: Process the rest of the comments.
+        # 2nd: Process the rest of the comments, those posted to
+        # content_types not included in the ctype_list.
         MTL = settings.COMMENTS_XTD_DEFAULT_MAX_THREAD_LEVEL
-        if len(ctype_list) > 0:
-            # Process those comments posted to content_types
-            # not included in the ctype_list.
-            #
-            qs = (
-                XtdComment.objects.using(using)
-                .filter(~Q(content_type__in=ctype_list), level__lte=MTL)
-                .order_by("thread__id", "-order")
-            )
-            count = self.process_queryset(qs)
-            total += count
-            self.stdout.write(f"Updated additional {count} XtdComments.")
-        else:
-            # Process all comments as no explicit content_type
-            # has been processed yet.
-            qs = (
-                XtdComment.objects.using(using)
-                .filter(level__lte=MTL)
-                .order_by("thread__id", "-order")
-            )
-            total = self.process_queryset(qs)
-            self.stdout.write(f"Updated {total} XtdComments.")
-
-        return total
-
-    def process_queryset(self, qs):
-        active_thread_id = -1
+        groups.append(
+            (None, base_q & ~Q(content_type__in=ctype_list) & Q(level__lte=MTL))
+        )
+        return groups
+
+    def get_queryset(self, using, q, shard=None, shards=None):
+        # Replies have always a higher level than their parent, so the
+        # nested_count of the replies is known before their parent's.
+        qs = (
+            XtdComment.objects.using(using)
+            .filter(q)
+            .only("thread_id", "parent_id", "nested_count")
+            .order_by("thread__id", "-level", "pk")
+        )
+        if shards:
+            qs = qs.alias(shard=F("thread_id") % shards).filter(shard=shard)
+        return qs
+
+    def process_queryset(self, qs, batch_size=1000):
+        total = 0
+        batch = []
+        active_thread_id = None
         parents = {}
 
-        for comment in qs:
+        for comment in qs.iterator(chunk_size=batch_size):
+            total += 1
             # Clean up parents when there is a control break.
-            if comment.thread.id != active_thread_id:
+            if comment.thread_id != active_thread_id:
                 parents = {}
-                active_thread_id = comment.thread.id
+                active_thread_id = comment.thread_id
 
-            nested_count = parents.get(comment.comment_ptr_id, 0)
-            parents.setdefault(comment.parent_id, 0)
-            if nested_count > 0:
-                parents[comment.parent_id] += 1 + nested_count
-            else:
-                parents[comment.parent_id] += 1
-            comment.nested_count = nested_count
-            comment.save()
+            nested_count = parents.pop(comment.pk, 0)
+            if comment.parent_id != comment.pk:
+                parents[comment.parent_id] = (
+                    parents.get(comment.parent_id, 0) + 1 + nested_count
+                )
+            if comment.nested_count != nested_count:
+                comment.nested_count = nested_count
+                batch.append(comment)
+            if len(batch) == batch_size:
+                self.update_batch(batch, qs.db)
+
+        self.update_batch(batch, qs.db)
+        return total
 
-        return qs.count()
+    def update_batch(self, batch, using):
+        if batch:
+            XtdComment.objects.using(using).bulk_update(batch, ["nested_count"])
+            batch.clear()
+
+    def initialize_nested_count(self, using, options):
+        groups = self.get_groups(self.get_filter(options))
+        args = (using, groups, options["batch_size"])
+        parallel = options["parallel"]
+        if parallel > 1:
+            # Workers are forked, and open their own connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=parallel,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                futures = [
+                    executor.submit(update_shard, *args, shard, parallel)
+                    for shard in range(parallel)
+                ]
+                results = [future.result() for future in futures]
+            counts = [sum(group) for group in zip(*results, strict=True)]
+        else:
+            counts = update_nested_count(*args)
+
+        for (app_model, _), count in zip(groups, counts, strict=True):
+            if app_model is not None:
+                self.stdout.write(
+                    f"Updated {count} XtdComments for {app_model}."
+                )
+            elif len(groups) > 1:
+                self.stdout.write(f"Updated additional {count} XtdComments.")
+            else:
+                self.stdout.write(f"Updated {count} XtdComments.")
+        return sum(counts)
 
     def handle(self, *args, **options):
         total = 0
         using = options["using"] or ["default"]
+        if (
+            options["parallel"] > 1
+            and "fork" not in multiprocessing.get_all_start_methods()
+        ):
+            raise CommandError(
+                "--parallel requires forking processes, which is not "
+                "supported on this platform."
+            )
 
         try:
             for db_conn in using:
-                total += self.initialize_nested_count(db_conn)
+                total += self.initialize_nested_count(db_conn, options)
         except ConnectionDoesNotExist:
             self.stdout.write(f"DB connection '{db_conn}' does not exist.")
         else:
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from django.db.utils import ConnectionDoesNotExist
+
+from django_comments_xtd.models import XtdComment
+from django_comments_xtd.tree import PathTreeBackend
+
+
+class Command(BaseCommand):
+    help = (
+        "Initialize the path field for all the comments in the DB, "
+        "as required by the PathTreeBackend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("using", nargs="*", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of comments to update per query.",
+        )
+
+    def initialize_thread_path(self, using, batch_size):
+        tree_backend = PathTreeBackend()
+        total = 0
+        batch = []
+        paths = {}
+        active_thread_id = None
+
+        # Parents have always a lower level than their replies, so
+        # the path of the parent is computed before its replies'.
+        qs = (
+            XtdComment.objects.using(using)
+            .only("thread_id", "parent_id", "path")
+            .order_by("thread__id", "level", "pk")
+        )
+        for comment in qs.iterator(chunk_size=batch_size):
+            # Clean up paths when there is a control break.
+            if comment.thread_id != active_thread_id:
+                paths = {}
+                active_thread_id = comment.thread_id
+
+            step = tree_backend.get_path_step(comment.pk)
+            if comment.parent_id == comment.pk:
+                path = step
+            else:
+                parent_path = paths[comment.parent_id]
+                path = f"{parent_path}{tree_backend.path_separator}{step}"
+            paths[comment.pk] = path
+
+            if comment.path != path:
+                comment.path = path
+                batch.append(comment)
+            if len(batch) == batch_size:
+                total += self.update_batch(batch, using)
+
+        total += self.update_batch(batch, using)
+        return total
+
+    def update_batch(self, batch, using):
+        count = len(batch)
+        if count:
+            XtdComment.objects.using(using).bulk_update(batch, ["path"])
+            batch.clear()
+        return count
+
+    def handle(self, *args, **options):
+        total = 0
+        using = options["using"] or ["default"]
+
+        try:
+            for db_conn in using:
+                total += self.initialize_thread_path(
+                    db_conn, options["batch_size"]
+                )
+        except ConnectionDoesNotExist:
+            self.stdout.write(f"DB connection '{db_conn}' does not exist.")
+        else:
+            self.stdout.write(f"Updated {total} XtdComment object(s).")
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from django_comments_xtd.blacklist import (
+    bump_blacklist_version,
+    normalize_domain,
+)
+from django_comments_xtd.models import BlackListedDomain
+
+
+class Command(BaseCommand):
+    help = (
+        "Load blacklisted domains from a file with one domain per line. "
+        "Empty lines and lines starting with '#' are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of domains to create per query.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete every blacklisted domain before loading the file.",
+        )
+
+    def read_domains(self, lines):
+        max_length = BlackListedDomain._meta.get_field("domain").max_length
+        for line in lines:
+            domain = normalize_domain(line)
+            if (
+                domain
+                and not domain.startswith("#")
+                and len(domain) <= max_length
+            ):
+                yield domain
+
+    def load_domains(self, lines, batch_size, replace):
+        total = 0
+        with transaction.atomic():
+            if replace:
+                # Delete without sending a post_delete signal per domain,
+                # the index version is bumped once at the end.
+                qs = BlackListedDomain.objects.all()
+                qs._raw_delete(qs.db)
+                known = set()
+            else:
+                known = {
+                    normalize_domain(domain)
+                    for domain in BlackListedDomain.objects.values_list(
+                        "domain", flat=True
+                    ).iterator(chunk_size=batch_size)
+                }
+            batch = []
+            for domain in self.read_domains(lines):
+                if domain in known:
+                    continue
+                known.add(domain)
+                batch.append(BlackListedDomain(domain=domain))
+                if len(batch) == batch_size:
+                    total += self.create_batch(batch)
+            total += self.create_batch(batch)
+        return total
+
+    def create_batch(self, batch):
+        count = len(batch)
+        if count:
+            BlackListedDomain.objects.bulk_create(batch)
+            batch.clear()
+        return count
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"Can't read '{path}', file does not exist.")
+        with path.open(encoding="utf-8") as f:
+            total = self.load_domains(
+                f, options["batch_size"], options["replace"]
+            )
+        # Neither bulk_create nor the raw delete send signals.
+        bump_blacklist_version()
+        self.stdout.write(f"Loaded {total} BlackListedDomain object(s).")
@@ -5,6 +5,7 @@ from django.db.utils import ConnectionDoesNotExist, IntegrityError
 from django_comments.models import Comment
 
 from django_comments_xtd.models import CommentThread, XtdComment
+from django_comments_xtd.tree import PathTreeBackend
 
 __all__ = ["Command"]
 
@@ -16,6 +17,7 @@ class Command(BaseCommand):
         parser.add_argument("using", nargs="*", type=str)
 
     def populate_db(self, cursor):
+        tree_backend = PathTreeBackend()
         for comment in Comment.objects.all():
             #
             # Insert into django_comments_xtd_thread.
@@ -29,11 +31,16 @@ class Command(BaseCommand):
             sql = (
                 "INSERT INTO %(table)s "
                 "       ('comment_ptr_id', 'thread_id', 'parent_id',"
-                "        'level', 'order', 'followup', 'nested_count') "
-                "VALUES (%(id)d, %(id)d, %(id)d, 0, 1, FALSE, 0)"
+                "        'level', 'order', 'path', 'followup', 'nested_count') "
+                "VALUES (%(id)d, %(id)d, %(id)d, 0, 1, '%(path)s', FALSE, 0)"
             )
             cursor.execute(
-                sql % {"table": XtdComment._meta.db_table, "id": comment.id}
+                sql
+                % {
+                    "table": XtdComment._meta.db_table,
+                    "id": comment.id,
+                    "path": tree_backend.get_path_step(comment.id),
+                }
             )
 
     def handle(self, *args, **options):
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.utils import ConnectionDoesNotExist
+
+from django_comments_xtd import get_model
+from django_comments_xtd.models import (
+    CommentObjectStats,
+    get_object_stats_aggregates,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the comment counters of every object with comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("using", nargs="*", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of stats to create per query.",
+        )
+
+    def rebuild_comment_stats(self, using, batch_size):
+        qs = (
+            get_model()
+            .objects.using(using)
+            .order_by()
+            .values("content_type_id", "object_pk", "site_id")
+            .annotate(**get_object_stats_aggregates())
+        )
+        total = 0
+        with transaction.atomic(using=using):
+            CommentObjectStats.objects.using(using).all().delete()
+            batch = []
+            for values in qs.iterator(chunk_size=batch_size):
+                batch.append(CommentObjectStats(**values))
+                if len(batch) == batch_size:
+                    total += self.create_batch(batch, using)
+            total += self.create_batch(batch, using)
+        return total
+
+    def create_batch(self, batch, using):
+        count = len(batch)
+        if count:
+            CommentObjectStats.objects.using(using).bulk_create(batch)
+            batch.clear()
+        return count
+
+    def handle(self, *args, **options):
+        total = 0
+        using = options["using"] or ["default"]
+
+        try:
+            for db_conn in using:
+                total += self.rebuild_comment_stats(
+                    db_conn, options["batch_size"]
+                )
+        except ConnectionDoesNotExist:
+            self.stdout.write(f"DB connection '{db_conn}' does not exist.")
+        else:
+            self.stdout.write(f"Rebuilt {total} CommentObjectStats object(s).")
@@ -0,0 +1,193 @@
+import logging
+import math
+import smtplib
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from django_comments_xtd import utils
+from django_comments_xtd.conf import settings
+from django_comments_xtd.models import FollowupNotification
+from django_comments_xtd.views import (
+    get_followup_email,
+    get_followup_templates,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Send the follow-up notifications waiting in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of notifications to send per SMTP connection.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Maximum number of emails sent per second, 0 for no limit.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Attempts before a notification is marked as failed.",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=int,
+            default=60,
+            help=(
+                "Seconds before the first retry of a notification, "
+                "doubled on every further attempt."
+            ),
+        )
+        parser.add_argument(
+            "--lease",
+            type=int,
+            help=(
+                "Seconds during which other workers skip the notifications "
+                "claimed by this one. By default 5 minutes, plus the time "
+                "to send a batch at the given --rate."
+            ),
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=0,
+            help=(
+                "Seconds to wait for new notifications once the outbox is "
+                "empty. By default the command exits."
+            ),
+        )
+
+    def claim_batch(self, batch_size, lease):
+        """
+        Returns the next notifications to send. They are postponed for
+        `lease` seconds, so that other workers skip them, and they are sent
+        again if this worker dies before sending them.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            pks = list(
+                FollowupNotification.objects.select_for_update(skip_locked=True)
+                .filter(failed=False, send_after__lte=now)
+                .order_by("send_after", "pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            FollowupNotification.objects.filter(pk__in=pks).update(
+                send_after=now + timedelta(seconds=lease)
+            )
+        return list(
+            FollowupNotification.objects.filter(pk__in=pks)
+            .select_related("comment", "follower_comment")
+            .order_by("pk")
+        )
+
+    def throttle(self):
+        if self.interval:
+            delay = self.last_sent + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.last_sent = time.monotonic()
+
+    def get_message(self, notification, templates):
+        subject, text_message, html_message = get_followup_email(
+            notification.comment, notification.follower_comment, templates
+        )
+        return utils.get_email_message(
+            subject,
+            text_message,
+            settings.COMMENTS_XTD_FROM_EMAIL,
+            [notification.follower_comment.user_email],
+            html=html_message,
+        )
+
+    def send_notification(self, connection, notification, templates):
+        """Sends `notification`. Returns the error raised, if any."""
+        try:
+            message = self.get_message(notification, templates)
+            self.throttle()
+            connection.send_messages([message])
+        except (smtplib.SMTPException, OSError) as exc:
+            return exc
+        except Exception as exc:
+            # A broken template or notification doesn't stop the batch,
+            # it's retried like any other failure.
+            logger.exception(
+                "Error rendering follow-up notification %s.", notification.pk
+            )
+            return exc
+        return None
+
+    def send_batch(self, notifications):
+        sent, failed = [], []
+        templates = get_followup_templates()
+        # A single connection sends every email of the batch.
+        with get_connection() as connection:
+            for notification in notifications:
+                exc = self.send_notification(
+                    connection, notification, templates
+                )
+                if exc is None:
+                    sent.append(notification.pk)
+                else:
+                    failed.append((notification, exc))
+        FollowupNotification.objects.filter(pk__in=sent).delete()
+        for notification, exc in failed:
+            self.retry_later(notification, exc)
+        return len(sent), len(failed)
+
+    def retry_later(self, notification, exc):
+        attempts = notification.attempts + 1
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        FollowupNotification.objects.filter(pk=notification.pk).update(
+            attempts=F("attempts") + 1,
+            last_error=repr(exc),
+            send_after=timezone.now() + timedelta(seconds=delay),
+            failed=attempts >= self.max_attempts,
+        )
+
+    def get_lease(self, options):
+        if options["lease"]:
+            return options["lease"]
+        # Claimed notifications must not be claimed again by another worker
+        # while this one is still sending them.
+        lease = 300
+        if options["rate"] > 0:
+            lease += math.ceil(options["batch_size"] / options["rate"])
+        return lease
+
+    def handle(self, *args, **options):
+        self.interval = 1 / options["rate"] if options["rate"] > 0 else 0
+        self.last_sent = 0
+        self.max_attempts = options["max_attempts"]
+        self.retry_delay = options["retry_delay"]
+        lease = self.get_lease(options)
+        total_sent = total_failed = 0
+
+        while True:
+            notifications = self.claim_batch(options["batch_size"], lease)
+            if notifications:
+                sent, failed = self.send_batch(notifications)
+                total_sent += sent
+                total_failed += failed
+            elif options["poll"] > 0:
+                time.sleep(options["poll"])
+            else:
+                break
+
+        self.stdout.write(
+            f"Sent {total_sent} follow-up notification(s), "
+            f"{total_failed} failed attempt(s)."
+        )
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "django_comments_xtd",
+            "0009_commentthread_remove_xtdcomment_thread_id_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="xtdcomment",
+            name="path",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=255
+            ),
+        ),
+    ]
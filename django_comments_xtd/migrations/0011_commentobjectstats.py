@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("django_comments_xtd", "0010_xtdcomment_path"),
+        ("sites", "0002_alter_domain_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommentObjectStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "object_pk",
+                    models.CharField(max_length=64, verbose_name="object ID"),
+                ),
+                ("public_count", models.IntegerField(default=0)),
+                ("removed_count", models.IntegerField(default=0)),
+                ("total_count", models.IntegerField(default=0)),
+                (
+                    "last_submit_date",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sites.site",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "comment object stats",
+                "verbose_name_plural": "comment object stats",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("content_type", "object_pk", "site"),
+                        name="unique_comment_object_stats",
+                    )
+                ],
+            },
+        ),
+    ]
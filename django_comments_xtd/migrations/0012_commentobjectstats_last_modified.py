@@ -0,0 +1,19 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_comments_xtd", "0011_commentobjectstats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="commentobjectstats",
+            name="last_modified",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_comments_xtd", "0012_commentobjectstats_last_modified"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FollowupNotification",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "send_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("failed", models.BooleanField(default=False)),
+                (
+                    "comment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="followup_notifications",
+                        to="django_comments_xtd.xtdcomment",
+                    ),
+                ),
+                (
+                    "follower_comment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="django_comments_xtd.xtdcomment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "follow-up notification",
+                "verbose_name_plural": "follow-up notifications",
+                "indexes": [
+                    models.Index(
+                        fields=["failed", "send_after"],
+                        name="djcx_followup_outbox_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,19 +1,33 @@
 from collections import OrderedDict
 from typing import ClassVar
 
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
 from django.core import signing
 from django.db import models
-from django.db.models import F, Max, Min, Prefetch, Q
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    Max,
+    Prefetch,
+    Q,
+    Sum,
+    Value,
+    When,
+    Window,
+)
 from django.db.models.signals import post_delete
 from django.db.transaction import atomic
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import force_str
 from django.utils.translation import gettext_lazy as _
 from django_comments.managers import CommentManager
 from django_comments.models import Comment, CommentFlag
 
-from django_comments_xtd import get_model, get_reaction_enum
+from django_comments_xtd import get_model, get_reaction_enum, get_tree_backend
 from django_comments_xtd.conf import settings
 from django_comments_xtd.utils import (
     get_current_site_id,
@@ -65,6 +79,9 @@ class XtdComment(Comment):
     parent_id = models.IntegerField(default=0)
     level = models.SmallIntegerField(default=0)
     order = models.IntegerField(default=1, db_index=True)
+    path = models.CharField(
+        max_length=255, blank=True, default="", db_index=True
+    )
     followup = models.BooleanField(
         blank=True, default=False, help_text=_("Notify follow-up comments")
     )
@@ -75,21 +92,30 @@ class XtdComment(Comment):
         return f"({self.id}) {self.name}: {self.comment[:50]}..."
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super(Comment, self).save(*args, **kwargs)
-        if is_new:
+        if self.pk is not None:
+            super(Comment, self).save(*args, **kwargs)
+            return
+        # New comments are saved twice, the second time with their thread
+        # data. Callbacks run on commit see the complete comment.
+        with atomic():
+            super(Comment, self).save(*args, **kwargs)
             if not self.parent_id:
                 comment_thread = CommentThread(id=self.id)
                 comment_thread.save()
                 self.parent_id = self.id
                 self.thread = comment_thread
+                get_tree_backend().add_root(self)
             elif get_max_thread_level(self.content_type):
-                with atomic():
-                    self._calculate_thread_data()
+                self._calculate_thread_data()
             else:
                 raise MaxThreadLevelExceededException(self)
             kwargs["force_insert"] = False
-            super(Comment, self).save(*args, **kwargs)
+            # The stats of the object already count the comment.
+            self._skip_stats = True
+            try:
+                super(Comment, self).save(*args, **kwargs)
+            finally:
+                del self._skip_stats
 
     def get_absolute_url(self, anchor_pattern="#comment-%(id)s"):
         return reverse(
@@ -98,39 +124,11 @@ class XtdComment(Comment):
         ) + (anchor_pattern % self.__dict__)
 
     def _calculate_thread_data(self):
-        # Implements the following approach:
-        #  http://www.sqlteam.com/article/sql-for-threaded-discussion-forums
         parent = XtdComment.objects.get(pk=self.parent_id)
         if parent.level == get_max_thread_level(self.content_type):
             raise MaxThreadLevelExceededException(self)
 
-        self.thread = parent.thread
-        self.level = parent.level + 1
-        qc_eq_thread = XtdComment.objects.filter(thread=parent.thread)
-        qc_ge_level = qc_eq_thread.filter(
-            level__lte=parent.level, order__gt=parent.order
-        )
-        if qc_ge_level.count():
-            min_order = qc_ge_level.aggregate(Min("order"))["order__min"]
-            qc_eq_thread.filter(order__gte=min_order).update(
-                order=F("order") + 1
-            )
-            self.order = min_order
-        else:
-            max_order = qc_eq_thread.aggregate(Max("order"))["order__max"]
-            self.order = max_order + 1
-
-        if self.id != parent.id:
-            parent_ids = []
-            while True:
-                parent_ids.append(parent.pk)
-                if parent.id == parent.parent_id:
-                    break
-                parent = qc_eq_thread.get(pk=parent.parent_id)
-            if parent_ids:
-                qc_eq_thread.filter(pk__in=parent_ids).update(
-                    nested_count=F("nested_count") + 1
-                )
+        get_tree_backend().add_reply(self, parent)
 
     def get_reply_url(self):
         return reverse("comments-xtd-reply", kwargs={"cid": self.pk})
@@ -138,6 +136,9 @@ class XtdComment(Comment):
     def allow_thread(self):
         return self.level < get_max_thread_level(self.content_type)
 
+    def _has_prefetched(self, related_name):
+        return related_name in getattr(self, "_prefetched_objects_cache", {})
+
     def get_reactions(self, from_user=None):
         total_counter = 0
         max_users_listed = getattr(
@@ -146,17 +147,25 @@ class XtdComment(Comment):
         reactions = OrderedDict([(k, {}) for k in get_reaction_enum()])
 
         if from_user:
-            qs = self.reactions.filter(authors__in=[from_user])
+            qs = self.reactions.filter(authors__in=[from_user]).order_by(
+                "reaction"
+            )
+        elif self._has_prefetched("reactions"):
+            # Reactions prefetched with `get_prefetch_lookups` come already
+            # ordered by reaction value and with their authors.
+            qs = self.reactions.all()
         else:
-            qs = self.reactions
+            qs = self.reactions.order_by("reaction").prefetch_related(
+                get_reaction_authors_prefetch(max_users_listed)
+            )
 
         # Add existing reactions sorted by reaction value.
-        for item in qs.order_by("reaction"):
+        for item in qs:
             total_counter += item.counter
             reaction = get_reaction_enum()(item.reaction)
             authors = [
                 settings.COMMENTS_XTD_FN_USER_REPR(author)
-                for author in item.authors.all()[:max_users_listed]
+                for author in item.get_listed_authors(max_users_listed)
             ]
             reactions[reaction.value] = {
                 "value": reaction.value,
@@ -173,13 +182,46 @@ class XtdComment(Comment):
         return result
 
     def get_flags(self):
-        flag_qs = self.flags.filter(flag=CommentFlag.SUGGEST_REMOVAL)
+        if self._has_prefetched("flags"):
+            flag_list = [
+                flag
+                for flag in self.flags.all()
+                if flag.flag == CommentFlag.SUGGEST_REMOVAL
+            ]
+        else:
+            flag_list = list(
+                self.flags.filter(
+                    flag=CommentFlag.SUGGEST_REMOVAL
+                ).select_related("user")
+            )
         flags = {
-            "users": [flag.user for flag in flag_qs],
-            "counter": flag_qs.count(),
+            "users": [flag.user for flag in flag_list],
+            "counter": len(flag_list),
         }
         return flags
 
+    @staticmethod
+    def get_prefetch_lookups():
+        """
+        Returns the list of `Prefetch` objects that retrieve the flags and
+        reactions used when rendering or serializing a list of comments.
+        """
+        max_users_listed = getattr(
+            settings, "COMMENTS_XTD_MAX_USERS_IN_TOOLTIP", 10
+        )
+        flags = CommentFlag.objects.filter(
+            flag__in=[CommentFlag.SUGGEST_REMOVAL]
+        ).select_related("user")
+
+        reactions = CommentReaction.objects.order_by(
+            "reaction"
+        ).prefetch_related(get_reaction_authors_prefetch(max_users_listed))
+
+        return [
+            Prefetch("flags", queryset=flags),
+            Prefetch("reactions", queryset=reactions),
+        ]
+
     @staticmethod
     def get_queryset(
         content_type=None, object_pk=None, content_object=None, site_id=None
@@ -201,16 +243,6 @@ class XtdComment(Comment):
             )
             object_pk = content_object.id
 
-        flags = CommentFlag.objects.filter(
-            flag__in=[CommentFlag.SUGGEST_REMOVAL]
-        ).prefetch_related("user")
-
-        reactions = CommentReaction.objects.all().prefetch_related("authors")
-
-        prefetch_args = [
-            Prefetch("flags", queryset=flags),
-            Prefetch("reactions", queryset=reactions),
-        ]
         fkwds = {
             "content_type": content_type,
             "object_pk": object_pk,
@@ -223,67 +255,162 @@ class XtdComment(Comment):
             fkwds["is_removed"] = False
 
         return (
-            get_model().objects.prefetch_related(*prefetch_args).filter(**fkwds)
+            get_model()
+            .objects.prefetch_related(*XtdComment.get_prefetch_lookups())
+            .filter(**fkwds)
+        )
+
+
+def get_reaction_authors_prefetch(max_users_listed):
+    """
+    Returns a `Prefetch` that loads, at most, `max_users_listed` authors
+    per comment reaction in the attribute `listed_authors`. The limit is
+    applied in the database.
+    """
+    authors = get_user_model().objects.order_by("pk")[:max_users_listed]
+    return Prefetch("authors", queryset=authors, to_attr="listed_authors")
+
+
+def filter_by_thread_branch(qs, start, stop):
+    """
+    Filters the comments in `qs` by the branch of their thread they belong
+    to, keeping the branches from `start` to `stop - 1`. The top-level
+    comment of every thread is in branch 0, and the n-th direct reply to
+    it, in tree order, is in branch n along with all its nested replies.
+    """
+    order_field = get_tree_backend().order_field
+    return qs.annotate(
+        thread_branch=Window(
+            Sum(Case(When(level=1, then=1), default=0)),
+            partition_by=[F("thread_id")],
+            order_by=F(order_field).asc(),
         )
+    ).filter(thread_branch__gte=start, thread_branch__lt=stop)
 
 
 def publish_or_withhold_nested_comments(comment, shall_be_public=False):
-    qs = get_model().objects.filter(~Q(pk=comment.id), parent_id=comment.id)
-    nested = [cm.id for cm in qs]
-    qs.update(is_public=shall_be_public)
-    while len(nested) > 0:
-        cm_id = nested.pop()
-        qs = get_model().objects.filter(~Q(pk=cm_id), parent_id=cm_id)
-        nested.extend([cm.id for cm in qs])
-        qs.update(is_public=shall_be_public)
+    tree_backend = get_tree_backend()
+    descendants = tree_backend.get_descendants(comment)
+    # Only the nested comments that have not been removed are published
+    # or withheld. The update doesn't send signals, so the stats of the
+    # object are updated here.
+    changing = descendants.filter(is_removed=False).exclude(
+        is_public=shall_be_public
+    )
+    changes = changing.aggregate(count=Count("pk"), last=Max("submit_date"))
+    descendants.update(is_public=shall_be_public)
+    if changes["count"]:
+        sign = 1 if shall_be_public else -1
+        update_object_stats_counters(
+            comment,
+            last_submit_date=changes["last"] if shall_be_public else None,
+            refresh_last_submit_date=not shall_be_public,
+            public_count=sign * changes["count"],
+        )
     # Update nested_count in parents comments in the same thread.
     # The comment.nested_count doesn't change because the comment's is_public
     # attribute is not changing, only its nested comments change, and it will
     # help to re-populate nested_count should it be published again.
     if shall_be_public:
-        op = F("nested_count") + comment.nested_count
+        tree_backend.update_nested_count(comment, comment.nested_count)
     else:
-        op = F("nested_count") - comment.nested_count
-    get_model().objects.filter(
-        thread=comment.thread,
-        level__lt=comment.level,
-        order__lt=comment.order,
-    ).update(nested_count=op)
+        tree_backend.update_nested_count(comment, -comment.nested_count)
 
 
 def publish_or_withhold_on_pre_save(sender, instance, raw, using, **kwargs):
     if not raw and instance and instance.id:
         shall_be_public = (not instance.is_removed) and instance.is_public
-        publish_or_withhold_nested_comments(instance, shall_be_public)
+        # Nested comments change only when the comment is being
+        # published or withheld, not on every save.
+        was_public = (
+            type(instance)
+            ._base_manager.using(using)
+            .filter(pk=instance.id, is_public=True, is_removed=False)
+            .exists()
+        )
+        if was_public != shall_be_public:
+            publish_or_withhold_nested_comments(instance, shall_be_public)
 
 
-def on_comment_deleted(sender, instance, using, **kwargs):
-    # Create the list of nested ink-comments that have to be deleted too.
-    qs = get_model().objects.filter(~Q(pk=instance.id), parent_id=instance.id)
-    nested = [cm.id for cm in qs]
-    for cm_id in nested:
-        qs = get_model().objects.filter(~Q(pk=cm_id), parent_id=cm_id)
-        nested.extend([cm.id for cm in qs])
+def delete_comments_in_batches(comment_ids, using=None):
+    """
+    Deletes the comments in `comment_ids`, along with their reactions,
+    votes, flags and pending follow-up notifications, in batches of
+    `COMMENTS_XTD_DELETE_BATCH_SIZE` comments. Each batch is deleted in
+    its own transaction, or savepoint when called within a transaction.
+    """
+    model = get_model()
+    batch_size = settings.COMMENTS_XTD_DELETE_BATCH_SIZE
+    # Rows in the tables of the subclasses point to the rows in the tables
+    # of their parent classes, so the former are deleted first.
+    model_chain = [model, *model._meta.get_parent_list()]
+
+    for start in range(0, len(comment_ids), batch_size):
+        batch = comment_ids[start : start + batch_size]
+        with atomic(using=using):
+            CommentReactionAuthor.objects.using(using).filter(
+                reaction__comment_id__in=batch
+            )._raw_delete(using)
+            CommentReaction.objects.using(using).filter(
+                comment_id__in=batch
+            )._raw_delete(using)
+            CommentVote.objects.using(using).filter(
+                comment_id__in=batch
+            )._raw_delete(using)
+            CommentFlag.objects.using(using).filter(
+                comment_id__in=batch
+            )._raw_delete(using)
+            FollowupNotification.objects.using(using).filter(
+                Q(comment_id__in=batch) | Q(follower_comment_id__in=batch)
+            )._raw_delete(using)
+            for cmodel in model_chain:
+                cmodel._base_manager.using(using).filter(
+                    pk__in=batch
+                )._raw_delete(using)
+
+
+def get_nested_comment_ids(comment, using=None):
+    return list(
+        get_tree_backend()
+        .get_descendants(comment)
+        .using(using)
+        .order_by()
+        .values_list("pk", flat=True)
+    )
 
-    # Update the nested_count attribute up the tree.
-    get_model().objects.filter(
-        thread=instance.thread,
-        level__lt=instance.level,
-        order__lt=instance.order,
-    ).update(nested_count=F("nested_count") - instance.nested_count - 1)
 
-    # Delete all reactions, and reaction authors, associated
-    # with nested instances.
-    creactions_qs = CommentReaction.objects.filter(comment__pk__in=nested)
-    creactions_ids = [cr.id for cr in creactions_qs]
+def delete_nested_comments(comment, using=None):
+    """
+    Deletes the comments nested to `comment`, along with everything
+    associated with them, in batches. See `delete_comments_in_batches`.
+    """
+    delete_comments_in_batches(get_nested_comment_ids(comment, using), using)
 
-    CommentReactionAuthor.objects.filter(
-        reaction__pk__in=creactions_ids
-    )._raw_delete(using)
-    creactions_qs._raw_delete(using)
 
-    # Delete all the comments down the tree from instance.
-    get_model().objects.filter(pk__in=nested)._raw_delete(using)
+def on_comment_deleted(sender, instance, using, **kwargs):
+    tree_backend = get_tree_backend()
+    # Update the nested_count attribute up the tree.
+    tree_backend.update_nested_count(instance, -instance.nested_count - 1)
+    # The counters of the nested comments, that are deleted with no signals.
+    deleted = (
+        tree_backend.get_descendants(instance)
+        .using(using)
+        .aggregate(**get_object_stats_aggregates())
+    )
+    # Delete the nested comments, and everything associated with them, in
+    # the transaction that deletes the comment, so that a failure can't
+    # leave replies to a deleted comment behind.
+    delete_nested_comments(instance, using)
+    # Update the counters of the object the comment was posted to.
+    public_count = deleted["public_count"] + is_visible(instance)
+    update_object_stats_counters(
+        instance,
+        using,
+        refresh_last_submit_date=public_count > 0,
+        public_count=-public_count,
+        removed_count=-deleted["removed_count"] - instance.is_removed,
+        total_count=-deleted["total_count"] - 1,
+    )
 
 
 post_delete.connect(on_comment_deleted, sender=XtdComment)
@@ -315,7 +442,21 @@ class TmpXtdComment(dict):
         try:
             return self[key]
         except KeyError:
-            return None
+            pass
+        # Keys of confirmation and mute URLs give the natural key of the
+        # content type. The content type and the target object are only
+        # read when they are used.
+        if key == "content_type" and "content_type_key" in self:
+            self[key] = ContentType.objects.get_by_natural_key(
+                *self["content_type_key"]
+            )
+            return self[key]
+        if key == "content_object" and self.content_type is not None:
+            self[key] = self.content_type.get_object_for_this_type(
+                pk=self["object_pk"]
+            )
+            return self[key]
+        return None
 
     def __setattr__(self, key, value):
         self[key] = value
@@ -323,6 +464,9 @@ class TmpXtdComment(dict):
     def save(self, *args, **kwargs):
         pass
 
+    async def asave(self, *args, **kwargs):
+        pass
+
     def _get_pk_val(self):
         if self.xtd_comment:
             return self.xtd_comment.pk
@@ -330,21 +474,25 @@ class TmpXtdComment(dict):
             app, model = self.content_type.natural_key()
             return signing.dumps(f"{app}.{model}:{self.object_pk}")
 
+    def get_model_data(self):
+        """Returns the keyword arguments to create the XtdComment."""
+        data = dict(self)
+        if "content_type_key" in data:
+            del data["content_type_key"]
+            data["content_type"] = self.content_type
+            data["content_object"] = self.content_object
+        return data
+
     def __setstate__(self, state):
-        ct_key = state.pop("content_type_key")
-        ctype = ContentType.objects.get_by_natural_key(*ct_key)
-        self.update(
-            state,
-            content_type=ctype,
-            content_object=ctype.get_object_for_this_type(
-                pk=state["object_pk"]
-            ),
-        )
+        self.update(state)
 
     def __reduce__(self):
-        state = {k: v for k, v in self.items() if k != "content_object"}
-        ct = state.pop("content_type")
-        state["content_type_key"] = ct.natural_key()
+        state = {
+            k: v
+            for k, v in self.items()
+            if k not in ("content_type", "content_object")
+        }
+        state["content_type_key"] = self.content_type.natural_key()
         return TmpXtdComment, (), state
 
 
@@ -452,9 +600,310 @@ class CommentReaction(models.Model):
         verbose_name = _("comment reactions")
         verbose_name_plural = _("comments reactions")
 
+    def get_listed_authors(self, max_users_listed):
+        """
+        Returns a list with, at most, `max_users_listed` authors of the
+        reaction, using those prefetched with `get_reaction_authors_prefetch`
+        when available.
+        """
+        if hasattr(self, "listed_authors"):
+            return self.listed_authors[:max_users_listed]
+        return list(self.authors.order_by("pk")[:max_users_listed])
+
 
 class CommentReactionAuthor(models.Model):
     reaction = models.ForeignKey(CommentReaction, on_delete=models.CASCADE)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+
+
+# ----------------------------------------------------------------------
+class CommentObjectStatsManager(models.Manager):
+    def get_public_count(self, content_type, object_pk, site_id):
+        """
+        Returns the number of public and not removed comments posted to
+        the given object, or None when the object has no stats yet.
+        """
+        return (
+            self.filter(
+                content_type=content_type,
+                object_pk=force_str(object_pk),
+                site_id=site_id,
+            )
+            .values_list("public_count", flat=True)
+            .first()
+        )
+
+
+class CommentObjectStats(models.Model):
+    """
+    Denormalized comment counters for each object that receives comments,
+    kept up to date when comments are saved or deleted. The counters are
+    rebuilt with the management command `rebuild_comment_stats`.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_pk = models.CharField(_("object ID"), max_length=64)
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    # Comments that are public and have not been removed.
+    public_count = models.IntegerField(default=0)
+    removed_count = models.IntegerField(default=0)
+    total_count = models.IntegerField(default=0)
+    # Submit date of the last public comment that has not been removed.
+    last_submit_date = models.DateTimeField(null=True, blank=True)
+    # Changes whenever the comments of the object, or their reactions,
+    # votes or flags, change.
+    last_modified = models.DateTimeField(auto_now=True)
+
+    objects = CommentObjectStatsManager()
+
+    class Meta:
+        verbose_name = _("comment object stats")
+        verbose_name_plural = _("comment object stats")
+        constraints: ClassVar = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_pk", "site"],
+                name="unique_comment_object_stats",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.content_type.app_label}.{self.content_type.model}"
+            f":{self.object_pk} ({self.public_count})"
+        )
+
+
+def get_object_stats_aggregates():
+    """Returns the aggregates that compute the fields of CommentObjectStats."""
+    is_visible = Q(is_public=True, is_removed=False)
+    return {
+        "public_count": Count("pk", filter=is_visible),
+        "removed_count": Count("pk", filter=Q(is_removed=True)),
+        "total_count": Count("pk"),
+        "last_submit_date": Max("submit_date", filter=is_visible),
+    }
+
+
+def get_object_stats_lookup(comment):
+    return {
+        "content_type_id": comment.content_type_id,
+        "object_pk": comment.object_pk,
+        "site_id": comment.site_id,
+    }
+
+
+def is_visible(comment):
+    return comment.is_public and not comment.is_removed
+
+
+def update_object_stats(comment, using=None):
+    """Updates the CommentObjectStats of the object `comment` is posted to."""
+    lookup = get_object_stats_lookup(comment)
+    stats = (
+        get_model()
+        .objects.using(using)
+        .filter(**lookup)
+        .aggregate(**get_object_stats_aggregates())
+    )
+    CommentObjectStats.objects.using(using).update_or_create(
+        **lookup, defaults=stats
+    )
+
+
+def update_object_stats_counters(
+    comment,
+    using=None,
+    last_submit_date=None,
+    refresh_last_submit_date=False,
+    **deltas,
+):
+    """
+    Adds the `deltas` to the counters of the CommentObjectStats of the
+    object `comment` is posted to, with `F()` expressions. The stats are
+    computed in full only when the object has none yet.
+
+    `last_submit_date` is the submit date of comments that became
+    visible. When visible comments are hidden or deleted, the date of
+    the last comment still visible is read again, if
+    `refresh_last_submit_date` is True.
+    """
+    lookup = get_object_stats_lookup(comment)
+    updates = {"last_modified": timezone.now()}
+    for field, delta in deltas.items():
+        if delta:
+            updates[field] = F(field) + delta
+    if refresh_last_submit_date:
+        updates["last_submit_date"] = (
+            get_model()
+            .objects.using(using)
+            .filter(**lookup, is_public=True, is_removed=False)
+            .aggregate(last=Max("submit_date"))["last"]
+        )
+    elif last_submit_date is not None:
+        updates["last_submit_date"] = Case(
+            When(
+                last_submit_date__gte=last_submit_date,
+                then=F("last_submit_date"),
+            ),
+            default=Value(last_submit_date),
+        )
+    stats_qs = CommentObjectStats.objects.using(using).filter(**lookup)
+    if not stats_qs.update(**updates):
+        update_object_stats(comment, using)
+
+
+def store_object_stats_state_on_pre_save(
+    sender, instance, raw, using, **kwargs
+):
+    # What the comment looked like before the save, to update the
+    # counters of the object's stats with the difference.
+    if raw or instance.pk is None or getattr(instance, "_skip_stats", False):
+        return
+    instance._stats_state = (
+        type(instance)
+        ._base_manager.using(using)
+        .filter(pk=instance.pk)
+        .values("is_public", "is_removed", "submit_date")
+        .first()
+    )
+
+
+def update_object_stats_on_post_save(
+    sender, instance, raw, using, created, **kwargs
+):
+    if raw or getattr(instance, "_skip_stats", False):
+        return
+    if created:
+        old = None
+    elif hasattr(instance, "_stats_state"):
+        old = instance._stats_state
+        del instance._stats_state
+    else:
+        update_object_stats(instance, using)
+        return
+
+    was_visible = bool(old) and old["is_public"] and not old["is_removed"]
+    was_removed = bool(old) and old["is_removed"]
+    visible = is_visible(instance)
+    # The last date is read again if it may belong to this comment.
+    refresh = was_visible and (
+        not visible or old["submit_date"] != instance.submit_date
+    )
+    update_object_stats_counters(
+        instance,
+        using,
+        last_submit_date=instance.submit_date if visible else None,
+        refresh_last_submit_date=refresh,
+        public_count=visible - was_visible,
+        removed_count=instance.is_removed - was_removed,
+        total_count=int(old is None),
+    )
+
+
+def get_feedback_object_lookup(instance, **kwargs):
+    """
+    Returns the content type, object and site of the comment that receives
+    the reaction, vote or flag `instance`, as lookup arguments. Returns None
+    for the signals sent before m2m changes.
+    """
+    # Only m2m_changed signals send an action.
+    if not kwargs.get("action", "post_").startswith("post_"):
+        return None
+    comment_id = getattr(instance, "comment_id", None)
+    if comment_id is None:
+        return None
+    return (
+        Comment.objects.filter(pk=comment_id)
+        .values("content_type_id", "object_pk", "site_id")
+        .first()
+    )
+
+
+def touch_object_stats_on_feedback_change(sender, instance, **kwargs):
+    lookup = get_feedback_object_lookup(instance, **kwargs)
+    if lookup:
+        CommentObjectStats.objects.using(kwargs.get("using")).filter(
+            **lookup
+        ).update(last_modified=timezone.now())
+
+
+def get_comment_counts(content_type, object_pks, site_id):
+    """
+    Returns a dictionary with the number of comments posted to each of the
+    objects of the given `content_type` whose pk is in `object_pks`. Counts
+    are read from CommentObjectStats, and objects without stats are counted
+    at once with a single GROUP BY query.
+    """
+    object_pks = [force_str(object_pk) for object_pk in object_pks]
+    counts = dict.fromkeys(object_pks, 0)
+    fkwds = {"content_type": content_type, "site_id": site_id}
+    hide_removed = getattr(settings, "COMMENTS_HIDE_REMOVED", True)
+
+    missing_pks = object_pks
+    if hide_removed:
+        stats = dict(
+            CommentObjectStats.objects.filter(
+                object_pk__in=object_pks, **fkwds
+            ).values_list("object_pk", "public_count")
+        )
+        counts.update(stats)
+        missing_pks = [pk for pk in object_pks if pk not in stats]
+
+    if missing_pks:
+        qs = get_model().objects.filter(
+            object_pk__in=missing_pks, is_public=True, **fkwds
+        )
+        if hide_removed:
+            qs = qs.filter(is_removed=False)
+        counts.update(
+            qs.order_by()
+            .values("object_pk")
+            .annotate(count=Count("pk"))
+            .values_list("object_pk", "count")
+        )
+    return counts
+
+
+# ----------------------------------------------------------------------
+class FollowupNotification(models.Model):
+    """
+    Follow-up notification email waiting in the outbox, stored when the
+    setting `COMMENTS_XTD_FOLLOWUP_OUTBOX` is True. Notifications are sent,
+    and deleted, by the management command `send_followup_notifications`.
+    """
+
+    # The comment the follower is notified about.
+    comment = models.ForeignKey(
+        get_model(),
+        related_name="followup_notifications",
+        on_delete=models.CASCADE,
+    )
+    # A previous comment of the follower, that provides the name, the email
+    # address and the key to mute the thread.
+    follower_comment = models.ForeignKey(
+        get_model(),
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    # The notification is not sent before this date.
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set when the notification could not be sent in the maximum attempts.
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = _("follow-up notification")
+        verbose_name_plural = _("follow-up notifications")
+        indexes: ClassVar = [
+            models.Index(
+                fields=["failed", "send_after"],
+                name="djcx_followup_outbox_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"c{self.comment_id} to c{self.follower_comment_id}"
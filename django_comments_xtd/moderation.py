@@ -5,8 +5,9 @@ from django_comments.models import CommentFlag
 from django_comments.moderation import CommentModerator, Moderator
 from django_comments.signals import comment_was_flagged, comment_will_be_posted
 
+from django_comments_xtd.blacklist import is_blacklisted_domain
 from django_comments_xtd.conf import settings
-from django_comments_xtd.models import BlackListedDomain, TmpXtdComment
+from django_comments_xtd.models import TmpXtdComment
 from django_comments_xtd.signals import confirmation_received
 from django_comments_xtd.utils import send_mail
 
@@ -56,7 +57,7 @@ class XtdCommentModerator(CommentModerator):
             "request": request,
         }
         subject = (
-            f'[{c["current_site"].name}] Comment removal '
+            f"[{c['current_site'].name}] Comment removal "
             f'suggestion on "{content_object}"'
         )
         message = t.render(c)
@@ -88,6 +89,10 @@ class SpamModerator(XtdCommentModerator):
     ``SpamModerator`` uses the additional ``django_comments_xtd`` model:
      * ``BlackListedDomain``
 
+    Domains are matched against an in-memory index of the model, see the
+    module ``django_comments_xtd.blacklist``. Subdomains of a blacklisted
+    domain are blacklisted too.
+
     Remember to update the content regularly through an external Spam
     filtering service.
     """
@@ -98,7 +103,7 @@ class SpamModerator(XtdCommentModerator):
         except IndexError:
             return False
         else:
-            if BlackListedDomain.objects.filter(domain=domain).count():
+            if is_blacklisted_domain(domain):
                 return False
             return super().allow(comment, content_object, request)
 
@@ -35,16 +35,52 @@ start of the base64 pickle.
 
 There are 65 url-safe characters: the 64 used by url-safe base64 and the '.'.
 These functions make use of all of them.
+
+The keys of the confirmation and mute URLs are made with dumps_comment(), that
+signs a versioned JSON list of comment fields with django.core.signing. The
+keys are decoded by loads_comment() without querying the database. Keys made
+with dumps() by previous versions are still accepted by loads_comment() while
+the setting COMMENTS_XTD_ACCEPT_PICKLED_KEYS is True.
 """
 
 import base64
 import hashlib
 import hmac
 import pickle
+from datetime import datetime
 
 import six
+from django.contrib.contenttypes.models import ContentType
+from django.core import signing
+from django.utils.encoding import force_str
 
 from django_comments_xtd.conf import settings
+from django_comments_xtd.models import TmpXtdComment
+
+# Version of the keys made by dumps_comment().
+COMMENT_KEY_VERSION = 2
+
+# Comment fields stored in the keys, in this order.
+COMMENT_KEY_FIELDS = (
+    "content_type",
+    "object_pk",
+    "site_id",
+    "user_name",
+    "user_email",
+    "submit_date",
+    "followup",
+    "user_url",
+    "comment",
+    "ip_address",
+    "is_public",
+    "is_removed",
+    "level",
+    "order",
+    "parent_id",
+)
+
+# Mute keys only store the fields needed to find the comments to mute.
+MUTE_KEY_FIELDS = COMMENT_KEY_FIELDS[:7]
 
 
 def dumps(obj, key=None, compress=False, extra_key=b""):
@@ -99,6 +135,75 @@ def loads(s, key=None, extra_key=b""):
     return pickle.loads(pickled)
 
 
+def get_comment_key_salt(extra_key):
+    return f"django_comments_xtd.signed{force_str(extra_key)}"
+
+
+def get_comment_key_value(comment, field):
+    if field == "content_type":
+        # Read from the cache of content types, instead of the comment.
+        ct_id = getattr(comment, "content_type_id", None)
+        if ct_id:
+            ctype = ContentType.objects.get_for_id(ct_id)
+        else:
+            ctype = comment.content_type
+        return f"{ctype.app_label}.{ctype.model}"
+    if field == "submit_date":
+        return comment.submit_date.isoformat()
+    return getattr(comment, field)
+
+
+def dumps_comment(comment, fields=COMMENT_KEY_FIELDS, extra_key=b""):
+    """
+    Returns a URL-safe key with the given `fields` of `comment`, either an
+    XtdComment or a TmpXtdComment. `fields` must be a leading slice of
+    COMMENT_KEY_FIELDS, at least as long as MUTE_KEY_FIELDS. The key is a
+    compressed JSON list, made of the key version followed by the field
+    values, signed with HMAC SHA-256.
+    """
+    if (
+        len(fields) < len(MUTE_KEY_FIELDS)
+        or fields != COMMENT_KEY_FIELDS[: len(fields)]
+    ):
+        raise ValueError("fields must start with MUTE_KEY_FIELDS")
+    payload = [
+        COMMENT_KEY_VERSION,
+        *(get_comment_key_value(comment, field) for field in fields),
+    ]
+    return signing.dumps(
+        payload, salt=get_comment_key_salt(extra_key), compress=True
+    )
+
+
+def loads_comment(s, extra_key=b""):
+    """
+    Reverse of dumps_comment(), returns a TmpXtdComment. Its content type
+    and target object are read when they are first accessed. Raises
+    BadSignature if the signature fails or the key is malformed.
+    """
+    s = force_str(s)
+    # Keys made by dumps() don't contain ':'.
+    if ":" not in s:
+        if not settings.COMMENTS_XTD_ACCEPT_PICKLED_KEYS:
+            raise BadSignature("Pickled keys are no longer accepted")
+        return loads(s, extra_key=extra_key)
+    try:
+        payload = signing.loads(s, salt=get_comment_key_salt(extra_key))
+    except signing.BadSignature as exc:
+        raise BadSignature(str(exc)) from exc
+    if not isinstance(payload, list) or not payload:
+        raise BadSignature("Malformed key")
+    version, *values = payload
+    if version != COMMENT_KEY_VERSION:
+        raise BadSignature(f"Unsupported key version: {version}")
+    if not len(MUTE_KEY_FIELDS) <= len(values) <= len(COMMENT_KEY_FIELDS):
+        raise BadSignature("Malformed key")
+    data = dict(zip(COMMENT_KEY_FIELDS, values, strict=False))
+    data["content_type_key"] = tuple(data.pop("content_type").split(".", 1))
+    data["submit_date"] = datetime.fromisoformat(data["submit_date"])
+    return TmpXtdComment(data)
+
+
 def encode(s):
     return base64.urlsafe_b64encode(s).strip(b"=")
 
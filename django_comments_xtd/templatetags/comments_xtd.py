@@ -2,18 +2,23 @@
 import copy
 import hashlib
 import logging
+from collections import Counter, defaultdict
 
 try:
     from urllib.parse import urlencode
 except ImportError:
     from urllib import urlencode
 from django import template
+from django.contrib.auth.context_processors import PermWrapper
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, QuerySet
 from django.http import Http404
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.encoding import force_str
 from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
+from django_comments.models import CommentFlag
 from django_comments.templatetags.comments import (
     BaseCommentNode,
     RenderCommentFormNode,
@@ -21,12 +26,31 @@ from django_comments.templatetags.comments import (
 
 from django_comments_xtd import get_model as get_comment_model
 from django_comments_xtd import get_reaction_enum
+from django_comments_xtd.cache import (
+    CSRF_TOKEN_PLACEHOLDER,
+    USER_FEEDBACK_RE,
+    SharedListUser,
+    get_list_cache,
+    get_list_cache_key,
+    is_list_cache_enabled,
+    mark_user_feedback,
+    replace_user_feedback,
+)
 from django_comments_xtd.conf import settings
+from django_comments_xtd.models import (
+    CommentObjectStats,
+    CommentReaction,
+    CommentVote,
+    filter_by_thread_branch,
+    get_comment_counts,
+)
 from django_comments_xtd.templating import get_template_list
 from django_comments_xtd.utils import (
     get_app_model_config,
+    get_current_site_id,
     get_list_order,
     get_max_thread_level,
+    get_nested_comments_map,
 )
 
 XtdComment = get_comment_model()
@@ -158,6 +182,60 @@ class RenderXtdCommentListNode(XtdCommentListNode):
                 include_vars=include_vars,
             )
 
+    def get_queryset(self, context):
+        # The thread is needed to display the score of comments at level 0.
+        return super().get_queryset(context).select_related("thread")
+
+    def get_user_reactions_map(self, user, qs):
+        """
+        Returns a dictionary that maps the IDs of the comments in the
+        queryset `qs` to the list of reactions the `user` sent to them.
+        """
+        user_reactions_map = defaultdict(list)
+        reactions_qs = (
+            CommentReaction.objects.filter(
+                comment__in=qs.values("pk"), authors=user
+            )
+            .order_by("reaction")
+            .values_list("comment_id", "reaction")
+        )
+        for comment_id, reaction in reactions_qs:
+            user_reactions_map[comment_id].append(reaction)
+        return dict(user_reactions_map)
+
+    def get_user_votes_map(self, user, qs):
+        """
+        Returns a dictionary that maps the IDs of the comments in the
+        queryset `qs` to the vote the `user` sent to them.
+        """
+        user_votes_map = {}
+        votes_qs = CommentVote.objects.filter(
+            comment__in=qs.filter(level=0).values("pk"), author=user
+        ).values_list("comment_id", "vote")
+        for comment_id, vote in votes_qs:
+            if comment_id in user_votes_map:
+                logger.error(
+                    "More than one CommentVote for comment ID "
+                    f"{comment_id} and user {user}."
+                )
+                user_votes_map[comment_id] = ""
+            else:
+                user_votes_map[comment_id] = vote
+        return user_votes_map
+
+    def get_user_flags(self, user, qs):
+        """
+        Returns the set of IDs of the comments in the queryset `qs` that
+        the `user` flagged as inappropriate.
+        """
+        return set(
+            CommentFlag.objects.filter(
+                comment__in=qs.values("pk"),
+                user=user,
+                flag=CommentFlag.SUGGEST_REMOVAL,
+            ).values_list("comment_id", flat=True)
+        )
+
     def render(self, context):
         ctype, object_pk = self.get_target_ctype_pk(context)
         if not object_pk:
@@ -168,32 +246,175 @@ class RenderXtdCommentListNode(XtdCommentListNode):
             flat_ctx[var_name] = var_expr.resolve(context)
 
         highlight_cid = context.request.session.pop("djcx_highlight_cid", None)
+        theme = flat_ctx.get("comments_theme", settings.COMMENTS_XTD_THEME)
         template_search_list = get_template_list(
             "list",
             app_label=ctype.app_label,
             model=ctype.model,
-            theme=flat_ctx.get("comments_theme", settings.COMMENTS_XTD_THEME),
+            theme=theme,
         )
         options = get_app_model_config(content_type=ctype)
         check_input_allowed_str = options.pop("check_input_allowed")
         check_func = import_string(check_input_allowed_str)
         target_obj = ctype.get_object_for_this_type(pk=object_pk)
         options["comments_input_allowed"] = check_func(target_obj)
+        options.update(self.options_enabled)
 
-        flat_ctx.update(
+        # Fetch all the comments in one query, and group them by parent
+        # so that render_xtdcomment_thread doesn't need to hit the DB.
+        # Flags and reactions displayed with each comment are prefetched.
+        qs = all_qs = self.get_queryset(context)
+        max_thread_level = get_max_thread_level(ctype)
+        max_replies = settings.COMMENTS_XTD_LIST_MAX_REPLIES
+        if max_replies and max_thread_level:
+            # Render only the first replies of each thread. The rest
+            # are fetched on demand with the view `RepliesView`.
+            qs = filter_by_thread_branch(qs, 0, max_replies + 1)
+
+        user = context.request.user
+        cache_key = None
+        if self.is_cacheable(context, highlight_cid):
+            cache_key = get_list_cache_key(
+                ctype.pk,
+                object_pk,
+                get_current_site_id(context.request),
+                theme,
+                options,
+                user.is_authenticated,
+            )
+            liststr = get_list_cache().get(cache_key)
+            if liststr is not None:
+                return self.personalize(
+                    liststr, context, {**flat_ctx, **options}, qs
+                )
+            # The list is shared by all users, so it can't contain
+            # the CSRF token nor the feedback of the current one.
+            shared_ctx = {**flat_ctx, "csrf_token": CSRF_TOKEN_PLACEHOLDER}
+            if user.is_authenticated:
+                shared_user = SharedListUser()
+                shared_ctx.update(
+                    {
+                        "user": shared_user,
+                        "perms": PermWrapper(shared_user),
+                        "user_reactions_map": {},
+                        "user_votes_map": {},
+                        "user_feedback_marks": True,
+                    }
+                )
+        if options.get("comments_flagging_enabled", False) or options.get(
+            "comments_reacting_enabled", False
+        ):
+            qs = qs.prefetch_related(*self.comment_model.get_prefetch_lookups())
+        comment_list = list(self.get_context_value_from_queryset(context, qs))
+
+        list_ctx = shared_ctx if cache_key else flat_ctx
+        list_ctx.update(
             {
                 "highlight_cid": highlight_cid,
-                "max_thread_level": get_max_thread_level(ctype),
-                "comment_list": self.get_context_value_from_queryset(
-                    context, self.get_queryset(context)
+                "max_thread_level": max_thread_level,
+                "comment_list": comment_list,
+                "nested_comments_map": get_nested_comments_map(comment_list),
+                "more_replies_map": (
+                    get_more_replies_map(comment_list, all_qs)
+                    if max_replies
+                    else {}
                 ),
                 "reply_stack": [],  # List to control comment replies rendering.
             }
         )
-        flat_ctx.update(options)
-        flat_ctx.update(self.options_enabled)
-        liststr = render_to_string(template_search_list, flat_ctx)
-        return liststr
+        list_ctx.update(options)
+
+        if cache_key:
+            liststr = render_to_string(template_search_list, list_ctx)
+            get_list_cache().set(
+                cache_key, liststr, settings.COMMENTS_XTD_LIST_CACHE_TIMEOUT
+            )
+            return self.personalize(
+                liststr, context, {**flat_ctx, **options}, qs
+            )
+
+        # Load the user's reactions and votes for all the comments at
+        # once, to be read by get_user_reactions and get_user_vote.
+        if user.is_authenticated and comment_list:
+            flat_ctx.update(self.get_user_feedback_maps(user, qs, options))
+        return render_to_string(template_search_list, flat_ctx)
+
+    def get_user_feedback_maps(self, user, qs, options):
+        user_maps = {}
+        if options.get("comments_reacting_enabled", False):
+            user_maps["user_reactions_map"] = self.get_user_reactions_map(
+                user, qs
+            )
+        if options.get("comments_voting_enabled", False):
+            user_maps["user_votes_map"] = self.get_user_votes_map(user, qs)
+        return user_maps
+
+    def personalize(self, liststr, context, flat_ctx, qs):
+        """
+        Fills in the shared list `liststr` the CSRF token of the request
+        and, for logged in users, the parts that show their feedback,
+        rendered with the context `flat_ctx`.
+        """
+        liststr = self.replace_csrf_token(liststr, context)
+        user = context.request.user
+        if not user.is_authenticated:
+            return liststr
+
+        # Only the comments the user sent feedback to are rendered again.
+        user_ctx = self.get_user_feedback_maps(user, qs, flat_ctx)
+        comment_ids = set()
+        for user_map in user_ctx.values():
+            comment_ids.update(user_map)
+        if flat_ctx.get("comments_flagging_enabled", False):
+            comment_ids.update(self.get_user_flags(user, qs))
+        comments = {}
+        if comment_ids:
+            comments = (
+                self.comment_model.objects.select_related("thread")
+                .prefetch_related(*self.comment_model.get_prefetch_lookups())
+                .in_bulk(comment_ids)
+            )
+
+        def render_user_feedback(template_name, comment_id):
+            comment = comments.get(comment_id)
+            if comment is None:
+                return None
+            html = render_to_string(
+                template_name,
+                {
+                    **flat_ctx,
+                    **user_ctx,
+                    "comment": comment,
+                    "anchor": get_anchor(comment),
+                    "user_feedback_marks": True,
+                },
+            )
+            # Leave out what the template renders around the tag.
+            return USER_FEEDBACK_RE.search(html).group("html")
+
+        return replace_user_feedback(liststr, render_user_feedback)
+
+    def is_cacheable(self, context, highlight_cid):
+        """
+        Rendered lists are cached when no comment has to be highlighted.
+        Lists are shared by all anonymous users, and by all logged in
+        users but moderators, that see the flags of every comment.
+        Variables passed with `with`, other than the theme, can change
+        the output too, so they prevent caching.
+        """
+        return (
+            is_list_cache_enabled()
+            and not context.request.user.has_perm("comments.can_moderate")
+            and highlight_cid is None
+            and all(name == "comments_theme" for name, _ in self.include_vars)
+        )
+
+    def replace_csrf_token(self, liststr, context):
+        if CSRF_TOKEN_PLACEHOLDER not in liststr:
+            return liststr
+        return liststr.replace(
+            CSRF_TOKEN_PLACEHOLDER, str(context.get("csrf_token", ""))
+        )
 
 
 @register.tag
@@ -228,6 +449,40 @@ def render_xtdcomment_list(parser, token):
 
 
 # ---------------------------------------------------------------------
+def get_more_replies_map(comment_list, qs):
+    """
+    Returns a dictionary that maps the IDs of the top-level comments in
+    `comment_list` whose replies are not all in the list, to a dictionary
+    with the number of direct replies in the list (`offset`) and the number
+    of replies in `qs`, at any level, left out (`count`).
+    """
+    replies = Counter(cm.thread_id for cm in comment_list if cm.level > 0)
+    branches = Counter(cm.thread_id for cm in comment_list if cm.level == 1)
+    # The nested_count includes non-public comments, so it only tells
+    # which threads may have replies left out.
+    thread_ids = [
+        cm.thread_id
+        for cm in comment_list
+        if cm.level == 0 and cm.nested_count > replies[cm.thread_id]
+    ]
+    if not thread_ids:
+        return {}
+    counts = (
+        qs.filter(thread_id__in=thread_ids, level__gt=0)
+        .order_by()
+        .values_list("thread_id")
+        .annotate(count=Count("pk"))
+    )
+    more_replies_map = {}
+    for thread_id, count in counts:
+        if count > replies[thread_id]:
+            more_replies_map[thread_id] = {
+                "offset": branches[thread_id],
+                "count": count - replies[thread_id],
+            }
+    return more_replies_map
+
+
 class RenderXtdCommentThreadNode(template.Node):
     def __init__(self, comment, comment_list):
         self.comment = template.Variable(comment)
@@ -241,14 +496,20 @@ class RenderXtdCommentThreadNode(template.Node):
             "thread",
             theme=flat_ctx.get("comments_theme", settings.COMMENTS_XTD_THEME),
         )
-        nested_comment_list = comment_list.filter(
-            parent_id=comment.id, level=comment.level + 1
-        )
+        nested_comments_map = flat_ctx.get("nested_comments_map", None)
+        if nested_comments_map is not None:
+            nested_comment_list = nested_comments_map.get(comment.id, [])
+        else:
+            nested_comment_list = comment_list.filter(
+                parent_id=comment.id, level=comment.level + 1
+            )
+        more_replies_map = flat_ctx.get("more_replies_map", {})
         flat_ctx.update(
             {
                 "comment": comment,
                 "nested_comment_list": nested_comment_list,
                 "nested_level": comment.level + 1,
+                "more_replies": more_replies_map.get(comment.id),
             }
         )
         html = render_to_string(template_search_list, flat_ctx)
@@ -281,6 +542,17 @@ class XtdCommentCountNode(BaseXtdCommentNode):
     """Insert a count of comments into the context."""
 
     def get_context_value_from_queryset(self, context, qs):
+        # Read the count from the object's stats, if available.
+        if getattr(settings, "COMMENTS_HIDE_REMOVED", True):
+            ctype, object_pk = self.get_target_ctype_pk(context)
+            if object_pk:
+                count = CommentObjectStats.objects.get_public_count(
+                    ctype,
+                    object_pk,
+                    get_current_site_id(context.get("request")),
+                )
+                if count is not None:
+                    return count
         return qs.count()
 
 
@@ -306,6 +578,71 @@ def get_xtdcomment_count(parser, token):
     return XtdCommentCountNode.handle_token(parser, token)
 
 
+class XtdCommentCountsNode(template.Node):
+    """Insert a dictionary with the comment count of many objects."""
+
+    def __init__(self, object_list, varname):
+        self.object_list = template.Variable(object_list)
+        self.varname = varname
+
+    def render(self, context):
+        object_list = list(self.object_list.resolve(context))
+        counts = {}
+        if object_list:
+            ctype = ContentType.objects.get_for_model(
+                object_list[0],
+                for_concrete_model=settings.COMMENTS_XTD_FOR_CONCRETE_MODEL,
+            )
+            counts_by_pk = get_comment_counts(
+                ctype,
+                [obj.pk for obj in object_list],
+                get_current_site_id(context.get("request")),
+            )
+            counts = {
+                obj.pk: counts_by_pk[force_str(obj.pk)] for obj in object_list
+            }
+        context[self.varname] = counts
+        return ""
+
+
+@register.tag
+def get_xtdcomment_counts(parser, token):
+    """
+    Gets the comment count of every object in the given list, with a single
+    query, and populates the template context with a dictionary that maps
+    each object's pk to its count. All the objects must be instances of
+    the same model. Use the filter `count_for` to read an object's count.
+
+    Syntax::
+
+        {% get_xtdcomment_counts for [object_list] as [varname] %}
+
+    Example usage::
+
+        {% get_xtdcomment_counts for object_list as comment_counts %}
+        {% for object in object_list %}
+          {{ comment_counts|count_for:object }}
+        {% endfor %}
+    """
+    tokens = token.contents.split()
+
+    if len(tokens) != 5 or tokens[1] != "for" or tokens[3] != "as":
+        raise template.TemplateSyntaxError(
+            "Templatetag {% get_xtdcomment_counts for [object_list] as "
+            f"[varname] %}}. found: {{% {token.contents} %}}."
+        )
+    return XtdCommentCountsNode(tokens[2], tokens[4])
+
+
+@register.filter
+def count_for(counts, obj):
+    """
+    Returns the comment count of `obj` from the dictionary built by the
+    template tag `get_xtdcomment_counts`.
+    """
+    return counts.get(obj.pk, 0)
+
+
 # ---------------------------------------------------------------------
 class RenderXtdCommentFormNode(RenderCommentFormNode):
     """
@@ -678,9 +1015,11 @@ def pop_comments_gte(reply_stack, level_lte=0):
 @register.filter
 def comments_level(comment_list, level=0):
     """
-    Return `thread.id` values from the list of comments in `comment_list`.
+    Return the comments in `comment_list` that are at the given `level`.
     """
-    return comment_list.filter(level=level)
+    if isinstance(comment_list, QuerySet):
+        return comment_list.filter(level=level)
+    return [comment for comment in comment_list if comment.level == level]
 
 
 @register.simple_tag(takes_context=True)
@@ -711,6 +1050,11 @@ class GetUserReactionsNode(template.Node):
             context[self.varname] = ""
             return ""
 
+        user_reactions_map = context.get("user_reactions_map", None)
+        if user_reactions_map is not None:
+            context[self.varname] = user_reactions_map.get(comment.pk, [])
+            return ""
+
         qs = comment.reactions.filter(authors__in=[request.user])
         context[self.varname] = [
             item.reaction for item in qs.order_by("reaction")
@@ -757,11 +1101,16 @@ class GetUserVoteNode(template.Node):
             context[self.varname] = ""
             return ""
 
-        qs = comment.votes.filter(author=request.user)
-        if qs.count() == 0:
+        user_votes_map = context.get("user_votes_map", None)
+        if user_votes_map is not None:
+            context[self.varname] = user_votes_map.get(comment.pk, "")
+            return ""
+
+        votes = list(comment.votes.filter(author=request.user)[:2])
+        if len(votes) == 0:
             context[self.varname] = ""
-        elif qs.count() == 1:
-            context[self.varname] = qs[0].vote
+        elif len(votes) == 1:
+            context[self.varname] = votes[0].vote
         else:
             logger.error(
                 "More than one CommentVote for comment ID "
@@ -795,6 +1144,47 @@ def get_user_vote(parser, token):
     return GetUserVoteNode(tokens[2], tokens[4])
 
 
+# ----------------------------------------------------------------------
+class UserFeedbackNode(template.Node):
+    def __init__(self, comment, nodelist):
+        self.comment = template.Variable(comment)
+        self.nodelist = nodelist
+
+    def render(self, context):
+        html = self.nodelist.render(context)
+        if not context.get("user_feedback_marks", False):
+            return html
+        comment = self.comment.resolve(context)
+        return mark_user_feedback(html, self.origin.template_name, comment.pk)
+
+
+@register.tag
+def user_feedback(parser, token):
+    """
+    Wraps the content of a template, included once per comment, that shows
+    the reactions, votes or flags of the logged in user to the comment.
+
+    The template tag `render_xtdcomment_list` caches a list shared by all
+    the logged in users, with no feedback of any user. The templates that
+    use this tag are rendered again for each request, with the variables
+    `comment` and `anchor`, for the comments the user sent feedback to.
+
+    Syntax::
+
+        {% user_feedback for [comment] %}...{% enduser_feedback %}
+    """
+    tokens = token.contents.split()
+
+    if len(tokens) != 3 or tokens[1] != "for":
+        raise template.TemplateSyntaxError(
+            f"Templatetag {tokens[0]!r} syntax is {{% user_feedback for "
+            f"[comment] %}}. found: {{% {token.contents} %}}."
+        )
+    nodelist = parser.parse(("enduser_feedback",))
+    parser.delete_first_token()
+    return UserFeedbackNode(tokens[2], nodelist)
+
+
 # ----------------------------------------------------------------------
 class RenderCommentReactionsPanelTemplate(template.Node):
     def render(self, context):
@@ -250,6 +250,21 @@ template_patterns = {
             "comments/reply_form_js.html",
         ],
     },
+    "replies": {
+        "themed": [
+            "comments/{theme_dir}/{app_label}/{model}/replies.html",
+            "comments/{theme_dir}/{app_label}/replies.html",
+            "comments/{theme_dir}/replies.html",
+            "comments/{app_label}/{model}/replies.html",
+            "comments/{app_label}/replies.html",
+            "comments/replies.html",
+        ],
+        "default": [
+            "comments/{app_label}/{model}/replies.html",
+            "comments/{app_label}/replies.html",
+            "comments/replies.html",
+        ],
+    },
     "reply_template": {
         "themed": [
             "comments/{theme_dir}/{app_label}/{model}/reply_template.html",
@@ -7,7 +7,12 @@ from django.contrib.sites.models import Site
 from django_comments.models import CommentFlag
 
 from django_comments_xtd import get_reaction_enum
-from django_comments_xtd.models import CommentReaction, XtdComment
+from django_comments_xtd.blacklist import bump_blacklist_version
+from django_comments_xtd.models import (
+    BlackListedDomain,
+    CommentReaction,
+    XtdComment,
+)
 from django_comments_xtd.tests.models import Article, Diary, DiaryWithMTL1
 
 
@@ -113,3 +118,14 @@ def a_comments_flag(an_articles_comment, an_user):
     )
     yield comment_flag
     comment_flag.delete()
+
+
+@pytest.fixture
+def a_blacklisted_domain(django_capture_on_commit_callbacks):
+    """Blacklist the domain example.com."""
+    with django_capture_on_commit_callbacks(execute=True):
+        domain = BlackListedDomain.objects.create(domain="example.com")
+    yield domain
+    # The rollback of the test's transaction doesn't bump the version of
+    # the index of blacklisted domains.
+    bump_blacklist_version()
@@ -4,11 +4,15 @@ from unittest.mock import patch
 
 import django_comments
 import pytest
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.db import connection
 from django.db.models.signals import pre_save
+from django.http import Http404
 from django.test import TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.text import slugify
 from rest_framework import status
@@ -22,6 +26,7 @@ from django_comments_xtd import get_model
 from django_comments_xtd.api import views
 from django_comments_xtd.conf import settings
 from django_comments_xtd.models import (
+    CommentObjectStats,
     publish_or_withhold_on_pre_save,
 )
 from django_comments_xtd.tests import views as tviews
@@ -30,6 +35,9 @@ from django_comments_xtd.tests.test_models import (
     thread_test_step_1,
     thread_test_step_2,
     thread_test_step_3,
+    thread_test_step_4,
+    thread_test_step_5,
+    thread_test_step_6,
 )
 from django_comments_xtd.tests.utils import post_comment
 
@@ -167,6 +175,44 @@ class CommentCreateTestCase(DjangoTestCase):
 _cm_model = "django_comments_xtd.tests.models.MyComment"
 
 
+class CommentCountsTestCase(APITestCase):
+    def setUp(self):
+        self.article_1 = Article.objects.create(
+            title="September", slug="september", body="During September..."
+        )
+        self.article_2 = Article.objects.create(
+            title="October", slug="october", body="What I did on October..."
+        )
+
+    def _send_request(self, query_string):
+        url = reverse("comments-xtd-api-counts")
+        req = factory.get(f"{url}?{query_string}")
+        view = views.CommentCounts.as_view()
+        return view(req)
+
+    def test_get_counts(self):
+        thread_test_step_1(self.article_1)
+        thread_test_step_2(self.article_1)
+        thread_test_step_1(self.article_2)
+        # Count the comments of article_2 without stats.
+        CommentObjectStats.objects.filter(object_pk=self.article_2.pk).delete()
+        resp = self._send_request("ct=tests-article&pk=1,2,3")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.rendered_content, b'{"counts":{"1":4,"2":2,"3":0}}'
+        )
+
+    def test_get_counts_with_invalid_content_type(self):
+        for query_string in ["ct=tests&pk=1", "ct=tests-nomodel&pk=1", ""]:
+            resp = self._send_request(query_string)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_get_counts_with_too_many_ids(self):
+        pks = ",".join(str(pk) for pk in range(101))
+        resp = self._send_request(f"ct=tests-article&pk={pks}")
+        self.assertEqual(resp.status_code, 400)
+
+
 class CommentCountTestCase(APITestCase):
     def setUp(self):
         self.article = Article.objects.create(
@@ -190,6 +236,16 @@ class CommentCountTestCase(APITestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.rendered_content, b'{"count":2}')
 
+    def test_get_count_reads_object_stats(self):
+        thread_test_step_1(self.article)
+        stats = CommentObjectStats.objects.get(object_pk="1")
+        self.assertEqual(stats.public_count, 2)
+        # The count comes from the stats, not from the comments table.
+        CommentObjectStats.objects.update(public_count=7)
+        resp = self._send_request()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.rendered_content, b'{"count":7}')
+
     @patch.multiple(
         "django_comments_xtd.conf.settings", COMMENTS_XTD_MODEL=_cm_model
     )
@@ -460,6 +516,172 @@ def test_CommentList_handles_no_ContentType():
     assert response.rendered_content == b"[]"
 
 
+def get_comment_list_page(url=None):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    request = factory.get(
+        url or reverse("comments-xtd-api-list", kwargs=kwargs)
+    )
+    response = views.CommentList.as_view()(request, **kwargs)
+    if response.status_code == status.HTTP_200_OK and not response.streaming:
+        return response, json.loads(response.rendered_content)
+    return response, None
+
+
+def create_comment_list_threads(article):
+    thread_test_step_1(article)
+    thread_test_step_2(article)
+    thread_test_step_3(article)
+    thread_test_step_4(article)
+    thread_test_step_5(article)
+    # -> thread 1: c1, c3, c8, c4, c7; thread 2: c2, c5, c6; thread 9: c9.
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_API_THREADS_PER_PAGE=2
+)
+def test_CommentList_paginates_whole_threads(an_article):
+    create_comment_list_threads(an_article)
+
+    _, page_1 = get_comment_list_page()
+    assert [cm["id"] for cm in page_1["results"]] == [1, 3, 8, 4, 7, 2, 5, 6]
+    assert page_1["previous"] is None
+
+    _, page_2 = get_comment_list_page(page_1["next"])
+    assert [cm["id"] for cm in page_2["results"]] == [9]
+    assert page_2["next"] is None
+
+    _, prev_page = get_comment_list_page(page_2["previous"])
+    assert prev_page["results"] == page_1["results"]
+    assert prev_page["previous"] is None
+    assert prev_page["next"] == page_1["next"]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_API_THREADS_PER_PAGE=1
+)
+def test_CommentList_cursor_is_stable_while_comments_arrive(an_article):
+    create_comment_list_threads(an_article)
+    _, page_1 = get_comment_list_page()
+    assert [cm["id"] for cm in page_1["results"]] == [1, 3, 8, 4, 7]
+
+    # A reply to the first thread and a new thread don't alter page 2.
+    thread_test_step_6(an_article)  # Sends c10 and c11 to thread 1.
+    get_model().objects.create(
+        content_type=ContentType.objects.get_for_model(an_article),
+        object_pk=an_article.pk,
+        site_id=1,
+        comment="c12",
+        submit_date=datetime.now(),
+    )
+    _, page_2 = get_comment_list_page(page_1["next"])
+    assert [cm["id"] for cm in page_2["results"]] == [2, 5, 6]
+    _, page_3 = get_comment_list_page(page_2["next"])
+    _, page_4 = get_comment_list_page(page_3["next"])
+    assert [cm["id"] for cm in page_4["results"]] == [12]
+    assert page_4["next"] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("app_model", ["default", "tests.article"])
+def test_CommentList_paginates_threads_in_descending_order(
+    app_model, an_article
+):
+    create_comment_list_threads(an_article)
+
+    with patch.multiple(
+        "django_comments_xtd.conf.settings",
+        COMMENTS_XTD_API_THREADS_PER_PAGE=2,
+        COMMENTS_XTD_APP_MODEL_CONFIG={
+            app_model: {"list_order": ("-thread__id", "order")}
+        },
+    ):
+        _, page_1 = get_comment_list_page()
+        _, page_2 = get_comment_list_page(page_1["next"])
+    assert [cm["id"] for cm in page_1["results"]] == [9, 2, 5, 6]
+    assert [cm["id"] for cm in page_2["results"]] == [1, 3, 8, 4, 7]
+    assert page_2["next"] is None
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_API_THREADS_PER_PAGE=2
+)
+def test_CommentList_returns_404_for_invalid_cursor(an_article):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    response, _ = get_comment_list_page(f"{url}?cursor=invalid")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def get_streamed_content(response):
+    assert response.streaming
+    return json.loads(b"".join(response.streaming_content))
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_API_STREAM_CHUNK_SIZE=2
+)
+def test_CommentList_streams_the_list(an_article):
+    create_comment_list_threads(an_article)
+    _, data = get_comment_list_page()
+
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    response, _ = get_comment_list_page(f"{url}?stream=1")
+    assert response["Content-Type"] == "application/json"
+    assert get_streamed_content(response) == data
+    assert [cm["id"] for cm in data] == [1, 3, 8, 4, 7, 2, 5, 6, 9]
+
+
+@pytest.mark.django_db
+def test_CommentList_with_values_serializer_returns_same_data(an_article):
+    create_comment_list_threads(an_article)
+    _, data = get_comment_list_page()
+
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    with patch.multiple(
+        "django_comments_xtd.conf.settings",
+        COMMENTS_XTD_API_VALUES_SERIALIZER=True,
+        COMMENTS_XTD_API_STREAM_CHUNK_SIZE=2,
+    ):
+        _, values_data = get_comment_list_page()
+        response, _ = get_comment_list_page(f"{url}?stream=1")
+        streamed_data = get_streamed_content(response)
+    assert values_data == data
+    assert streamed_data == data
+
+
+@pytest.mark.django_db
+def test_CommentList_streams_an_empty_list():
+    kwargs = {"content_type": "this-that", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    request = factory.get(f"{url}?stream=1")
+    response = views.CommentList.as_view()(request, **kwargs)
+    assert get_streamed_content(response) == []
+
+
+@pytest.mark.django_db
+def test_CommentExport_streams_all_comments(an_article, an_user):
+    create_comment_list_threads(an_article)
+    get_model().objects.filter(pk=2).update(is_public=False)
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    request = factory.get(reverse("comments-xtd-api-export", kwargs=kwargs))
+    force_authenticate(request, user=an_user)
+    response = views.CommentExport.as_view()(request, **kwargs)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    an_user.is_staff = True
+    an_user.save()
+    force_authenticate(request, user=an_user)
+    response = views.CommentExport.as_view()(request, **kwargs)
+    data = get_streamed_content(response)
+    assert [cm["id"] for cm in data] == [1, 3, 8, 4, 7, 2, 5, 6, 9]
+
+
 @pytest.mark.django_db
 def test_CommentCount_settings_has_no_SITE_ID(monkeypatch):
     # Remove 'SITE_ID' from settings module, to test that method 'get_queryset'
@@ -474,6 +696,62 @@ def test_CommentCount_settings_has_no_SITE_ID(monkeypatch):
     assert response.rendered_content == b'{"count":0}'
 
 
+@pytest.mark.django_db
+def test_CommentList_answers_conditional_requests(an_article):
+    create_comment_list_threads(an_article)
+    response, data = get_comment_list_page()
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    request = factory.get(url, HTTP_IF_NONE_MATCH=etag)
+    with CaptureQueriesContext(connection) as ctx:
+        response = views.CommentList.as_view()(request, **kwargs)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not any(
+        "django_comments_xtd_xtdcomment" in query["sql"]
+        for query in ctx.captured_queries
+    )
+
+    request = factory.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+    response = views.CommentList.as_view()(request, **kwargs)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Other URLs of the same list get other ETags.
+    response, _ = get_comment_list_page(f"{url}?stream=1")
+    assert response["ETag"] != etag
+
+    # A new comment changes the ETag.
+    thread_test_step_6(an_article)
+    request = factory.get(url, HTTP_IF_NONE_MATCH=etag)
+    response = views.CommentList.as_view()(request, **kwargs)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+    assert len(json.loads(response.rendered_content)) == len(data) + 2
+
+
+@pytest.mark.django_db
+def test_CommentList_without_stats_has_no_ETag():
+    response, data = get_comment_list_page()
+    assert response.status_code == status.HTTP_200_OK
+    assert data == []
+    assert not response.has_header("ETag")
+
+
+@pytest.mark.django_db
+def test_CommentCount_answers_conditional_requests(an_articles_comment):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-count", kwargs=kwargs)
+    view = views.CommentCount.as_view()
+    response = view(factory.get(url), **kwargs)
+    assert response.status_code == status.HTTP_200_OK
+
+    request = factory.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    response = view(request, **kwargs)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
 # ---------------------------------------------------------------------
 @pytest.mark.django_db
 def test_PostCommentReaction_raises_403(an_articles_comment, an_user):
@@ -555,6 +833,7 @@ def test_CommentReactionAuthorsList(
         with patch(
             "django_comments_xtd.conf.settings",
             ROOT_URLCONF="django_comments_xtd.tests.urls_alt",
+            COMMENTS_XTD_TREE_BACKEND="django_comments_xtd.tree.OrderTreeBackend",
         ):
             request = factory.get(
                 reverse("comments-xtd-comment-reaction-authors", kwargs=kwargs)
@@ -604,3 +883,110 @@ def test_CommentReactionAuthorsList_may_be_empty(an_articles_comment):
     assert data["count"] == 0
     assert "results" in data
     assert data["results"] == []
+
+
+@pytest.mark.django_db
+def test_CommentReactionAuthorsList_changes_ETag_on_new_reaction(
+    monkeypatch, an_articles_comment, an_user, an_user_2
+):
+    monkeypatch.setattr(views, "check_option", lambda *x, **y: True)
+    data = {"reaction": "+", "comment": an_articles_comment.pk}
+    _send_reaction(data, an_user)
+
+    kwargs = {"comment_pk": an_articles_comment.pk, "reaction_value": "+"}
+    url = reverse("comments-xtd-comment-reaction-authors", kwargs=kwargs)
+    view = views.CommentReactionAuthorsList.as_view()
+    etag = view(factory.get(url), **kwargs)["ETag"]
+    response = view(factory.get(url, HTTP_IF_NONE_MATCH=etag), **kwargs)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    _send_reaction(data, an_user_2)
+    response = view(factory.get(url, HTTP_IF_NONE_MATCH=etag), **kwargs)
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.rendered_content)["count"] == 2
+
+
+def call_async_view(view, url, headers=None, **kwargs):
+    request = factory.get(url, headers=headers)
+    return async_to_sync(view.as_view())(request, **kwargs)
+
+
+@pytest.mark.django_db
+def test_AsyncCommentList_returns_the_same_list(an_article):
+    create_comment_list_threads(an_article)
+    response, data = get_comment_list_page()
+
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    async_response = call_async_view(views.AsyncCommentList, url, **kwargs)
+    assert async_response.status_code == status.HTTP_200_OK
+    assert json.loads(async_response.content) == data
+    assert async_response["ETag"] == response["ETag"]
+
+    headers = {"If-None-Match": response["ETag"]}
+    with CaptureQueriesContext(connection) as ctx:
+        async_response = call_async_view(
+            views.AsyncCommentList, url, headers=headers, **kwargs
+        )
+    assert async_response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not any(
+        "django_comments_xtd_xtdcomment" in query["sql"]
+        for query in ctx.captured_queries
+    )
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_API_THREADS_PER_PAGE=2
+)
+def test_AsyncCommentList_paginates_and_streams_the_list(an_article):
+    create_comment_list_threads(an_article)
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-list", kwargs=kwargs)
+    _, page_1 = get_comment_list_page()
+
+    response = call_async_view(views.AsyncCommentList, page_1["next"], **kwargs)
+    _, page_2 = get_comment_list_page(page_1["next"])
+    assert json.loads(response.content) == page_2
+
+    response = call_async_view(
+        views.AsyncCommentList, f"{url}?cursor=nope", **kwargs
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    async def read_streamed_content(response):
+        assert response.is_async
+        return b"".join([chunk async for chunk in response])
+
+    response = call_async_view(
+        views.AsyncCommentList, f"{url}?stream=1", **kwargs
+    )
+    content = async_to_sync(read_streamed_content)(response)
+    expected, _ = get_comment_list_page(f"{url}?stream=1")
+    assert json.loads(content) == get_streamed_content(expected)
+    assert len(json.loads(content)) == 9
+
+
+@pytest.mark.django_db
+def test_AsyncCommentCount_returns_the_count(an_articles_comment):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    url = reverse("comments-xtd-api-count", kwargs=kwargs)
+    response = call_async_view(views.AsyncCommentCount, url, **kwargs)
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.content) == {"count": 1}
+
+    headers = {"If-None-Match": response["ETag"]}
+    response = call_async_view(
+        views.AsyncCommentCount, url, headers=headers, **kwargs
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    CommentObjectStats.objects.all().delete()
+    response = call_async_view(views.AsyncCommentCount, url, **kwargs)
+    assert json.loads(response.content) == {"count": 1}
+    assert not response.has_header("ETag")
+
+    kwargs["content_type"] = "this-that"
+    url = reverse("comments-xtd-api-count", kwargs=kwargs)
+    with pytest.raises(Http404):
+        call_async_view(views.AsyncCommentCount, url, **kwargs)
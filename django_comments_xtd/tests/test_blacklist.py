@@ -0,0 +1,54 @@
+import pytest
+
+from django_comments_xtd import blacklist
+from django_comments_xtd.models import BlackListedDomain
+
+
+def test_DomainIndex_matches_domains_and_subdomains():
+    index = blacklist.DomainIndex(["Spam.example", "junk.test."], "v1")
+    assert "spam.example" in index
+    assert "mail.SPAM.example" in index
+    assert "a.b.junk.test" in index
+    assert "example" not in index
+    assert "notspam.example" not in index
+    assert "spam.example.org" not in index
+
+
+@pytest.mark.django_db
+def test_domain_index_is_reloaded_when_domains_change(
+    django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        domain = BlackListedDomain.objects.create(domain="spam.example")
+    assert blacklist.is_blacklisted_domain("www.spam.example")
+    # The index is kept in memory while the domains don't change.
+    with django_assert_num_queries(0):
+        assert blacklist.is_blacklisted_domain("spam.example")
+        assert not blacklist.is_blacklisted_domain("ham.example")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        BlackListedDomain.objects.create(domain="ham.example")
+    assert blacklist.is_blacklisted_domain("ham.example")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        domain.delete()
+        BlackListedDomain.objects.all().delete()
+    assert not blacklist.is_blacklisted_domain("spam.example")
+    assert not blacklist.is_blacklisted_domain("ham.example")
+
+
+@pytest.mark.django_db
+def test_domain_index_version_is_bumped_on_commit(
+    django_capture_on_commit_callbacks,
+):
+    assert not blacklist.is_blacklisted_domain("spam.example")
+    with django_capture_on_commit_callbacks() as callbacks:
+        domain = BlackListedDomain.objects.create(domain="spam.example")
+    # Until the transaction is committed, the index keeps its version.
+    assert not blacklist.is_blacklisted_domain("spam.example")
+
+    for callback in callbacks:
+        callback()
+    assert blacklist.is_blacklisted_domain("spam.example")
+    with django_capture_on_commit_callbacks(execute=True):
+        domain.delete()
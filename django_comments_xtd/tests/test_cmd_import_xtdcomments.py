@@ -0,0 +1,265 @@
+import csv
+import json
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+
+from django_comments_xtd.management.commands.import_xtdcomments import (
+    Command,
+)
+from django_comments_xtd.models import CommentThread, XtdComment
+
+# Two threads: 'a1' has nested replies, 'b1' has one reply. The reply
+# 'c1' points to a comment of an earlier thread.
+RECORDS = [
+    ("a1", None, "Alice"),
+    ("a2", "a1", "Bob"),
+    ("b1", None, "Charlie"),
+    ("b2", "b1", "Alice"),
+    ("c1", "a2", "Dave"),
+]
+
+
+def write_jsonl(path, an_article, records=RECORDS):
+    with path.open("w") as f:
+        for source_id, parent_id, name in records:
+            record = {
+                "id": source_id,
+                "parent_id": parent_id,
+                "content_type": "tests.article",
+                "object_pk": an_article.pk,
+                "user_name": name,
+                "user_email": f"{name.lower()}@example.com",
+                "comment": f"Comment {source_id}",
+                "submit_date": "2024-01-01T10:00:00",
+                "followup": name == "Alice",
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+def import_comments(path, *args):
+    out = StringIO()
+    call_command("import_xtdcomments", str(path), *args, stdout=out)
+    return out.getvalue()
+
+
+def get_tree():
+    return [
+        (cm.comment, cm.thread_id == cm.pk, cm.level, cm.order, cm.nested_count)
+        for cm in XtdComment.objects.order_by("thread_id", "order")
+    ]
+
+
+@pytest.mark.django_db
+def test_command_imports_threads_from_jsonl(tmp_path, an_article):
+    records = [
+        ("a1", None, "Alice"),
+        ("a2", "a1", "Bob"),
+        ("a3", "a2", "Charlie"),
+        ("a4", "a1", "Dave"),
+        ("b1", "", "Bob"),
+    ]
+    path = tmp_path / "comments.jsonl"
+    write_jsonl(path, an_article, records)
+
+    out = import_comments(path)
+    assert "Imported 5 XtdComment object(s)." in out
+    assert get_tree() == [
+        ("Comment a1", True, 0, 1, 3),
+        ("Comment a2", False, 1, 2, 1),
+        ("Comment a3", False, 2, 3, 0),
+        ("Comment a4", False, 1, 4, 0),
+        ("Comment b1", True, 0, 1, 0),
+    ]
+    a1, a2, a3, a4, b1 = XtdComment.objects.order_by("pk")
+    assert CommentThread.objects.count() == 2
+    assert (a2.parent_id, a3.parent_id, a4.parent_id) == (a1.pk, a2.pk, a1.pk)
+    assert a3.path == f"{a1.pk:010d}/{a2.pk:010d}/{a3.pk:010d}"
+    assert a1.content_object == an_article
+    assert (a1.followup, a2.followup) == (True, False)
+    # The comments are visible through the regular API.
+    assert list(XtdComment.objects.for_model(an_article)) == [
+        a1,
+        a2,
+        a3,
+        a4,
+        b1,
+    ]
+
+
+@pytest.mark.django_db
+def test_command_imports_csv_and_replies_of_other_threads(tmp_path, an_article):
+    path = tmp_path / "comments.csv"
+    lines = ["id,parent_id,object_pk,user_name,comment,submit_date,is_public"]
+    for source_id, parent_id, name in RECORDS:
+        lines.append(
+            f"{source_id},{parent_id or ''},{an_article.pk},{name},"
+            f"Comment {source_id},2024-01-01 10:00:00,1"
+        )
+    path.write_text("\n".join(lines) + "\n")
+
+    out = import_comments(
+        path, "--content-type=tests.article", "--allow-orphans"
+    )
+    assert "Imported 5 XtdComment object(s)." in out
+    assert "1 replies without a parent comment" in out
+    assert get_tree() == [
+        ("Comment a1", True, 0, 1, 1),
+        ("Comment a2", False, 1, 2, 0),
+        ("Comment b1", True, 0, 1, 1),
+        ("Comment b2", False, 1, 2, 0),
+        ("Comment c1", True, 0, 1, 0),
+    ]
+
+
+@pytest.mark.django_db
+def test_command_resumes_from_the_checkpoint(tmp_path, an_article):
+    path = tmp_path / "comments.jsonl"
+    checkpoint = tmp_path / "comments.checkpoint"
+    write_jsonl(path, an_article)
+    insert_xtdcomments = Command.insert_xtdcomments
+    calls = []
+
+    def fail_second_batch(self, connection, comments):
+        calls.append(comments)
+        if len(calls) == 2:
+            raise DatabaseError("Connection lost")
+        insert_xtdcomments(self, connection, comments)
+
+    args = ("--batch-size=2", f"--checkpoint={checkpoint}", "--allow-orphans")
+
+    # Threads 'a1' and 'b1' go in different batches, the second one fails.
+    with (
+        patch.object(Command, "insert_xtdcomments", fail_second_batch),
+        pytest.raises(DatabaseError),
+    ):
+        import_comments(path, *args)
+    assert json.loads(checkpoint.read_text())["records"] == 2
+    assert XtdComment.objects.count() == 2
+    # The failed batch was rolled back.
+    assert CommentThread.objects.count() == 1
+
+    out = import_comments(path, *args)
+    assert "Resuming the import after record 2." in out
+    assert "Imported 5 XtdComment object(s)." in out
+    assert [cm[0] for cm in get_tree()] == [
+        "Comment a1",
+        "Comment a2",
+        "Comment b1",
+        "Comment b2",
+        "Comment c1",
+    ]
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+def test_command_resumes_when_the_checkpoint_is_ahead(tmp_path, an_article):
+    path = tmp_path / "comments.jsonl"
+    checkpoint = tmp_path / "comments.checkpoint"
+    write_jsonl(path, an_article, RECORDS[:4])
+    write_checkpoint = Command.write_checkpoint
+    calls = []
+
+    def fail_second_commit(self, *args, **kwargs):
+        write_checkpoint(self, *args, **kwargs)
+        calls.append(args)
+        if len(calls) == 2:
+            raise DatabaseError("Connection lost")
+
+    # The second checkpoint is written, but its batch is rolled back.
+    args = ("--batch-size=2", f"--checkpoint={checkpoint}")
+    with (
+        patch.object(Command, "write_checkpoint", fail_second_commit),
+        pytest.raises(DatabaseError),
+    ):
+        import_comments(path, *args)
+    assert json.loads(checkpoint.read_text())["records"] == 4
+    assert XtdComment.objects.count() == 2
+
+    out = import_comments(path, *args)
+    assert "Resuming the import after record 2." in out
+    assert "Imported 4 XtdComment object(s)." in out
+    assert [cm[0] for cm in get_tree()] == [
+        "Comment a1",
+        "Comment a2",
+        "Comment b1",
+        "Comment b2",
+    ]
+
+
+@pytest.mark.django_db
+def test_command_raises_on_orphans(tmp_path, an_article):
+    path = tmp_path / "comments.jsonl"
+    write_jsonl(path, an_article)
+    with pytest.raises(CommandError, match="Record 5 replies to 'a2'"):
+        import_comments(path)
+    assert not XtdComment.objects.exists()
+
+    out = import_comments(path, "--allow-orphans")
+    assert "1 replies without a parent comment" in out
+    assert "Imported 5 XtdComment object(s)." in out
+
+
+@pytest.mark.django_db
+def test_command_raises_on_invalid_input(tmp_path, an_article):
+    with pytest.raises(CommandError, match="file does not exist"):
+        import_comments(tmp_path / "missing.jsonl")
+
+    path = tmp_path / "comments.jsonl"
+    path.write_text(json.dumps({"id": 1, "content_type": "tests.nope"}))
+    with pytest.raises(CommandError, match="Unknown content type"):
+        import_comments(path)
+
+    path.write_text(json.dumps({"id": 1, "content_type": "tests.article"}))
+    with pytest.raises(CommandError, match="Invalid record 1"):
+        import_comments(path)
+    assert not XtdComment.objects.exists()
+
+
+@pytest.mark.django_db
+def test_command_raises_on_malformed_records(tmp_path, an_article):
+    path = tmp_path / "comments.jsonl"
+    write_jsonl(path, an_article, RECORDS[:2])
+    with path.open("a") as f:
+        f.write('{"id": "a3", "parent_id": "a1",\n')
+    with pytest.raises(CommandError, match="Invalid record 3: Expecting"):
+        import_comments(path)
+    assert not XtdComment.objects.exists()
+
+    path = tmp_path / "comments.csv"
+    path.write_text(f"id,comment\na1,{'x' * csv.field_size_limit()}x\n")
+    with pytest.raises(CommandError, match="Invalid record 1: field larger"):
+        import_comments(path)
+
+
+@pytest.mark.django_db
+def test_command_takes_ids_after_comments_posted_meanwhile(
+    tmp_path, an_article
+):
+    path = tmp_path / "comments.jsonl"
+    write_jsonl(path, an_article, RECORDS[:4])
+    save_batch = Command.save_batch
+
+    def post_comment_after_batch(self, *args, **kwargs):
+        save_batch(self, *args, **kwargs)
+        XtdComment.objects.create(
+            content_object=an_article,
+            site_id=1,
+            comment="Posted meanwhile",
+            submit_date=an_article.publish,
+        )
+
+    with patch.object(Command, "save_batch", post_comment_after_batch):
+        out = import_comments(path, "--batch-size=2")
+    assert "Imported 4 XtdComment object(s)." in out
+    assert [cm[0] for cm in get_tree()] == [
+        "Comment a1",
+        "Comment a2",
+        "Posted meanwhile",
+        "Comment b1",
+        "Comment b2",
+        "Posted meanwhile",
+    ]
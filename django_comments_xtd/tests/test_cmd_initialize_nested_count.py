@@ -1,11 +1,20 @@
 import contextlib
+from concurrent.futures import Future
 from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.connection import ConnectionDoesNotExist
 
+from django_comments_xtd.management.commands.initialize_nested_count import (
+    Command,
+    update_nested_count,
+    update_shard,
+)
 from django_comments_xtd.models import XtdComment
 from django_comments_xtd.tests.models import Article
 from django_comments_xtd.tests.test_models import (
@@ -16,6 +25,25 @@ from django_comments_xtd.tests.test_models import (
     thread_test_step_5,
 )
 
+
+class SerialExecutor:
+    """Runs the tasks of a ProcessPoolExecutor in the current process."""
+
+    def __init__(self, max_workers, mp_context):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
 app_model_options_mock = {
     "tests.nomodel": {
         "max_thread_level": 3,
@@ -72,6 +100,106 @@ class InitializeNestedCountCmdTest(TestCase):
         self.assertIn("Updated 9 XtdComment object(s).", out.getvalue())
         self.check_nested_count()
 
+    def test_command_only_updates_changed_comments(self):
+        call_command("initialize_nested_count", stdout=StringIO())
+        # Comments with the right nested_count are not updated again: one
+        # query per content type and one per group of comments.
+        with self.assertNumQueries(7):
+            call_command("initialize_nested_count", stdout=StringIO())
+        XtdComment.objects.filter(pk=self.c1.pk).update(nested_count=0)
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("initialize_nested_count", stdout=StringIO())
+        updates = [q for q in ctx.captured_queries if "UPDATE" in q["sql"]]
+        self.assertEqual(len(updates), 1)
+        self.check_nested_count()
+
+    def test_command_filters_threads_and_content_types(self):
+        out = StringIO()
+        call_command(
+            "initialize_nested_count", "--threads", "2", "9", stdout=out
+        )
+        self.assertIn("Updated 4 XtdComment object(s).", out.getvalue())
+        self.assertEqual(XtdComment.objects.get(pk=2).nested_count, 2)
+        self.assertEqual(XtdComment.objects.get(pk=1).nested_count, 0)
+
+        call_command(
+            "initialize_nested_count", "--content-type=tests.diary", stdout=out
+        )
+        self.assertIn("Updated 0 XtdComment object(s).", out.getvalue())
+        call_command(
+            "initialize_nested_count",
+            "--content-type=tests.article",
+            stdout=out,
+        )
+        self.check_nested_count()
+
+        with self.assertRaisesMessage(
+            CommandError, "Unknown content type 'tests.nomodel'."
+        ):
+            call_command(
+                "initialize_nested_count", "--content-type=tests.nomodel"
+            )
+
+    def test_shards_split_the_threads(self):
+        command = Command()
+        groups = command.get_groups(Q())
+        counts = [
+            sum(update_nested_count("default", groups, 2, shard, 3))
+            for shard in range(3)
+        ]
+        # Threads 1, 2 and 9 fall into shards 1, 2 and 0.
+        self.assertEqual(counts, [1, 5, 3])
+        self.check_nested_count()
+
+    @patch.multiple(
+        "django_comments_xtd.conf.settings",
+        COMMENTS_XTD_APP_MODEL_CONFIG={
+            "tests.article": {"max_thread_level": 2}
+        },
+    )
+    def test_command_splits_the_threads_among_workers(self):
+        out = StringIO()
+        module = (
+            "django_comments_xtd.management.commands.initialize_nested_count"
+        )
+        # Closing the connections would break the test transaction.
+        with (
+            patch(
+                f"{module}.ProcessPoolExecutor", wraps=SerialExecutor
+            ) as mock_executor,
+            patch(
+                f"{module}.update_shard", wraps=update_shard
+            ) as mock_update_shard,
+            patch.object(connections, "close_all") as mock_close_all,
+        ):
+            call_command(
+                "initialize_nested_count", "--parallel", "2", stdout=out
+            )
+        kwargs = mock_executor.call_args.kwargs
+        self.assertEqual(kwargs["max_workers"], 2)
+        self.assertEqual(kwargs["mp_context"].get_start_method(), "fork")
+        self.assertEqual(
+            [call.args[-2:] for call in mock_update_shard.call_args_list],
+            [(0, 2), (1, 2)],
+        )
+        # The parent closes its connections, and so does every worker twice.
+        self.assertEqual(mock_close_all.call_count, 5)
+        self.assertIn(
+            "Updated 9 XtdComments for tests.article.", out.getvalue()
+        )
+        self.assertIn("Updated additional 0 XtdComments.", out.getvalue())
+        self.assertIn("Updated 9 XtdComment object(s).", out.getvalue())
+        self.check_nested_count()
+
+    def test_parallel_requires_fork(self):
+        with (
+            patch(
+                "multiprocessing.get_all_start_methods", return_value=["spawn"]
+            ),
+            self.assertRaisesMessage(CommandError, "--parallel requires"),
+        ):
+            call_command("initialize_nested_count", "--parallel", "2")
+
     # ---------------------------------------
     @patch.multiple(
         "django_comments_xtd.conf.settings",
@@ -0,0 +1,70 @@
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.utils.connection import ConnectionDoesNotExist
+
+from django_comments_xtd.models import XtdComment
+from django_comments_xtd.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+    thread_test_step_3,
+    thread_test_step_4,
+    thread_test_step_5,
+    thread_test_step_6,
+)
+
+
+def create_threads(article):
+    thread_test_step_1(article)
+    thread_test_step_2(article)
+    thread_test_step_3(article)
+    thread_test_step_4(article)
+    thread_test_step_5(article)
+    thread_test_step_6(article)
+
+
+@pytest.mark.django_db
+def test_calling_command_computes_thread_path(an_article):
+    create_threads(an_article)
+    expected_order = [cm.id for cm in XtdComment.objects.all()]
+    XtdComment.objects.update(path="")
+
+    out = StringIO()
+    call_command("initialize_thread_path", "--batch-size=4", stdout=out)
+    assert "Updated 11 XtdComment object(s)." in out.getvalue()
+
+    paths = dict(XtdComment.objects.values_list("pk", "path"))
+    assert paths[1] == "0000000001"
+    assert paths[8] == "0000000001/0000000003/0000000008"
+    assert paths[6] == "0000000002/0000000005/0000000006"
+    assert paths[9] == "0000000009"
+    # Sorting by path lists comments like sorting by order.
+    assert [
+        cm.id for cm in XtdComment.objects.order_by("thread__id", "path")
+    ] == expected_order
+
+
+@pytest.mark.django_db
+def test_command_is_idempotent(an_article):
+    create_threads(an_article)
+    XtdComment.objects.update(path="")
+    call_command("initialize_thread_path", stdout=StringIO())
+
+    out = StringIO()
+    call_command("initialize_thread_path", stdout=out)
+    assert "Updated 0 XtdComment object(s)." in out.getvalue()
+
+
+def test_command_skips_failed_database():
+    out = StringIO()
+    method_ref = (
+        "django_comments_xtd.management.commands"
+        ".initialize_thread_path.Command"
+        ".initialize_thread_path"
+    )
+    with patch(method_ref) as mock_initialize_thread_path:
+        mock_initialize_thread_path.side_effect = ConnectionDoesNotExist
+        call_command("initialize_thread_path", stdout=out)
+    assert "DB connection 'default' does not exist." in out.getvalue()
@@ -0,0 +1,49 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from django_comments_xtd.blacklist import is_blacklisted_domain
+from django_comments_xtd.models import BlackListedDomain
+
+
+def load_domains(path, *args):
+    out = StringIO()
+    call_command("load_blacklisted_domains", str(path), *args, stdout=out)
+    return out.getvalue()
+
+
+def get_domains():
+    return sorted(BlackListedDomain.objects.values_list("domain", flat=True))
+
+
+@pytest.mark.django_db
+def test_command_loads_the_domains_in_batches(tmp_path):
+    BlackListedDomain.objects.create(domain="spam.example")
+    path = tmp_path / "blacklist.txt"
+    path.write_text(
+        "# Blacklisted domains\n"
+        "spam.example\n"
+        "\n"
+        "Junk.Example.\n"
+        "junk.example\n"
+        "scam.example\n"
+    )
+    assert not is_blacklisted_domain("junk.example")
+
+    out = load_domains(path, "--batch-size=1")
+    assert "Loaded 2 BlackListedDomain object(s)." in out
+    assert get_domains() == ["junk.example", "scam.example", "spam.example"]
+    # The index of blacklisted domains is reloaded.
+    assert is_blacklisted_domain("www.junk.example")
+
+    path.write_text("ham.example\n")
+    out = load_domains(path, "--replace")
+    assert "Loaded 1 BlackListedDomain object(s)." in out
+    assert get_domains() == ["ham.example"]
+    assert not is_blacklisted_domain("junk.example")
+
+
+def test_command_fails_with_missing_file(tmp_path):
+    with pytest.raises(CommandError, match="Can't read"):
+        load_domains(tmp_path / "missing.txt")
@@ -0,0 +1,63 @@
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.utils.connection import ConnectionDoesNotExist
+
+from django_comments_xtd.models import CommentObjectStats
+from django_comments_xtd.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+)
+
+
+@pytest.mark.django_db
+def test_calling_command_rebuilds_comment_stats(an_article):
+    site2 = Site.objects.create(domain="site2.com", name="site2.com")
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_1(an_article, site=site2)
+    expected = list(
+        CommentObjectStats.objects.order_by("site_id").values(
+            "site_id", "public_count", "removed_count", "total_count"
+        )
+    )
+    CommentObjectStats.objects.all().delete()
+
+    out = StringIO()
+    call_command("rebuild_comment_stats", "--batch-size=1", stdout=out)
+    assert "Rebuilt 2 CommentObjectStats object(s)." in out.getvalue()
+    assert (
+        list(
+            CommentObjectStats.objects.order_by("site_id").values(
+                "site_id", "public_count", "removed_count", "total_count"
+            )
+        )
+        == expected
+    )
+    assert expected[0]["public_count"] == 4
+    assert expected[1]["public_count"] == 2
+
+
+@pytest.mark.django_db
+def test_command_removes_stale_stats(an_article):
+    thread_test_step_1(an_article)
+    CommentObjectStats.objects.update(public_count=10, total_count=10)
+    call_command("rebuild_comment_stats", stdout=StringIO())
+    stats = CommentObjectStats.objects.get()
+    assert (stats.public_count, stats.total_count) == (2, 2)
+
+
+def test_command_skips_failed_database():
+    out = StringIO()
+    method_ref = (
+        "django_comments_xtd.management.commands"
+        ".rebuild_comment_stats.Command"
+        ".rebuild_comment_stats"
+    )
+    with patch(method_ref) as mock_rebuild_comment_stats:
+        mock_rebuild_comment_stats.side_effect = ConnectionDoesNotExist
+        call_command("rebuild_comment_stats", stdout=out)
+    assert "DB connection 'default' does not exist." in out.getvalue()
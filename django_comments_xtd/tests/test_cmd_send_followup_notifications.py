@@ -0,0 +1,186 @@
+import smtplib
+from datetime import datetime
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import connection
+from django.template import TemplateSyntaxError
+from django.test.utils import CaptureQueriesContext
+
+from django_comments_xtd.models import FollowupNotification, XtdComment
+from django_comments_xtd.views import (
+    get_followup_email,
+    notify_comment_followers,
+)
+
+
+def post_comment(article, name, followup=True):
+    return XtdComment.objects.create(
+        content_type=ContentType.objects.get(
+            app_label="tests", model="article"
+        ),
+        object_pk=article.pk,
+        content_object=article,
+        site_id=1,
+        user_name=name,
+        user_email=f"{name.lower()}@example.com",
+        followup=followup,
+        comment=f"Comment of {name}",
+        submit_date=datetime.now(),
+    )
+
+
+def enqueue_notifications(article):
+    """Posts 3 comments with follow-up and enqueues the 4th's notifications."""
+    for name in ["Alice", "Bob", "Charlie"]:
+        post_comment(article, name)
+    comment = post_comment(article, "Dave", followup=False)
+    with (
+        patch.multiple(
+            "django_comments_xtd.conf.settings",
+            COMMENTS_XTD_FOLLOWUP_OUTBOX=True,
+        ),
+        CaptureQueriesContext(connection) as ctx,
+    ):
+        notify_comment_followers(comment)
+    return comment, ctx.captured_queries
+
+
+def send_notifications(*args):
+    out = StringIO()
+    call_command("send_followup_notifications", *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+def test_outbox_stores_the_notifications_in_a_single_insert(
+    an_article, mailoutbox
+):
+    comment, queries = enqueue_notifications(an_article)
+    inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+    assert len(inserts) == 1
+    assert len(mailoutbox) == 0
+    assert set(
+        FollowupNotification.objects.values_list(
+            "follower_comment__user_name", flat=True
+        )
+    ) == {"Alice", "Bob", "Charlie"}
+    assert set(
+        FollowupNotification.objects.values_list("comment", flat=True)
+    ) == {comment.pk}
+
+
+@pytest.mark.django_db
+def test_command_sends_the_notifications_in_batches(an_article, mailoutbox):
+    enqueue_notifications(an_article)
+    with patch(
+        "django_comments_xtd.management.commands"
+        ".send_followup_notifications.get_connection",
+        wraps=get_connection,
+    ) as mock_get_connection:
+        out = send_notifications("--batch-size=2")
+
+    assert "Sent 3 follow-up notification(s), 0 failed attempt(s)." in out
+    # One connection per batch.
+    assert mock_get_connection.call_count == 2
+    assert sorted(mail.to[0] for mail in mailoutbox) == [
+        "alice@example.com",
+        "bob@example.com",
+        "charlie@example.com",
+    ]
+    assert "There is a new comment following up yours." in mailoutbox[0].body
+    assert not FollowupNotification.objects.exists()
+
+
+@pytest.mark.django_db
+def test_command_retries_failed_notifications_with_backoff(an_article):
+    enqueue_notifications(an_article)
+    send_messages = (
+        "django.core.mail.backends.locmem.EmailBackend.send_messages"
+    )
+    with patch(send_messages, side_effect=smtplib.SMTPServerDisconnected):
+        out = send_notifications("--max-attempts=2", "--retry-delay=0")
+
+    # With no delay, notifications are retried until they fail for good.
+    assert "Sent 0 follow-up notification(s), 6 failed attempt(s)." in out
+    assert set(
+        FollowupNotification.objects.values_list("attempts", "failed")
+    ) == {(2, True)}
+    assert (
+        "SMTPServerDisconnected"
+        in FollowupNotification.objects.first().last_error
+    )
+
+    FollowupNotification.objects.update(failed=False, attempts=0)
+    with patch(send_messages, side_effect=smtplib.SMTPServerDisconnected):
+        send_notifications("--retry-delay=60")
+    notification = FollowupNotification.objects.first()
+    assert (notification.attempts, notification.failed) == (1, False)
+    delay = notification.send_after - notification.created
+    assert delay.total_seconds() > 59
+    # The notifications are postponed, so there is nothing to send yet.
+    assert "Sent 0 follow-up notification(s)" in send_notifications()
+
+
+@pytest.mark.django_db
+def test_command_limits_the_sending_rate(an_article, mailoutbox):
+    enqueue_notifications(an_article)
+    with patch(
+        "django_comments_xtd.management.commands"
+        ".send_followup_notifications.time.sleep"
+    ) as mock_sleep:
+        send_notifications("--rate=1")
+    assert len(mailoutbox) == 3
+    # The first email goes out at once, the next ones wait for their turn.
+    assert mock_sleep.call_count == 2
+    assert all(0 < call.args[0] <= 1 for call in mock_sleep.call_args_list)
+
+
+@pytest.mark.django_db
+def test_command_retries_notifications_that_fail_to_render(
+    an_article, mailoutbox
+):
+    enqueue_notifications(an_article)
+    get_email = (
+        "django_comments_xtd.management.commands"
+        ".send_followup_notifications.get_followup_email"
+    )
+
+    def broken_template(comment, follower_comment, templates):
+        if follower_comment.user_name == "Bob":
+            raise TemplateSyntaxError("Broken template")
+        return get_followup_email(comment, follower_comment, templates)
+
+    with patch(get_email, broken_template):
+        out = send_notifications()
+
+    # The other notifications of the batch are sent.
+    assert "Sent 2 follow-up notification(s), 1 failed attempt(s)." in out
+    assert len(mailoutbox) == 2
+    notification = FollowupNotification.objects.get()
+    assert notification.follower_comment.user_name == "Bob"
+    assert (notification.attempts, notification.failed) == (1, False)
+    assert "Broken template" in notification.last_error
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "args, lease",
+    [
+        ([], 300),
+        (["--rate=2", "--batch-size=100"], 350),
+        (["--rate=2", "--lease=30"], 30),
+    ],
+)
+def test_command_leases_batches_for_the_time_to_send_them(args, lease):
+    claim_batch = (
+        "django_comments_xtd.management.commands"
+        ".send_followup_notifications.Command.claim_batch"
+    )
+    with patch(claim_batch, return_value=[]) as mock_claim_batch:
+        send_notifications(*args)
+    assert mock_claim_batch.call_args.args[1] == lease
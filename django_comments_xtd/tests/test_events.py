@@ -0,0 +1,168 @@
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import reverse
+from django_comments.models import CommentFlag
+from django_comments.signals import comment_was_flagged
+
+from django_comments_xtd import events, views
+from django_comments_xtd.models import XtdComment
+
+request_factory = RequestFactory()
+
+in_memory_broker = "django_comments_xtd.events.InMemoryBroker"
+
+
+def parse_event(message):
+    event, data = message.strip().split("\n")
+    data = json.loads(data.removeprefix("data: "))
+    return event.removeprefix("event: "), data
+
+
+def test_InMemoryBroker_delivers_messages_to_the_channel_listeners():
+    broker = events.InMemoryBroker()
+
+    async def listen():
+        listener_1 = broker.listen("channel-1", 0.01)
+        listener_2 = broker.listen("channel-2", 0.01)
+        # Listeners subscribe when they are first iterated.
+        assert await anext(listener_1) is None
+        assert await anext(listener_2) is None
+        broker.publish("channel-1", "message")
+        assert await anext(listener_1) == "message"
+        assert await anext(listener_2) is None
+        await listener_1.aclose()
+        await listener_2.aclose()
+
+    asyncio.run(listen())
+    assert not broker._queues
+
+
+def test_get_broker_returns_None_by_default():
+    assert events.get_broker() is None
+
+
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_EVENTS_BROKER=in_memory_broker,
+)
+def test_get_broker_returns_the_same_broker():
+    broker = events.get_broker()
+    assert isinstance(broker, events.InMemoryBroker)
+    assert events.get_broker() is broker
+
+
+@pytest.mark.django_db
+def test_posting_a_comment_publishes_a_new_event(
+    an_article, django_capture_on_commit_callbacks
+):
+    broker = Mock()
+    article_ct = ContentType.objects.get(app_label="tests", model="article")
+    with (
+        patch.object(events, "get_broker", return_value=broker),
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        comment = XtdComment.objects.create(
+            content_type=article_ct,
+            object_pk=an_article.pk,
+            content_object=an_article,
+            site_id=1,
+            comment="a comment",
+            submit_date=datetime.now(),
+        )
+        XtdComment.objects.create(
+            content_type=article_ct,
+            object_pk=an_article.pk,
+            content_object=an_article,
+            site_id=1,
+            comment="a withheld comment",
+            submit_date=datetime.now(),
+            is_public=False,
+        )
+
+    broker.publish.assert_called_once()
+    channel, message = broker.publish.call_args.args
+    assert channel == events.get_channel(article_ct.pk, str(an_article.pk), 1)
+    assert parse_event(message) == (
+        "new",
+        {"id": comment.pk, "parent_id": comment.pk, "thread_id": 1, "level": 0},
+    )
+
+
+@pytest.mark.django_db
+def test_moderation_publishes_events(
+    an_articles_comment, an_user, django_capture_on_commit_callbacks
+):
+    broker = Mock()
+    with (
+        patch.object(events, "get_broker", return_value=broker),
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        for flag in [
+            CommentFlag.MODERATOR_DELETION,
+            CommentFlag.MODERATOR_APPROVAL,
+            CommentFlag.SUGGEST_REMOVAL,
+        ]:
+            comment_was_flagged.send(
+                sender=XtdComment,
+                comment=an_articles_comment,
+                flag=CommentFlag(flag=flag, user=an_user),
+                created=True,
+                request=None,
+            )
+
+    assert [
+        parse_event(call.args[1])[0] for call in broker.publish.call_args_list
+    ] == ["removed", "published"]
+
+
+async def get_events_response(**kwargs):
+    url = reverse("comments-xtd-events", kwargs=kwargs)
+    return await views.comment_events(request_factory.get(url), **kwargs)
+
+
+@pytest.mark.django_db
+def test_comment_events_is_disabled_by_default():
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    with pytest.raises(Http404):
+        async_to_sync(get_events_response)(**kwargs)
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_EVENTS_BROKER=in_memory_broker,
+    COMMENTS_XTD_EVENTS_KEEPALIVE=0.01,
+)
+def test_comment_events_streams_the_published_events(an_articles_comment):
+    kwargs = {"content_type": "tests-article", "object_pk": "1"}
+    with pytest.raises(Http404):
+        async_to_sync(get_events_response)(
+            content_type="this-that", object_pk="1"
+        )
+
+    broker = events.get_broker()
+    channel = events.get_channel(
+        an_articles_comment.content_type_id, "1", an_articles_comment.site_id
+    )
+    message = events.format_event("new", {"id": 2})
+
+    async def consume():
+        response = await get_events_response(**kwargs)
+        assert response["Content-Type"] == "text/event-stream"
+        content = aiter(response.streaming_content)
+        assert await anext(content) == b"retry: 3000\n\n"
+        assert await anext(content) == b": keep-alive\n\n"
+        broker.publish(channel, message)
+        assert await anext(content) == message.encode("utf-8")
+        await content.aclose()
+
+    async_to_sync(consume)()
+    assert channel not in broker._queues
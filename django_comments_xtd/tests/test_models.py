@@ -4,12 +4,19 @@ from unittest.mock import patch
 import pytest
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.db import DatabaseError, connection
 from django.db.models.signals import pre_save
+from django.db.transaction import atomic
 from django.test import TestCase as DjangoTestCase
+from django.test.utils import CaptureQueriesContext
+from django_comments.models import Comment, CommentFlag
 
 from django_comments_xtd import get_form, get_model
 from django_comments_xtd.models import (
-    BlackListedDomain,
+    CommentObjectStats,
+    CommentReaction,
+    CommentVote,
+    FollowupNotification,
     MaxThreadLevelExceededException,
     XtdComment,
     publish_or_withhold_on_pre_save,
@@ -741,6 +748,71 @@ class PublishOrWithholdNestedComments_2_TestCase(ArticleBaseTestCase):
         self.assertFalse(cm4.is_removed)
 
 
+def withhold_and_publish(comment_id):
+    """Withholds and publishes again a comment, counting the queries."""
+    cm = XtdComment.objects.get(pk=comment_id)
+    with CaptureQueriesContext(connection) as ctx:
+        cm.is_public = False
+        cm.save()
+        cm.is_public = True
+        cm.save()
+    return len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_publish_or_withhold_runs_constant_queries(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    num_queries = withhold_and_publish(1)
+
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    thread_test_step_6(an_article)
+    cm = XtdComment.objects.get(pk=1)
+    cm.is_public = False
+    cm.save()
+    # c1 and c2 are withheld, as well as the 6 comments nested to c1.
+    assert XtdComment.objects.filter(is_public=False).count() == 7
+    cm.is_public = True
+    cm.save()
+    assert XtdComment.objects.filter(is_public=False).count() == 0
+    assert withhold_and_publish(1) == num_queries
+
+
+@pytest.mark.django_db
+def test_withholding_c4_updates_its_ancestors_only(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    thread_test_step_6(an_article)
+
+    cm4 = XtdComment.objects.get(pk=4)
+    cm4.is_removed = True
+    cm4.save()
+    assert list(
+        XtdComment.objects.filter(is_public=False).values_list("pk", flat=True)
+    ) == [7, 10]
+    nested_count = dict(XtdComment.objects.values_list("pk", "nested_count"))
+    assert nested_count[1] == 4
+    assert nested_count[3] == 2
+
+
+@pytest.mark.django_db
+def test_saving_a_public_comment_keeps_nested_count(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    assert XtdComment.objects.get(pk=1).nested_count == 3
+    cm4 = XtdComment.objects.get(pk=4)
+    cm4.comment = "c4.c1 edited"
+    cm4.save()
+    assert XtdComment.objects.get(pk=1).nested_count == 3
+
+
 @pytest.mark.django_db
 def test_get_reply_url(an_articles_comment):
     reply_url = an_articles_comment.get_reply_url()
@@ -761,6 +833,41 @@ def test_get_queryset_with_content_object(an_article, an_articles_comment):
     assert qs[0] == an_articles_comment
 
 
+@pytest.mark.django_db
+def test_get_reactions_and_get_flags_use_prefetched_data(
+    a_comments_reaction, a_comments_flag, an_user, an_user_2
+):
+    a_comments_reaction.authors.add(an_user_2)
+    a_comments_reaction.counter = 2
+    a_comments_reaction.save()
+
+    with patch.multiple(
+        "django_comments_xtd.conf.settings",
+        COMMENTS_XTD_MAX_USERS_IN_TOOLTIP=1,
+    ):
+        comment = XtdComment.objects.prefetch_related(
+            *XtdComment.get_prefetch_lookups()
+        ).get(pk=a_comments_reaction.comment.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            reactions = comment.get_reactions()
+            flags = comment.get_flags()
+
+    assert len(ctx.captured_queries) == 0
+    assert reactions["counter"] == 2
+    # Only as many authors as COMMENTS_XTD_MAX_USERS_IN_TOOLTIP are loaded.
+    assert reactions["list"][0]["authors"] == [an_user.username]
+    assert flags == {"users": [an_user], "counter": 1}
+
+
+@pytest.mark.django_db
+def test_get_flags_without_prefetched_data(a_comments_flag, an_user):
+    comment = XtdComment.objects.get(pk=a_comments_flag.comment.pk)
+    with CaptureQueriesContext(connection) as ctx:
+        flags = comment.get_flags()
+    assert len(ctx.captured_queries) == 1
+    assert flags == {"users": [an_user], "counter": 1}
+
+
 # ---------------------------------------------------------------------
 # Test BlackListedDomain.
 
@@ -770,8 +877,10 @@ class ArticleCommentModerator(SpamModerator):
 
 
 @pytest.mark.django_db
-def test_blacklisted_domain_is_blocked(an_article, an_user):
-    domain = BlackListedDomain.objects.create(domain="example.com")
+def test_blacklisted_domain_is_blocked(
+    an_article, an_user, a_blacklisted_domain
+):
+    domain = a_blacklisted_domain
     moderator.register(Article, ArticleCommentModerator)
     form = get_form()(an_article)
     data = {
@@ -1159,9 +1268,185 @@ def test_nested_count_after_deleting_comment_10(an_article):
     assert c7.nested_count == 0
 
 
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_DELETE_BATCH_SIZE=2
+)
+def test_deleting_comment_deletes_nested_data_in_batches(
+    an_article, an_user, an_user_2
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    thread_test_step_6(an_article)
+    nested_ids = [3, 4, 7, 8, 10, 11]
+    for cid in [1, *nested_ids]:
+        cm = XtdComment.objects.get(pk=cid)
+        reaction = CommentReaction.objects.create(
+            comment=cm, reaction="+", counter=1
+        )
+        reaction.authors.add(an_user)
+        CommentVote.objects.create(comment=cm, author=an_user_2, vote="+")
+        CommentFlag.objects.create(
+            comment=cm, user=an_user, flag=CommentFlag.SUGGEST_REMOVAL
+        )
+
+    XtdComment.objects.get(pk=1).delete()
+
+    assert not Comment.objects.filter(pk__in=[1, *nested_ids]).exists()
+    assert not XtdComment.objects.filter(thread_id=1).exists()
+    assert not CommentReaction.objects.exists()
+    assert not CommentReaction.authors.through.objects.exists()
+    assert not CommentVote.objects.exists()
+    assert not CommentFlag.objects.exists()
+    # Comments in other threads are not affected.
+    assert list(XtdComment.objects.values_list("pk", flat=True)) == [
+        2,
+        5,
+        6,
+        9,
+    ]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_DELETE_BATCH_SIZE=2
+)
+def test_nested_comments_are_deleted_in_the_same_transaction(
+    an_article, django_capture_on_commit_callbacks
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_ids = set(
+        XtdComment.objects.filter(thread_id=1).values_list("pk", flat=True)
+    )
+    assert len(thread_ids) == 4
+
+    # A failure rolls back the deletion of the nested comments too.
+    with pytest.raises(DatabaseError), atomic():
+        XtdComment.objects.get(pk=1).delete()
+        assert not XtdComment.objects.filter(thread_id=1).exists()
+        raise DatabaseError("Connection lost")
+    assert (
+        set(XtdComment.objects.filter(thread_id=1).values_list("pk", flat=True))
+        == thread_ids
+    )
+
+    with (
+        django_capture_on_commit_callbacks() as callbacks,
+        patch("django_comments_xtd.models.atomic", wraps=atomic) as mock,
+    ):
+        XtdComment.objects.get(pk=1).delete()
+    assert not callbacks
+    assert not XtdComment.objects.filter(thread_id=1).exists()
+    # The 3 nested comments are deleted in batches of up to 2 comments.
+    assert mock.call_count == 2
+
+
+@pytest.mark.django_db
+def test_deleting_comment_deletes_nested_followup_notifications(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    # Comment 8 is a reply to comment 3, itself a reply to comment 1.
+    FollowupNotification.objects.create(comment_id=8, follower_comment_id=3)
+    FollowupNotification.objects.create(comment_id=4, follower_comment_id=1)
+    FollowupNotification.objects.create(comment_id=5, follower_comment_id=2)
+
+    XtdComment.objects.get(pk=1).delete()
+
+    # No row points to the deleted comments.
+    connection.check_constraints()
+    assert list(
+        FollowupNotification.objects.values_list("comment_id", flat=True)
+    ) == [5]
+
+
 @pytest.mark.django_db
 def test__xtdcomment__str(an_articles_comment):
     comment_as_str = f"{an_articles_comment}"
     assert f"{an_articles_comment.id}" in comment_as_str
     assert an_articles_comment.name in comment_as_str
     assert an_articles_comment.comment[:50] in comment_as_str
+
+
+@pytest.mark.django_db
+def test_object_stats_follow_comment_changes(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    stats = CommentObjectStats.objects.get(object_pk=an_article.pk)
+    assert (stats.public_count, stats.removed_count, stats.total_count) == (
+        4,
+        0,
+        4,
+    )
+    assert stats.last_submit_date == XtdComment.objects.get(pk=4).submit_date
+
+    # Removing c1 withholds c3 and c4.
+    cm1 = XtdComment.objects.get(pk=1)
+    cm1.is_removed = True
+    cm1.save()
+    stats.refresh_from_db()
+    assert (stats.public_count, stats.removed_count, stats.total_count) == (
+        1,
+        1,
+        4,
+    )
+    assert stats.last_submit_date == XtdComment.objects.get(pk=2).submit_date
+
+    # Deleting c1 deletes c3 and c4 too.
+    cm1.delete()
+    stats.refresh_from_db()
+    assert (stats.public_count, stats.removed_count, stats.total_count) == (
+        1,
+        0,
+        1,
+    )
+
+
+def count_queries_of_comments(ctx):
+    """Returns the captured queries that count the comments of objects."""
+    object_pk = connection.ops.quote_name("object_pk")
+    return [
+        query
+        for query in ctx.captured_queries
+        if "COUNT(" in query["sql"] and f"{object_pk} =" in query["sql"]
+    ]
+
+
+@pytest.mark.django_db
+def test_object_stats_are_updated_without_counting_comments(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    with CaptureQueriesContext(connection) as ctx:
+        thread_test_step_3(an_article)
+    assert not count_queries_of_comments(ctx)
+    cm5 = XtdComment.objects.get(pk=5)
+    stats = CommentObjectStats.objects.get(object_pk=an_article.pk)
+    assert (stats.public_count, stats.removed_count, stats.total_count) == (
+        5,
+        0,
+        5,
+    )
+    assert stats.last_submit_date == cm5.submit_date
+
+    # Withholding the last comment reads the last date again, without
+    # counting the comments of the article.
+    cm5.is_public = False
+    with CaptureQueriesContext(connection) as ctx:
+        cm5.save()
+    assert not count_queries_of_comments(ctx)
+    stats.refresh_from_db()
+    assert (stats.public_count, stats.total_count) == (4, 5)
+    assert stats.last_submit_date == XtdComment.objects.get(pk=4).submit_date
+
+    cm5.is_public = True
+    cm5.save()
+    stats.refresh_from_db()
+    assert (stats.public_count, stats.total_count) == (5, 5)
+    assert stats.last_submit_date == cm5.submit_date
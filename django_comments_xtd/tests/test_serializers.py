@@ -14,15 +14,17 @@ from django_comments.moderation import CommentModerator
 from django_comments.signals import comment_will_be_posted
 from rest_framework.test import APIClient
 
+from django_comments_xtd import get_reaction_enum
 from django_comments_xtd.api.serializers import (
     FlagSerializer,
     ReadCommentReactionAuthorSerializer,
     ReadCommentSerializer,
+    ValuesCommentListSerializer,
     WriteCommentReactionSerializer,
     WriteCommentSerializer,
 )
 from django_comments_xtd.conf import settings
-from django_comments_xtd.models import XtdComment
+from django_comments_xtd.models import CommentReaction, XtdComment
 from django_comments_xtd.moderation import moderator
 from django_comments_xtd.signals import should_request_be_authorized
 from django_comments_xtd.tests.models import (
@@ -547,3 +549,158 @@ def test_WriteCommentReactionSerializer(an_articles_comment):
         data={"reaction": "+", "comment": an_articles_comment}
     )
     assert ser.is_valid() is True
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_API_DATETIME_FORMAT="iso-8601",
+)
+def test_ReadCommentSerializer_renders_iso_8601_submit_date(
+    an_articles_comment,
+):
+    XtdComment.objects.filter(pk=an_articles_comment.pk).update(
+        submit_date=datetime(2021, 1, 10, 10, 15)
+    )
+    qs = XtdComment.objects.all()
+    ser = ReadCommentSerializer(qs, context={"request": None}, many=True)
+    assert ser.data[0]["submit_date"] == "2021-01-10T10:15:00"
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_API_DATETIME_FORMAT="Y-m-d H:i",
+)
+def test_ReadCommentSerializer_renders_submit_date_with_format(
+    an_articles_comment,
+):
+    XtdComment.objects.filter(pk=an_articles_comment.pk).update(
+        submit_date=datetime(2021, 1, 10, 10, 15)
+    )
+    qs = XtdComment.objects.all()
+    ser = ReadCommentSerializer(qs, context={"request": None}, many=True)
+    assert ser.data[0]["submit_date"] == "2021-01-10 10:15"
+
+
+@pytest.mark.django_db
+def test_ReadCommentSerializer_get_permalink(an_article):
+    for comment_pk in range(3):
+        XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(an_article),
+            object_pk=an_article.pk,
+            site_id=1,
+            comment=f"Comment {comment_pk}",
+            submit_date=datetime.now(),
+        )
+    qs = XtdComment.objects.all()
+    ser = ReadCommentSerializer(qs, context={"request": None}, many=True)
+    assert [cm["permalink"] for cm in ser.data] == [
+        cm.get_absolute_url() for cm in qs
+    ]
+
+
+def get_values_serializer(qs):
+    context = {"request": None}
+    return ValuesCommentListSerializer(
+        qs, child=ReadCommentSerializer(context=context), context=context
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("django_comments_xtd.tests.urls_alt")
+def test_ReadCommentSerializer_get_permalink_quotes_object_pk(an_article):
+    for object_pk in ["1", "a b/c", "ñ", "\u0661"]:
+        XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(an_article),
+            object_pk=object_pk,
+            site_id=1,
+            comment=f"Comment to {object_pk}",
+            submit_date=datetime.now(),
+        )
+    qs = XtdComment.objects.order_by("pk")
+    ser = ReadCommentSerializer(qs, context={"request": None}, many=True)
+    expected = [cm.get_absolute_url() for cm in qs]
+    assert expected[1].startswith("/cr/")
+    assert "/a%20b/c/" in expected[1]
+    assert [cm["permalink"] for cm in ser.data] == expected
+    assert list(get_values_serializer(qs).data) == ser.data
+
+
+@pytest.mark.django_db
+def test_ValuesCommentListSerializer_returns_same_data(
+    a_comments_reaction, a_comments_flag, an_user_2
+):
+    comment = a_comments_reaction.comment
+    a_comments_reaction.authors.add(an_user_2)
+    a_comments_reaction.counter = 2
+    a_comments_reaction.save()
+    CommentReaction.objects.create(
+        reaction=get_reaction_enum().DISLIKE_IT, comment=comment, counter=1
+    ).authors.add(an_user_2)
+    XtdComment.objects.create(
+        content_type=comment.content_type,
+        object_pk=comment.object_pk,
+        site_id=1,
+        comment="A reply",
+        parent_id=comment.pk,
+        submit_date=datetime.now(),
+        is_removed=True,
+    )
+
+    qs = XtdComment.objects.all()
+    expected = ReadCommentSerializer(
+        qs.prefetch_related(*XtdComment.get_prefetch_lookups()),
+        context={"request": None},
+        many=True,
+    ).data
+    assert len(expected[0]["reactions"]) == 2
+    assert len(expected[0]["flags"]) == 1
+    assert get_values_serializer(qs).data == expected
+    # Reading the comments in chunks.
+    ser = get_values_serializer(qs)
+    assert list(ser.iter_representation(qs, chunk_size=1)) == expected
+
+
+@pytest.mark.django_db
+def test_ValuesCommentListSerializer_reads_in_chunks_by_default(an_article):
+    for _ in range(3):
+        XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(an_article),
+            object_pk=an_article.pk,
+            site=Site.objects.get(pk=1),
+            comment="A comment",
+            submit_date=datetime.now(),
+        )
+    qs = XtdComment.objects.all()
+    ser = get_values_serializer(qs)
+    ser.chunk_size = 2
+    with patch.object(
+        ser, "chunk_to_representation", wraps=ser.chunk_to_representation
+    ) as mock_chunk:
+        assert len(ser.data) == 3
+    assert [len(call.args[0]) for call in mock_chunk.call_args_list] == [
+        2,
+        1,
+    ]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_MAX_USERS_IN_TOOLTIP=1,
+)
+def test_ValuesCommentListSerializer_limits_reaction_authors(
+    a_comments_reaction, an_user_2
+):
+    a_comments_reaction.authors.add(an_user_2)
+    ser = get_values_serializer(XtdComment.objects.all())
+    authors = ser.data[0]["reactions"][0]["authors"]
+    assert [author["id"] for author in authors] == [
+        min(a_comments_reaction.authors.values_list("pk", flat=True))
+    ]
+    # ReadCommentSerializer lists the same authors.
+    expected = ReadCommentSerializer(
+        XtdComment.objects.all(), context={"request": None}, many=True
+    ).data
+    assert ser.data == expected
@@ -3,10 +3,15 @@ Tests borrowed from Simon Willison's Django-OpenID project:
   * https://github.com/simonw/django-openid
 """
 
+from unittest.mock import patch
+
 import pytest
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 from django_comments_xtd import signed
+from django_comments_xtd.models import TmpXtdComment
 
 
 def test_sign_unsign_no_unicode():
@@ -83,3 +88,91 @@ def test_decode_detects_tampering():
     for transform in transforms:
         with pytest.raises(signed.BadSignature):
             signed.loads(transform(encoded))
+
+
+def get_tmp_comment(article):
+    return TmpXtdComment(
+        content_type=ContentType.objects.get_for_model(article),
+        object_pk=str(article.pk),
+        content_object=article,
+        site_id=1,
+        user_name="Bob",
+        user_email="bob@example.com",
+        user_url="",
+        comment="Es war einmal...",
+        submit_date=timezone.now(),
+        ip_address="127.0.0.1",
+        is_public=True,
+        is_removed=False,
+        level=0,
+        order=1,
+        parent_id=0,
+        followup=True,
+    )
+
+
+@pytest.mark.django_db
+def test_loads_comment_doesnt_query_the_database(
+    an_article, django_assert_num_queries
+):
+    tmp_comment = get_tmp_comment(an_article)
+    key = signed.dumps_comment(tmp_comment)
+    assert len(key) < len(signed.dumps(tmp_comment, compress=True))
+
+    with django_assert_num_queries(0):
+        loaded = signed.loads_comment(key)
+    assert loaded.content_type_key == ("tests", "article")
+    assert {k: v for k, v in loaded.items() if k != "content_type_key"} == {
+        k: v
+        for k, v in tmp_comment.items()
+        if k not in ("content_type", "content_object")
+    }
+    # The target object is read when it is used.
+    with django_assert_num_queries(1):
+        assert loaded.content_object == an_article
+    assert loaded.content_type == tmp_comment.content_type
+
+
+@pytest.mark.django_db
+def test_dumps_comment_with_mute_fields(an_articles_comment):
+    key = signed.dumps_comment(
+        an_articles_comment, fields=signed.MUTE_KEY_FIELDS
+    )
+    loaded = signed.loads_comment(key)
+    assert set(loaded) == {
+        "content_type_key",
+        *signed.MUTE_KEY_FIELDS[1:],
+    }
+    assert loaded.submit_date == an_articles_comment.submit_date
+    assert loaded.comment is None
+
+    with pytest.raises(ValueError):
+        signed.dumps_comment(an_articles_comment, fields=("object_pk",))
+
+
+@pytest.mark.django_db
+def test_loads_comment_detects_tampering(an_article):
+    key = signed.dumps_comment(get_tmp_comment(an_article), extra_key=b"x")
+    for tampered in (key[:-2], "a" + key[1:], key.replace(":", ".")):
+        with pytest.raises(signed.BadSignature):
+            signed.loads_comment(tampered, extra_key=b"x")
+    with pytest.raises(signed.BadSignature):
+        signed.loads_comment(key)
+
+
+@pytest.mark.django_db
+def test_loads_comment_accepts_pickled_keys(an_article):
+    tmp_comment = get_tmp_comment(an_article)
+    key = signed.dumps(tmp_comment, compress=True)
+    loaded = signed.loads_comment(key)
+    assert loaded.content_object == an_article
+    assert loaded.user_email == "bob@example.com"
+
+    with (
+        patch.multiple(
+            "django_comments_xtd.conf.settings",
+            COMMENTS_XTD_ACCEPT_PICKLED_KEYS=False,
+        ),
+        pytest.raises(signed.BadSignature),
+    ):
+        signed.loads_comment(key)
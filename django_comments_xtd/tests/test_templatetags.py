@@ -0,0 +1,397 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.template import (
+    Context,
+    RequestContext,
+    Template,
+    TemplateSyntaxError,
+)
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django_comments.models import CommentFlag
+
+from django_comments_xtd.cache import (
+    CSRF_TOKEN_PLACEHOLDER,
+    get_list_cache,
+    get_list_version,
+)
+from django_comments_xtd.models import (
+    CommentObjectStats,
+    CommentReaction,
+    CommentVote,
+    XtdComment,
+)
+from django_comments_xtd.templatetags.comments_xtd import comments_level
+from django_comments_xtd.tests.models import Article
+from django_comments_xtd.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+    thread_test_step_3,
+    thread_test_step_4,
+    thread_test_step_5,
+    thread_test_step_6,
+)
+
+request_factory = RequestFactory()
+
+app_model_config_no_options = {
+    "default": {
+        "who_can_post": "all",
+        "comments_flagging_enabled": False,
+    },
+}
+
+
+def render_comment_list(article, user, options=""):
+    request = request_factory.get("/")
+    request.user = user
+    request.session = {}
+    tmpl = Template(
+        "{% load comments_xtd %}"
+        f"{{% render_xtdcomment_list for object {options} %}}"
+    )
+    context = RequestContext(request, {"object": article, "user": user})
+    with CaptureQueriesContext(connection) as ctx:
+        html = tmpl.render(context)
+    return html, len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_comments_level_with_a_list(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    comment_list = list(XtdComment.objects.all())
+    assert [cm.id for cm in comments_level(comment_list, 0)] == [1, 2]
+    assert [cm.id for cm in comments_level(comment_list, 1)] == [3, 4]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_no_options,
+)
+def test_render_xtdcomment_list_runs_constant_queries(an_article, an_user):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    html, num_queries = render_comment_list(an_article, an_user)
+    assert html.count('class="comment-box') == 4
+
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    thread_test_step_6(an_article)
+    html, more_num_queries = render_comment_list(an_article, an_user)
+    assert html.count('class="comment-box') == 11
+    assert more_num_queries == num_queries
+
+    # Nested comments are rendered within their parent's thread.
+    assert html.index('id="comment-3"') < html.index('id="comment-8"')
+    assert html.index('id="comment-8"') < html.index('id="comment-11"')
+    assert html.index('id="comment-11"') < html.index('id="comment-4"')
+
+
+def add_user_reaction(comment, user, reaction):
+    creaction, _ = CommentReaction.objects.get_or_create(
+        comment=comment, reaction=reaction
+    )
+    creaction.authors.add(user)
+    creaction.counter += 1
+    creaction.save()
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_no_options,
+)
+def test_render_xtdcomment_list_loads_user_votes_at_once(an_article, an_user):
+    thread_test_step_1(an_article)
+    CommentVote.objects.create(
+        comment=XtdComment.objects.get(pk=2), author=an_user, vote="+"
+    )
+    html, num_queries = render_comment_list(
+        an_article, an_user, "force_allow_voting"
+    )
+    assert html.count('class="vote-up active"') == 1
+
+    thread_test_step_2(an_article)  # Adds c3 and c4, nested to c1.
+    thread_test_step_1(an_article)  # Adds c5 and c6 at level 0.
+    CommentVote.objects.create(
+        comment=XtdComment.objects.get(pk=6), author=an_user, vote="-"
+    )
+    html, more_num_queries = render_comment_list(
+        an_article, an_user, "force_allow_voting"
+    )
+    assert more_num_queries == num_queries
+    assert html.count('class="vote-up active"') == 1
+    assert html.count('class="vote-down active"') == 1
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_no_options,
+)
+def test_render_xtdcomment_list_loads_user_reactions_at_once(
+    an_article, an_user, an_user_2
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    add_user_reaction(XtdComment.objects.get(pk=1), an_user, "-")
+    add_user_reaction(XtdComment.objects.get(pk=1), an_user, "+")
+    add_user_reaction(XtdComment.objects.get(pk=3), an_user_2, "+")
+    html, _ = render_comment_list(an_article, an_user, "force_allow_reacting")
+    assert html.count('data-djcx-user-reactions="+,-"') == 1
+    assert html.count('data-djcx-user-reactions=""') == 1
+
+
+@pytest.mark.django_db
+def test_render_xtdcomment_list_prefetches_flags_and_reactions(
+    an_article, an_user, an_user_2
+):
+    options = "force_allow_reacting force_allow_voting"
+    thread_test_step_1(an_article)
+    add_user_reaction(XtdComment.objects.get(pk=1), an_user, "+")
+    html, num_queries = render_comment_list(an_article, an_user, options)
+    assert html.count('class="reaction"') == 1
+    assert html.count('data-djcx-action="flag"') == 2
+
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    add_user_reaction(XtdComment.objects.get(pk=3), an_user_2, "-")
+    add_user_reaction(XtdComment.objects.get(pk=5), an_user_2, "+")
+    html, more_num_queries = render_comment_list(an_article, an_user, options)
+    assert more_num_queries == num_queries
+    assert html.count('class="reaction"') == 3
+    assert html.count('data-djcx-action="flag"') == 5
+
+
+@pytest.mark.django_db
+def test_get_xtdcomment_count_reads_object_stats(an_article):
+    tmpl = Template(
+        "{% load comments_xtd %}"
+        "{% get_xtdcomment_count for object as count %}{{ count }}"
+    )
+    context = Context({"object": an_article})
+    assert tmpl.render(context) == "0"
+
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    with CaptureQueriesContext(connection) as ctx:
+        assert tmpl.render(context) == "4"
+    assert not any("COUNT(" in q["sql"] for q in ctx.captured_queries)
+
+    # Without stats the count is read from the comments table.
+    CommentObjectStats.objects.all().delete()
+    assert tmpl.render(context) == "4"
+
+
+def create_articles_with_comments(number):
+    articles = []
+    for index in range(number):
+        article = Article.objects.create(
+            title=f"Article {index}", slug=f"article-{index}", body="..."
+        )
+        for _ in range(index):
+            XtdComment.objects.create(
+                content_object=article,
+                site_id=1,
+                comment="A comment.",
+                submit_date=datetime.now(),
+            )
+        articles.append(article)
+    return articles
+
+
+@pytest.mark.django_db
+def test_get_xtdcomment_counts_runs_a_single_query():
+    articles = create_articles_with_comments(5)
+    # Remove the stats of one article to count its comments instead.
+    CommentObjectStats.objects.filter(object_pk=articles[3].pk).delete()
+    tmpl = Template(
+        "{% load comments_xtd %}"
+        "{% get_xtdcomment_counts for object_list as counts %}"
+        "{% for object in object_list %}"
+        "{{ object.slug }}={{ counts|count_for:object }} "
+        "{% endfor %}"
+    )
+    context = Context({"object_list": Article.objects.order_by("pk")})
+    Site.objects.get_current()  # Cache the current site.
+    with CaptureQueriesContext(connection) as ctx:
+        html = tmpl.render(context)
+    assert html == (
+        "article-0=0 article-1=1 article-2=2 article-3=3 article-4=4 "
+    )
+    # Articles, stats, and comments of articles without stats.
+    assert len(ctx.captured_queries) == 3
+
+
+def test_get_xtdcomment_counts_with_wrong_syntax():
+    with pytest.raises(TemplateSyntaxError):
+        Template(
+            "{% load comments_xtd %}"
+            "{% get_xtdcomment_counts object_list as counts %}"
+        )
+
+
+@pytest.mark.django_db
+def test_get_xtdcomment_counts_with_an_empty_list():
+    tmpl = Template(
+        "{% load comments_xtd %}"
+        "{% get_xtdcomment_counts for object_list as counts %}{{ counts }}"
+    )
+    assert tmpl.render(Context({"object_list": []})) == "{}"
+
+
+app_model_config_all_options = {
+    "default": {
+        "who_can_post": "all",
+        "comments_flagging_enabled": True,
+        "comments_reacting_enabled": True,
+        "comments_voting_enabled": True,
+        "max_thread_level": 3,
+    },
+}
+
+
+@pytest.fixture
+def list_cache():
+    cache = get_list_cache()
+    cache.clear()
+    with patch.multiple(
+        "django_comments_xtd.conf.settings",
+        COMMENTS_XTD_LIST_CACHE_TIMEOUT=60,
+        COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_all_options,
+    ):
+        yield cache
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_render_xtdcomment_list_caches_list_for_anonymous_users(
+    an_article, an_user, list_cache
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    html, num_queries = render_comment_list(an_article, AnonymousUser())
+    cached_html, cached_num_queries = render_comment_list(
+        an_article, AnonymousUser()
+    )
+    assert cached_html == html
+    assert cached_num_queries < num_queries
+    assert html.count('class="comment-box') == 4
+
+    # A new comment discards the cached list.
+    thread_test_step_3(an_article)
+    html, _ = render_comment_list(an_article, AnonymousUser())
+    assert html.count('class="comment-box') == 5
+
+    # So does a reaction.
+    add_user_reaction(XtdComment.objects.get(pk=1), an_user, "+")
+    html, _ = render_comment_list(an_article, AnonymousUser())
+    assert html.count('class="reaction"') == 1
+
+    # And a vote.
+    comment = XtdComment.objects.get(pk=1)
+    version = get_list_version(
+        comment.content_type_id, comment.object_pk, comment.site_id
+    )
+    CommentVote.objects.create(comment=comment, author=an_user, vote="+")
+    assert version != get_list_version(
+        comment.content_type_id, comment.object_pk, comment.site_id
+    )
+
+
+@pytest.mark.django_db
+def test_render_xtdcomment_list_caches_list_for_users(
+    an_article, an_user, an_user_2, list_cache
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    add_user_reaction(XtdComment.objects.get(pk=3), an_user, "+")
+    CommentVote.objects.create(
+        comment=XtdComment.objects.get(pk=1), author=an_user, vote="+"
+    )
+    CommentFlag.objects.create(
+        comment=XtdComment.objects.get(pk=2),
+        user=an_user,
+        flag=CommentFlag.SUGGEST_REMOVAL,
+    )
+    with patch.multiple(
+        "django_comments_xtd.conf.settings", COMMENTS_XTD_LIST_CACHE_TIMEOUT=0
+    ):
+        html, _ = render_comment_list(an_article, an_user)
+        html_2, num_queries = render_comment_list(an_article, an_user_2)
+    assert 'data-djcx-user-reactions="+"' in html
+    assert "vote-up active" in html
+    assert "You have flagged this comment" in html
+
+    # The list is shared by both users, with the feedback of each one.
+    assert render_comment_list(an_article, an_user_2)[0] == html_2
+    cached_html, _ = render_comment_list(an_article, an_user)
+    cached_html_2, cached_num_queries = render_comment_list(
+        an_article, an_user_2
+    )
+    assert cached_html == html
+    assert cached_html_2 == html_2
+    assert cached_num_queries < num_queries
+    assert "djcx-user-feedback" not in cached_html
+
+
+@pytest.mark.django_db
+def test_render_xtdcomment_list_replaces_csrf_token_in_cached_list(
+    an_article, list_cache
+):
+    thread_test_step_1(an_article)
+    # The test theme renders a form with the CSRF token per comment.
+    options = "with comments_theme='with_csrf_token'"
+    html, _ = render_comment_list(an_article, AnonymousUser(), options)
+    cached_html, _ = render_comment_list(an_article, AnonymousUser(), options)
+    assert CSRF_TOKEN_PLACEHOLDER not in html
+    assert CSRF_TOKEN_PLACEHOLDER not in cached_html
+    assert html.count('name="csrfmiddlewaretoken"') == 2
+    assert cached_html.count('name="csrfmiddlewaretoken"') == 2
+    # Each request gets its own CSRF token.
+    assert cached_html != html
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_LIST_MAX_REPLIES=1,
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_all_options,
+)
+def test_render_xtdcomment_list_renders_max_replies_per_thread(
+    an_article, an_user
+):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    thread_test_step_5(an_article)
+    thread_test_step_6(an_article)
+    # Thread 1: c1, c3, c8, c11, c4, c7, c10; thread 2: c2, c5, c6; c9.
+    html, _ = render_comment_list(an_article, an_user)
+    # The first direct reply of each thread with all its nested replies.
+    for cid in [1, 3, 8, 11, 2, 5, 6, 9]:
+        assert f'id="comment-{cid}"' in html
+    for cid in [4, 7, 10]:
+        assert f'id="comment-{cid}"' not in html
+    assert 'id="more-replies-1"' in html
+    assert "/comments/replies/1/?offset=1" in html
+    assert "Show 3 more replies" in html
+    assert 'id="more-replies-2"' not in html
+    assert 'id="more-replies-9"' not in html
+
+    # Comments not listed are not counted as replies left.
+    XtdComment.objects.filter(pk=10).update(is_public=False)
+    html, _ = render_comment_list(an_article, an_user)
+    assert "Show 2 more replies" in html
+    XtdComment.objects.filter(pk__in=[4, 7]).update(is_public=False)
+    html, _ = render_comment_list(an_article, an_user)
+    assert 'id="more-replies-1"' not in html
@@ -0,0 +1,250 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_comments_xtd import get_tree_backend
+from django_comments_xtd.models import XtdComment
+from django_comments_xtd.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+    thread_test_step_3,
+    thread_test_step_4,
+    thread_test_step_5,
+    thread_test_step_6,
+)
+from django_comments_xtd.tree import OrderTreeBackend, PathTreeBackend
+
+path_backend = "django_comments_xtd.tree.PathTreeBackend"
+
+
+def create_threads(article):
+    thread_test_step_1(article)
+    thread_test_step_2(article)
+    thread_test_step_3(article)
+    thread_test_step_4(article)
+    thread_test_step_5(article)
+    thread_test_step_6(article)
+
+
+def get_nested_count_map():
+    return dict(XtdComment.objects.values_list("pk", "nested_count"))
+
+
+def test_get_tree_backend_returns_order_tree_backend_by_default():
+    assert isinstance(get_tree_backend(), OrderTreeBackend)
+
+
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_get_tree_backend_returns_the_backend_in_settings():
+    assert isinstance(get_tree_backend(), PathTreeBackend)
+
+
+def test_translate_list_order():
+    list_order = ("-thread__score", "thread__id", "order")
+    assert OrderTreeBackend().translate_list_order(list_order) == list_order
+    assert PathTreeBackend().translate_list_order(list_order) == (
+        "-thread__score",
+        "thread__id",
+        "path",
+    )
+    assert PathTreeBackend().translate_list_order(("-order",)) == ("-path",)
+
+
+@pytest.mark.django_db
+def test_order_backend_deleting_comment_keeps_nested_count_of_non_ancestors(
+    an_article,
+):
+    create_threads(an_article)
+    XtdComment.objects.get(pk=7).delete()
+
+    nested_count = get_nested_count_map()
+    assert nested_count[1] == 4
+    assert nested_count[3] == 2  # c3 is not an ancestor of c7.
+    assert nested_count[4] == 0
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_path_backend_builds_the_same_threads(an_article):
+    create_threads(an_article)
+
+    # Comments are listed by ("thread__id", "path").
+    assert [cm.id for cm in XtdComment.objects.all()] == [
+        1,
+        3,
+        8,
+        11,
+        4,
+        7,
+        10,
+        2,
+        5,
+        6,
+        9,
+    ]
+    c11 = XtdComment.objects.get(pk=11)
+    assert c11.path == "0000000001/0000000003/0000000008/0000000011"
+    assert c11.level == 3
+    assert c11.thread_id == 1
+    assert get_nested_count_map() == {
+        1: 6,
+        2: 2,
+        3: 2,
+        4: 2,
+        5: 1,
+        6: 0,
+        7: 1,
+        8: 1,
+        9: 0,
+        10: 0,
+        11: 0,
+    }
+    # The `order` field is left untouched.
+    assert set(XtdComment.objects.values_list("order", flat=True)) == {1}
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_path_backend_posts_replies_in_constant_queries(an_article):
+    create_threads(an_article)
+    kwargs = {
+        "content_type": XtdComment.objects.get(pk=1).content_type,
+        "object_pk": an_article.id,
+        "site_id": 1,
+        "submit_date": datetime.now(),
+    }
+    with CaptureQueriesContext(connection) as ctx_level_1:
+        XtdComment.objects.create(comment="c12.c1", parent_id=1, **kwargs)
+    with CaptureQueriesContext(connection) as ctx_level_3:
+        XtdComment.objects.create(comment="c13.c8", parent_id=8, **kwargs)
+    assert len(ctx_level_1.captured_queries) == len(
+        ctx_level_3.captured_queries
+    )
+    assert get_nested_count_map()[1] == 8
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_path_backend_get_descendants_and_ancestors(an_article):
+    create_threads(an_article)
+    tree_backend = get_tree_backend()
+    c3 = XtdComment.objects.get(pk=3)
+    assert [cm.id for cm in tree_backend.get_descendants(c3)] == [8, 11]
+    c10 = XtdComment.objects.get(pk=10)
+    assert tree_backend.get_ancestor_ids(c10) == [1, 4, 7]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_path_backend_deleting_comment_removes_its_subtree(an_article):
+    create_threads(an_article)
+    XtdComment.objects.get(pk=7).delete()
+
+    for cid in [7, 10]:
+        with pytest.raises(XtdComment.DoesNotExist):
+            XtdComment.objects.get(pk=cid)
+    nested_count = get_nested_count_map()
+    assert nested_count[1] == 4
+    assert nested_count[3] == 2
+    assert nested_count[4] == 0
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_TREE_BACKEND=path_backend
+)
+def test_path_backend_withholding_comment_withholds_its_subtree(an_article):
+    create_threads(an_article)
+    c4 = XtdComment.objects.get(pk=4)
+    c4.is_public = False
+    c4.save()
+
+    assert list(
+        XtdComment.objects.filter(is_public=False).values_list("pk", flat=True)
+    ) == [4, 7, 10]
+    assert get_nested_count_map()[1] == 4
+
+    c4.is_public = True
+    c4.save()
+    assert XtdComment.objects.filter(is_public=False).count() == 0
+    assert get_nested_count_map()[1] == 6
+
+
+app_model_config_deep_threads = {
+    "default": {
+        "who_can_post": "all",
+        "max_thread_level": 6,
+    }
+}
+
+
+def post_reply_chain(article, length):
+    """Posts a top level comment followed by `length` nested replies."""
+    kwargs = {
+        "content_type": XtdComment.objects.get(pk=1).content_type,
+        "object_pk": article.id,
+        "site_id": 1,
+        "submit_date": datetime.now(),
+    }
+    queries = []
+    comment = XtdComment.objects.create(comment="root", **kwargs)
+    for _ in range(length):
+        with CaptureQueriesContext(connection) as ctx:
+            comment = XtdComment.objects.create(
+                comment="reply", parent_id=comment.id, **kwargs
+            )
+        queries.append(len(ctx.captured_queries))
+    return comment, queries
+
+
+def check_deep_reply_chain(article):
+    thread_test_step_1(article)
+    comment, queries = post_reply_chain(article, 6)
+
+    # Posting a reply takes the same number of queries at every level.
+    assert len(set(queries)) == 1
+    assert comment.level == 6
+    assert get_tree_backend().get_ancestor_ids(comment) == list(
+        range(comment.id - 6, comment.id)
+    )
+    assert list(
+        XtdComment.objects.filter(thread=comment.thread).values_list(
+            "nested_count", flat=True
+        )
+    ) == [6, 5, 4, 3, 2, 1, 0]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_deep_threads,
+)
+def test_order_backend_updates_ancestors_with_recursive_query(an_article):
+    with CaptureQueriesContext(connection) as ctx:
+        check_deep_reply_chain(an_article)
+    assert any("WITH RECURSIVE" in q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_deep_threads,
+)
+@patch.object(OrderTreeBackend, "recursive_cte_vendors", ())
+def test_order_backend_updates_ancestors_without_recursive_query(an_article):
+    with CaptureQueriesContext(connection) as ctx:
+        check_deep_reply_chain(an_article)
+    assert not any("WITH RECURSIVE" in q["sql"] for q in ctx.captured_queries)
@@ -1,23 +1,74 @@
-from unittest.mock import Mock
+import smtplib
+from unittest.mock import Mock, patch
 
 import pytest
 from django.contrib.contenttypes.models import ContentType
 
 from django_comments_xtd import utils
+from django_comments_xtd.models import XtdComment
 from django_comments_xtd.tests import models
+from django_comments_xtd.tests.test_models import (
+    thread_test_step_1,
+    thread_test_step_2,
+    thread_test_step_3,
+    thread_test_step_4,
+)
 
 
 @pytest.mark.django_db
-def test_send_mail_uses_EmailThread(monkeypatch):
+def test_send_mail_uses_the_email_executor(monkeypatch, mailoutbox):
     monkeypatch.setattr(utils.settings, "COMMENTS_XTD_THREADED_EMAILS", True)
-    utils.send_mail(
+    future = utils.send_mail(
         "the subject",
         "the message",
         "helpdesk@example.com",
         ["fulanito@example.com"],
         html="<p>The message.</p>",
     )
-    assert utils.mail_sent_queue.get() is True
+    assert future.result() == 1
+    assert utils.get_email_executor() is utils.get_email_executor()
+    utils.shutdown_email_executor()
+    assert len(mailoutbox) == 1
+    assert mailoutbox[0].alternatives[0][0] == "<p>The message.</p>"
+
+
+def get_test_message(to="fulanito@example.com"):
+    return utils.get_email_message(
+        "the subject", "the message", "helpdesk@example.com", [to]
+    )
+
+
+def test_EmailExecutor_reuses_one_connection_per_thread(mailoutbox):
+    executor = utils.EmailExecutor(max_workers=1, max_queue_size=1)
+    with patch.object(
+        utils, "get_connection", wraps=utils.get_connection
+    ) as mock_get_connection:
+        futures = [executor.submit(get_test_message()) for _ in range(3)]
+        assert [future.result() for future in futures] == [1, 1, 1]
+    connection = next(iter(executor._connections))
+    with patch.object(connection, "close") as mock_close:
+        executor.shutdown()
+    assert mock_get_connection.call_count == 1
+    assert mock_close.call_count == 1
+    assert len(mailoutbox) == 3
+
+
+def test_EmailExecutor_reconnects_when_the_server_disconnects(mailoutbox):
+    executor = utils.EmailExecutor(max_workers=1, max_queue_size=1)
+    backend = "django.core.mail.backends.locmem.EmailBackend.send_messages"
+    with patch(backend, autospec=True) as mock_send_messages:
+        mock_send_messages.side_effect = [smtplib.SMTPServerDisconnected, 1]
+        assert executor.submit(get_test_message()).result() == 1
+        connections = {call.args[0] for call in mock_send_messages.mock_calls}
+        assert len(connections) == 2
+
+        mock_send_messages.side_effect = smtplib.SMTPRecipientsRefused({})
+        future = executor.submit(get_test_message())
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            future.result()
+        future = executor.submit(get_test_message(), fail_silently=True)
+        assert future.result() == 0
+    executor.shutdown()
 
 
 @pytest.mark.django_db
@@ -206,3 +257,19 @@ def test_get_user_gravatar_for_comment(an_articles_comment):
 def test_redirect_to_with_comment(an_articles_comment):
     http_response = utils.redirect_to(an_articles_comment)
     assert http_response.url == an_articles_comment.get_absolute_url()
+
+
+@pytest.mark.django_db
+def test_get_nested_comments_map(an_article):
+    thread_test_step_1(an_article)
+    thread_test_step_2(an_article)
+    thread_test_step_3(an_article)
+    thread_test_step_4(an_article)
+    comment_list = list(XtdComment.objects.all())
+    nested_map = utils.get_nested_comments_map(comment_list)
+
+    assert [cm.id for cm in nested_map[1]] == [3, 4]
+    assert [cm.id for cm in nested_map[2]] == [5]
+    assert [cm.id for cm in nested_map[4]] == [7]
+    assert [cm.id for cm in nested_map[5]] == [6]
+    assert 3 not in nested_map
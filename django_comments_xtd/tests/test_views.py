@@ -1,21 +1,30 @@
+import json
 import random
 import re
 import string
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 import django_comments
 import pytest
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sites.models import Site
 from django.http import Http404
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 
-from django_comments_xtd import signals, signed, views
+from django_comments_xtd import signals, signed, utils, views
 from django_comments_xtd.conf import settings
-from django_comments_xtd.models import TmpXtdComment, XtdComment
+from django_comments_xtd.models import (
+    CommentReaction,
+    CommentVote,
+    TmpXtdComment,
+    XtdComment,
+)
 from django_comments_xtd.tests.models import Article, Diary
 
 request_factory = RequestFactory()
@@ -314,6 +323,7 @@ class ConfirmCommentTestCase(TestCase):
     def setUp(self):
         patcher = patch("django_comments_xtd.views.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
         # Create random string so that it's harder for zlib to compress
         content = "".join(random.choice(string.printable) for _ in range(6096))
         self.article = Article.objects.create(
@@ -381,10 +391,12 @@ class ConfirmCommentTestCase(TestCase):
         # and redirects to the article detail page
         Site.objects.get_current().domain = "testserver"  # django bug #7743
         response = confirm_comment_url(self.key, follow=False)
-        data = signed.loads(self.key, extra_key=settings.COMMENTS_XTD_SALT)
+        data = signed.loads_comment(
+            self.key, extra_key=settings.COMMENTS_XTD_SALT
+        )
         try:
             comment = XtdComment.objects.get(
-                content_type=data["content_type"],
+                content_type=data.content_type,
                 user_name=data["user_name"],
                 user_email=data["user_email"],
                 submit_date=data["submit_date"],
@@ -660,6 +672,7 @@ class MuteFollowUpTestCase(TestCase):
         # Second comment has to send one notification (to Bob).
         patcher = patch("django_comments_xtd.views.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
         self.article = Article.objects.create(
             title="September", slug="september", body="John's September"
         )
@@ -798,6 +811,7 @@ class HTMLDisabledMailTestCase(TestCase):
         # to see wheter messages has multiparts or not.
         patcher = patch("django_comments_xtd.views.utils.send_mail")
         self.mock_mailer = patcher.start()
+        self.addCleanup(patcher.stop)
         self.article = Article.objects.create(
             title="September", slug="september", body="John's September"
         )
@@ -861,3 +875,310 @@ def test_post_view_requires_method_to_be_POST(rf):
     request._dont_enforce_csrf_checks = True
     response = views.PostCommentView.as_view()(request)
     assert response.status_code == 405
+
+
+# ---------------------------------------------------------------------
+def create_threads(article):
+    # test_models imports from this module.
+    from django_comments_xtd.tests import test_models
+
+    test_models.thread_test_step_1(article)
+    test_models.thread_test_step_2(article)
+    test_models.thread_test_step_3(article)
+    test_models.thread_test_step_4(article)
+    test_models.thread_test_step_5(article)
+    test_models.thread_test_step_6(article)
+
+
+def get_replies(rf, comment_id, offset, ajax=False):
+    headers = {"x-requested-with": "XMLHttpRequest"} if ajax else {}
+    request = rf.get(
+        reverse("comments-xtd-replies", args=[comment_id]),
+        {"offset": offset},
+        headers=headers,
+    )
+    request.user = AnonymousUser()
+    return views.RepliesView.as_view()(request, comment_id)
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings", COMMENTS_XTD_LIST_MAX_REPLIES=1
+)
+def test_replies_view_renders_the_next_replies_of_a_thread(rf, an_article):
+    from django_comments_xtd.tests import test_models
+
+    create_threads(an_article)
+    # Add c12 and c13 as replies to c1, and leave c13 out of the list.
+    test_models.thread_test_step_2(an_article)
+    XtdComment.objects.filter(pk=13).update(is_public=False)
+    # Thread 1 lists c1, c3, c8, c11, c4, c7, c10, c12.
+    response = get_replies(rf, 1, 1)
+    assert response.status_code == 200
+    html = response.rendered_content
+    for cid in [4, 7, 10]:
+        assert f'id="comment-{cid}"' in html
+    assert 'id="comment-12"' not in html
+    # The slice starts at a direct reply, and keeps the nested ones.
+    assert [cm.id for cm in response.context_data["reply_list"]] == [4]
+    assert "/comments/replies/1/?offset=2" in html
+    assert "Show one more reply" in html
+
+    response = get_replies(rf, 1, 2, ajax=True)
+    data = json.loads(response.content)
+    assert data["offset"] == 3
+    assert data["count"] == 0
+    assert 'id="comment-12"' in data["html"]
+    assert 'id="comment-13"' not in data["html"]
+    assert "more-replies" not in data["html"]
+
+
+@pytest.mark.django_db
+def test_replies_view_returns_400_on_invalid_offset(rf, an_articles_comment):
+    response = get_replies(rf, an_articles_comment.pk, "x")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_replies_view_raises_404_for_nested_comments(rf, an_article):
+    create_threads(an_article)
+    with pytest.raises(Http404):
+        get_replies(rf, 3, 0)
+
+
+app_model_config_feedback = {
+    "default": {
+        "who_can_post": "all",
+        "comments_reacting_enabled": True,
+        "comments_voting_enabled": True,
+    }
+}
+
+
+def post_feedback(rf, view_class, name, comment_id, data, user):
+    request = rf.post(
+        reverse(name, args=[comment_id]),
+        data,
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+    )
+
+    async def auser():
+        return user
+
+    def get_user():
+        raise AssertionError("request.user is read before auser()")
+
+    # As with AuthenticationMiddleware, request.user is lazy.
+    request.user = SimpleLazyObject(get_user)
+    request.auser = auser
+    request.session = SessionStore()
+    request._dont_enforce_csrf_checks = True
+    return async_to_sync(view_class.as_view())(request, comment_id)
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_feedback,
+)
+def test_AsyncReactToCommentView_adds_and_removes_reactions(
+    rf, an_articles_comment, an_user, an_user_2
+):
+    args = (
+        rf,
+        views.AsyncReactToCommentView,
+        "comments-xtd-react",
+        an_articles_comment.pk,
+        {"reaction": "+"},
+    )
+    assert post_feedback(*args, an_user).status_code == 201
+    assert post_feedback(*args, an_user_2).status_code == 200
+    reaction = CommentReaction.objects.get(comment=an_articles_comment)
+    assert reaction.counter == 2
+    assert reaction.authors.count() == 2
+
+    assert post_feedback(*args, an_user).status_code == 200
+    reaction.refresh_from_db()
+    assert reaction.counter == 1
+    assert list(reaction.authors.all()) == [an_user_2]
+
+    post_feedback(*args, an_user_2)
+    assert not CommentReaction.objects.exists()
+
+    # Anonymous users are sent to the login page.
+    response = post_feedback(*args, AnonymousUser())
+    assert response.status_code == 302
+    assert response.url.startswith(settings.LOGIN_URL)
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_feedback,
+)
+def test_AsyncReactToCommentView_recreates_reactions_deleted_meanwhile(
+    rf, an_articles_comment, an_user
+):
+    manager = CommentReaction.objects
+    aget_or_create = manager.aget_or_create
+    reactions = []
+
+    async def get_or_create(**kwargs):
+        reaction, created = await aget_or_create(**kwargs)
+        if not reactions:
+            # Another request deletes the reaction once it has been read.
+            await manager.filter(pk=reaction.pk).adelete()
+        reactions.append(reaction)
+        return reaction, created
+
+    with patch.object(manager, "aget_or_create", get_or_create):
+        response = post_feedback(
+            rf,
+            views.AsyncReactToCommentView,
+            "comments-xtd-react",
+            an_articles_comment.pk,
+            {"reaction": "+"},
+            an_user,
+        )
+    assert response.status_code == 201
+    assert len(reactions) == 2
+    reaction = CommentReaction.objects.get(comment=an_articles_comment)
+    assert reaction.counter == 1
+    assert list(reaction.authors.all()) == [an_user]
+
+
+@pytest.mark.django_db
+@patch.multiple(
+    "django_comments_xtd.conf.settings",
+    COMMENTS_XTD_APP_MODEL_CONFIG=app_model_config_feedback,
+)
+def test_AsyncVoteOnCommentView_updates_the_thread_score(
+    rf, an_articles_comment, an_user
+):
+    args = (
+        rf,
+        views.AsyncVoteOnCommentView,
+        "comments-xtd-vote",
+        an_articles_comment.pk,
+    )
+    thread = an_articles_comment.thread
+    response = post_feedback(*args, {"vote": CommentVote.POSITIVE}, an_user)
+    assert response.status_code == 201
+    thread.refresh_from_db()
+    assert thread.score == 1
+
+    # Voting the opposite replaces the vote.
+    post_feedback(*args, {"vote": CommentVote.NEGATIVE}, an_user)
+    thread.refresh_from_db()
+    assert thread.score == -1
+    assert CommentVote.objects.count() == 1
+
+    # Voting the same cancels the vote.
+    response = post_feedback(*args, {"vote": CommentVote.NEGATIVE}, an_user)
+    assert response.status_code == 200
+    thread.refresh_from_db()
+    assert thread.score == 0
+    assert not CommentVote.objects.exists()
+
+
+@pytest.mark.django_db
+def test_AsyncPostCommentView_sends_emails_in_threads(rf, an_article):
+    form = django_comments.get_form()(an_article)
+    data = {
+        "name": "Bob",
+        "email": "bob@example.com",
+        "followup": True,
+        "reply_to": 0,
+        "comment": "Es war einmal...",
+        **form.initial,
+    }
+    request = rf.post(reverse("comments-xtd-post"), data=data)
+    request.user = AnonymousUser()
+    request.auser = AsyncMock(return_value=request.user)
+    request._dont_enforce_csrf_checks = True
+
+    with patch.object(utils, "get_email_executor") as mock_get_executor:
+        view = async_to_sync(views.AsyncPostCommentView.as_view())
+        response = view(request)
+    assert response.status_code == 302
+    assert mock_get_executor.return_value.submit.call_count == 1
+    # The comment waits for the confirmation of the email address.
+    assert not XtdComment.objects.exists()
+
+
+@pytest.mark.django_db
+def test_AsyncPostCommentView_publishes_comments_of_users(
+    rf, an_article, an_user
+):
+    form = django_comments.get_form()(an_article)
+    data = {"comment": "Es war einmal...", "reply_to": 0, **form.initial}
+    request = rf.post(
+        reverse("comments-xtd-post"),
+        data=data,
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+    )
+    request.auser = AsyncMock(return_value=an_user)
+    request._dont_enforce_csrf_checks = True
+
+    view = async_to_sync(views.AsyncPostCommentView.as_view())
+    response = view(request)
+    assert response.status_code == 201
+    comment = XtdComment.objects.get()
+    assert comment.user == an_user
+    assert comment.user_email == an_user.email
+    assert comment.is_public
+
+    # The target object is read with the async ORM too.
+    data["object_pk"] = 1000
+    request = rf.post(
+        reverse("comments-xtd-post"),
+        data=data,
+        HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+    )
+    request.auser = AsyncMock(return_value=an_user)
+    request._dont_enforce_csrf_checks = True
+    assert view(request).status_code == 400
+
+
+@pytest.mark.django_db
+def test_notify_comment_followers_signs_one_key_per_follower(
+    an_article, django_assert_num_queries
+):
+    article_ct = ContentType.objects.get(app_label="tests", model="article")
+
+    def post_comment(name, **kwargs):
+        return XtdComment.objects.create(
+            content_type=article_ct,
+            object_pk=an_article.pk,
+            site_id=1,
+            user_name=name,
+            user_email=f"{name.lower()}@example.com",
+            comment=f"Comment of {name}",
+            submit_date=datetime.now(),
+            **kwargs,
+        )
+
+    for name in ["Alice", "Bob", "Alice", "Bob", "Alice"]:
+        post_comment(name, followup=True)
+    post_comment("Charlie", followup=False)
+    comment = post_comment("Dave", followup=True)
+
+    with django_assert_num_queries(1):
+        followers = list(views.get_comment_followers(comment))
+    assert [(cm.user_name, cm.pk) for cm in followers] == [
+        ("Bob", 4),
+        ("Alice", 5),
+    ]
+
+    with (
+        patch.object(utils, "send_mail") as mock_send_mail,
+        patch.object(
+            views.signed, "dumps_comment", wraps=signed.dumps_comment
+        ) as mock_dumps,
+    ):
+        views.notify_comment_followers(comment)
+    assert mock_dumps.call_count == 2
+    assert [call.args[3] for call in mock_send_mail.call_args_list] == [
+        ["bob@example.com"],
+        ["alice@example.com"],
+    ]
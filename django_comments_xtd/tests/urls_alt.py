@@ -28,6 +28,14 @@ urlpatterns = [
         name="comments-xtd-comment-reaction-authors",
     ),
     # ------------------------------------------------------------------
+    # Remap url `comments-url-redirect` to accept any object_pk:
+    #
+    re_path(
+        r"^cr/(\d+)/(.+)/(\d+)/$",
+        views.dummy_view,
+        name="comments-url-redirect",
+    ),
+    # ------------------------------------------------------------------
     path("comments/", include("django_comments_xtd.urls")),
     path(
         "api-auth/", include("rest_framework.urls", namespace="rest_framework")
@@ -0,0 +1,185 @@
+"""
+Backends to store the tree structure of the comment threads.
+
+The backend in use is given by the setting `COMMENTS_XTD_TREE_BACKEND`, and
+it is retrieved with `django_comments_xtd.get_tree_backend()`. Every backend
+keeps the fields `thread`, `parent_id`, `level` and `nested_count` of the
+comments up to date, and provides the name of the field used to list the
+comments of a thread in depth-first order.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+from django.db.models import F, Max, Min
+
+from django_comments_xtd import get_model
+
+
+class OrderTreeBackend:
+    """
+    Keeps the position of each comment within its thread in the `order`
+    field. Adding a reply shifts the `order` of the comments that follow it
+    in the thread. Implements the following approach:
+
+      http://www.sqlteam.com/article/sql-for-threaded-discussion-forums
+    """
+
+    order_field = "order"
+    # Database vendors whose ancestors are retrieved with a recursive CTE.
+    recursive_cte_vendors = ("postgresql", "mysql", "sqlite")
+
+    def translate_list_order(self, list_order):
+        """
+        Replaces the field `order` in `list_order` with the field that
+        sorts the comments of a thread with this backend.
+        """
+        if self.order_field == "order":
+            return list_order
+        translated = []
+        for field in list_order:
+            if field.lstrip("-") == "order":
+                field = field.replace("order", self.order_field)
+            translated.append(field)
+        return tuple(translated)
+
+    def add_root(self, comment):
+        """Sets the tree data of a comment that starts a new thread."""
+
+    def add_reply(self, comment, parent):
+        """Sets the tree data of `comment`, posted in reply to `parent`."""
+        comment.thread = parent.thread
+        comment.level = parent.level + 1
+        qc_eq_thread = get_model().objects.filter(thread=parent.thread)
+        qc_ge_level = qc_eq_thread.filter(
+            level__lte=parent.level, order__gt=parent.order
+        )
+        if qc_ge_level.count():
+            min_order = qc_ge_level.aggregate(Min("order"))["order__min"]
+            qc_eq_thread.filter(order__gte=min_order).update(
+                order=F("order") + 1
+            )
+            comment.order = min_order
+        else:
+            max_order = qc_eq_thread.aggregate(Max("order"))["order__max"]
+            comment.order = max_order + 1
+
+        self.update_nested_count(comment, 1)
+
+    def get_ancestor_ids(self, comment):
+        """Returns the ids of the ancestors of `comment`, root first."""
+        if comment.parent_id == comment.id:
+            return []
+        connection = connections[router.db_for_write(get_model())]
+        if connection.vendor in self.recursive_cte_vendors:
+            return self._get_ancestor_ids_with_cte(comment, connection)
+
+        # Fallback: Read the comments that might be ancestors in one query
+        # and walk up the tree in memory.
+        parents = dict(
+            get_model()
+            .objects.filter(
+                thread_id=comment.thread_id, level__lt=comment.level
+            )
+            .values_list("pk", "parent_id")
+        )
+        ancestor_ids = []
+        parent_id = comment.parent_id
+        while parent_id in parents:
+            ancestor_ids.insert(0, parent_id)
+            if parents[parent_id] == parent_id:
+                break
+            parent_id = parents[parent_id]
+        return ancestor_ids
+
+    def _get_ancestor_ids_with_cte(self, comment, connection):
+        # The fields of the tree are declared in XtdComment, that might
+        # not be the model returned by `get_model`.
+        opts = get_model()._meta.get_field("parent_id").model._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        pk = qn(opts.pk.column)
+        parent_id = qn(opts.get_field("parent_id").column)
+        level = qn(opts.get_field("level").column)
+        sql = (
+            f"WITH RECURSIVE ancestors (cid, pid, lvl) AS ("
+            f" SELECT {pk}, {parent_id}, {level} FROM {table}"
+            f" WHERE {pk} = %s"
+            f" UNION ALL"
+            f" SELECT t.{pk}, t.{parent_id}, t.{level} FROM {table} t"
+            f" INNER JOIN ancestors a ON t.{pk} = a.pid"
+            f" WHERE a.cid <> a.pid"
+            f") SELECT cid FROM ancestors ORDER BY lvl"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [comment.parent_id])
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_descendants(self, comment):
+        """Returns a queryset with all the comments nested to `comment`."""
+        # Nested comments follow `comment` in the thread, up to the next
+        # comment at the same or a lower level.
+        qs = get_model().objects.filter(
+            thread_id=comment.thread_id, order__gt=comment.order
+        )
+        next_order = qs.filter(level__lte=comment.level).aggregate(
+            Min("order")
+        )["order__min"]
+        if next_order is not None:
+            qs = qs.filter(order__lt=next_order)
+        return qs
+
+    def update_nested_count(self, comment, delta):
+        """Adds `delta` to the `nested_count` of the ancestors of `comment`."""
+        ancestor_ids = self.get_ancestor_ids(comment)
+        if ancestor_ids and delta:
+            get_model().objects.filter(pk__in=ancestor_ids).update(
+                nested_count=F("nested_count") + delta
+            )
+
+
+class PathTreeBackend(OrderTreeBackend):
+    """
+    Keeps a materialized path in the `path` field of each comment, made
+    of the zero-padded ids of its ancestors followed by its own id. Adding
+    a reply writes only the reply and its ancestors, and the descendants of
+    a comment are retrieved with a single indexed range query.
+
+    Existing comments need their `path` initialized with the management
+    command `initialize_thread_path` before enabling this backend.
+    """
+
+    order_field = "path"
+    path_separator = "/"
+    path_digits = 10
+
+    def get_path_step(self, comment_id):
+        return str(comment_id).zfill(self.path_digits)
+
+    def add_root(self, comment):
+        comment.path = self.get_path_step(comment.id)
+
+    def add_reply(self, comment, parent):
+        if not parent.path:
+            raise ImproperlyConfigured(
+                f"Comment {parent.id} has no path. Run the management "
+                "command 'initialize_thread_path' before using the "
+                "PathTreeBackend."
+            )
+        comment.thread = parent.thread
+        comment.level = parent.level + 1
+        comment.path = (
+            f"{parent.path}{self.path_separator}"
+            f"{self.get_path_step(comment.id)}"
+        )
+        self.update_nested_count(comment, 1)
+
+    def get_ancestor_ids(self, comment):
+        return [
+            int(step) for step in comment.path.split(self.path_separator)[:-1]
+        ]
+
+    def get_descendants(self, comment):
+        return get_model().objects.filter(
+            thread_id=comment.thread_id,
+            path__startswith=f"{comment.path}{self.path_separator}",
+        )
@@ -10,11 +10,21 @@ from django_comments.views.moderation import (
 from rest_framework.urlpatterns import format_suffix_patterns
 
 from django_comments_xtd import views
+from django_comments_xtd.conf import settings
+
+if settings.COMMENTS_XTD_ASYNC_VIEWS:
+    post_comment_view = views.AsyncPostCommentView.as_view()
+    react_to_comment_view = views.AsyncReactToCommentView.as_view()
+    vote_on_comment_view = views.AsyncVoteOnCommentView.as_view()
+else:
+    post_comment_view = views.PostCommentView.as_view()
+    react_to_comment_view = views.ReactToCommentView.as_view()
+    vote_on_comment_view = views.VoteOnCommentView.as_view()
 
 urlpatterns = [
     re_path(
         r"^post/$",
-        views.PostCommentView.as_view(),
+        post_comment_view,
         name="comments-xtd-post",
     ),
     re_path(r"^posted/$", comment_done, name="comments-comment-done"),
@@ -34,6 +44,16 @@ urlpatterns = [
         views.ReplyCommentView.as_view(),
         name="comments-xtd-reply",
     ),
+    re_path(
+        r"^replies/(\d+)/$",
+        views.RepliesView.as_view(),
+        name="comments-xtd-replies",
+    ),
+    re_path(
+        r"^events/(?P<content_type>\w+[-]{1}\w+)/(?P<object_pk>[-\w]+)/$",
+        views.comment_events,
+        name="comments-xtd-events",
+    ),
     # Remap comments-flag to check allow-flagging is enabled.
     re_path(
         r"^flag/(\d+)/$", views.FlagCommentView.as_view(), name="comments-flag"
@@ -45,7 +65,7 @@ urlpatterns = [
     re_path(r"^approved/$", approve_done, name="comments-approve-done"),
     re_path(
         r"^react/(\d+)/$",
-        views.ReactToCommentView.as_view(),
+        react_to_comment_view,
         name="comments-xtd-react",
     ),
     re_path(
@@ -60,7 +80,7 @@ urlpatterns = [
     ),
     re_path(
         r"^vote/(\d+)/$",
-        views.VoteOnCommentView.as_view(),
+        vote_on_comment_view,
         name="comments-xtd-vote",
     ),
     re_path(
@@ -1,11 +1,16 @@
+import atexit
+import contextvars
 import hashlib
-import queue
+import logging
+import smtplib
 import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.http.response import HttpResponseRedirect
 from django.utils.crypto import salted_hmac
 from rest_framework import status
@@ -14,53 +19,135 @@ from rest_framework.exceptions import PermissionDenied
 from django_comments_xtd.conf import settings
 from django_comments_xtd.conf.defaults import COMMENTS_XTD_APP_MODEL_CONFIG
 
-mail_sent_queue = queue.Queue()
+logger = logging.getLogger(__name__)
 
+# Set by the async views, so that the emails sent while they run
+# synchronous code are sent in threads, off the request path.
+send_mail_in_thread = contextvars.ContextVar(
+    "send_mail_in_thread", default=False
+)
 
-# Idea borrowed from Selwin Ong post:
-# http://ui.co.id/blog/asynchronous-send_mail-in-django
 
+class EmailExecutor:
+    """
+    Sends emails in a bounded pool of threads. Each thread keeps its own
+    connection to the email backend open, and reuses it for every email it
+    sends. Submitting an email blocks while `max_queue_size` emails are
+    already waiting for a thread.
+    """
 
-class EmailThread(threading.Thread):
-    def __init__(
-        self, subject, body, from_email, recipient_list, fail_silently, html
-    ):
-        self.subject = subject
-        self.body = body
-        self.recipient_list = recipient_list
-        self.from_email = from_email
-        self.fail_silently = fail_silently
-        self.html = html
-        threading.Thread.__init__(self)
-
-    def run(self):
-        _send_mail(
-            self.subject,
-            self.body,
-            self.from_email,
-            self.recipient_list,
-            self.fail_silently,
-            self.html,
+    def __init__(self, max_workers, max_queue_size):
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="djcx-email"
         )
-        mail_sent_queue.put(True)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def submit(self, msg, fail_silently=False):
+        """Sends `msg` in a thread. Returns a Future."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._send, msg, fail_silently)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Error sending email.", exc_info=future.exception())
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = get_connection()
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.add(connection)
+        return connection
+
+    def _close_connection(self):
+        connection = self._local.__dict__.pop("connection", None)
+        if connection is not None:
+            with self._lock:
+                self._connections.discard(connection)
+            connection.close()
+
+    def _send(self, msg, fail_silently):
+        try:
+            try:
+                return self._get_connection().send_messages([msg])
+            except smtplib.SMTPServerDisconnected:
+                # The server closed the idle connection, use a new one.
+                self._close_connection()
+                return self._get_connection().send_messages([msg])
+        except (smtplib.SMTPException, OSError):
+            self._close_connection()
+            if not fail_silently:
+                raise
+            return 0
+
+    def shutdown(self, wait=True):
+        """Waits for the queued emails, then closes the connections."""
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            connection.close()
+
+
+_email_executor = None
+_email_executor_lock = threading.Lock()
+
+
+def get_email_executor():
+    """Returns the process-wide EmailExecutor, creating it on first use."""
+    global _email_executor
+    with _email_executor_lock:
+        if _email_executor is None:
+            _email_executor = EmailExecutor(
+                settings.COMMENTS_XTD_EMAIL_WORKERS,
+                settings.COMMENTS_XTD_EMAIL_QUEUE_SIZE,
+            )
+            atexit.register(shutdown_email_executor)
+        return _email_executor
+
+
+def shutdown_email_executor(wait=True):
+    """Sends the queued emails and stops the process-wide EmailExecutor."""
+    global _email_executor
+    with _email_executor_lock:
+        executor, _email_executor = _email_executor, None
+    if executor is not None:
+        atexit.unregister(shutdown_email_executor)
+        executor.shutdown(wait=wait)
+
+
+def get_email_message(subject, body, from_email, recipient_list, html=None):
+    msg = EmailMultiAlternatives(subject, body, from_email, recipient_list)
+    if html:
+        msg.attach_alternative(html, "text/html")
+    return msg
 
 
 def _send_mail(
     subject, body, from_email, recipient_list, fail_silently=False, html=None
 ):
-    msg = EmailMultiAlternatives(subject, body, from_email, recipient_list)
-    if html:
-        msg.attach_alternative(html, "text/html")
+    msg = get_email_message(subject, body, from_email, recipient_list, html)
     msg.send(fail_silently)
 
 
 def send_mail(
     subject, body, from_email, recipient_list, fail_silently=False, html=None
 ):
-    if settings.COMMENTS_XTD_THREADED_EMAILS:
-        EmailThread(
-            subject, body, from_email, recipient_list, fail_silently, html
-        ).start()
+    if settings.COMMENTS_XTD_THREADED_EMAILS or send_mail_in_thread.get():
+        msg = get_email_message(subject, body, from_email, recipient_list, html)
+        return get_email_executor().submit(msg, fail_silently)
     else:
         _send_mail(
             subject, body, from_email, recipient_list, fail_silently, html
@@ -86,6 +173,14 @@ def get_max_thread_level(content_type):
 
 def get_list_order(content_type=None):
     """Get tuple of fields to use in `order by` clause in comment queries."""
+    from django_comments_xtd import get_tree_backend
+
+    return get_tree_backend().translate_list_order(
+        _get_list_order_setting(content_type)
+    )
+
+
+def _get_list_order_setting(content_type=None):
     setting = settings.COMMENTS_XTD_APP_MODEL_CONFIG  # Aliasing.
 
     if content_type:
@@ -101,6 +196,18 @@ def get_list_order(content_type=None):
 
 
 # --------------------------------------------------------------------
+def get_nested_comments_map(comment_list):
+    """
+    Returns a dictionary that maps comment IDs to the list of their direct
+    replies in `comment_list`, keeping the order in which they come.
+    """
+    nested_comments_map = defaultdict(list)
+    for comment in comment_list:
+        if comment.parent_id != comment.id:
+            nested_comments_map[comment.parent_id].append(comment)
+    return dict(nested_comments_map)
+
+
 def get_app_model_config(comment=None, content_type=None):
     """
     Get the app_model_option from `COMMENTS_XTD_APP_MODEL_CONFIG`.
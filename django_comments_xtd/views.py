@@ -1,11 +1,15 @@
 # ruff: noqa: RUF012
+from contextlib import contextmanager
+from inspect import isawaitable
 from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
 from django import http
 from django.apps import apps
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import redirect_to_login
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.views import shortcut
 from django.contrib.sites.shortcuts import get_current_site
 from django.core import signing
@@ -15,12 +19,12 @@ from django.core.exceptions import (
     ValidationError,
 )
 from django.db import transaction
-from django.db.models import F
-from django.db.utils import NotSupportedError
+from django.db.models import F, Max
 from django.shortcuts import get_object_or_404, redirect, render, resolve_url
 from django.template import loader
 from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.encoding import force_str
 from django.utils.html import escape
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.module_loading import import_string
@@ -34,9 +38,11 @@ from django_comments.models import CommentFlag
 from django_comments.views.comments import CommentPostBadRequest
 
 from django_comments_xtd import (
+    events,
     get_form,
     get_model,
     get_reaction_enum,
+    get_tree_backend,
     signed,
     utils,
 )
@@ -44,9 +50,13 @@ from django_comments_xtd import signals as djcx_signals
 from django_comments_xtd.conf import settings
 from django_comments_xtd.models import (
     CommentReaction,
+    CommentReactionAuthor,
+    CommentThread,
     CommentVote,
+    FollowupNotification,
     MaxThreadLevelExceededException,
     TmpXtdComment,
+    filter_by_thread_branch,
 )
 from django_comments_xtd.templating import get_template_list
 
@@ -63,9 +73,7 @@ def send_email_confirmation_request(
 ):
     """Send email requesting comment confirmation"""
     subject = _("comment confirmation request")
-    confirmation_url = reverse(
-        "comments-xtd-confirm", args=[key.decode("utf-8")]
-    )
+    confirmation_url = reverse("comments-xtd-confirm", args=[force_str(key)])
     message_context = {
         "comment": comment,
         "confirmation_url": confirmation_url,
@@ -113,51 +121,16 @@ def create_comment(tmp_comment):
     """
     Creates an XtdComment from a TmpXtdComment.
     """
-    comment = XtdComment(**tmp_comment)
+    tmp_comment = TmpXtdComment(tmp_comment)
+    comment = XtdComment(**tmp_comment.get_model_data())
     if settings.COMMENTS_XTD_FOR_CONCRETE_MODEL is False:
-        comment.content_type = tmp_comment["content_type"]
+        comment.content_type = tmp_comment.content_type
     comment.save()
     return comment
 
 
-def notify_comment_followers(comment):
-    followers = {}
-    kwargs = {
-        "content_type": comment.content_type,
-        "object_pk": comment.object_pk,
-        "is_public": True,
-        "followup": True,
-    }
-    previous_comments = XtdComment.objects.filter(**kwargs).exclude(
-        user_email=comment.user_email
-    )
-
-    def feed_followers(gen):
-        for instance in gen:
-            followers[instance.user_email] = (
-                instance.user_name,
-                signed.dumps(
-                    instance,
-                    compress=True,
-                    extra_key=settings.COMMENTS_XTD_SALT,
-                ),
-            )
-
-    try:
-        gen = previous_comments.distinct("user_email").order_by("user_email")
-        feed_followers(gen)
-    except NotSupportedError:
-        feed_followers(previous_comments)
-
-    for instance in previous_comments:
-        followers[instance.user_email] = (
-            instance.user_name,
-            signed.dumps(
-                instance, compress=True, extra_key=settings.COMMENTS_XTD_SALT
-            ),
-        )
-
-    subject = _("new comment posted")
+def get_followup_templates():
+    """Returns the text and the html templates of follow-up emails."""
     text_message_template = loader.get_template(
         "comments/email_followup_comment.txt"
     )
@@ -165,27 +138,85 @@ def notify_comment_followers(comment):
         html_message_template = loader.get_template(
             "comments/email_followup_comment.html"
         )
+    else:
+        html_message_template = None
+    return text_message_template, html_message_template
 
-    for email, (name, key) in followers.items():
-        mute_url = reverse("comments-xtd-mute", args=[key.decode("utf-8")])
-        message_context = {
-            "user_name": name,
-            "comment": comment,
-            "content_object": comment.content_object,
-            "mute_url": mute_url,
-            "site": comment.site,
-        }
-        text_message = text_message_template.render(message_context)
-        if settings.COMMENTS_XTD_SEND_HTML_EMAIL:
-            html_message = html_message_template.render(message_context)
-        else:
-            html_message = None
+
+def get_followup_email(comment, follower_comment, templates=None):
+    """
+    Returns the subject, the text and the html message of the email that
+    notifies the author of `follower_comment` about the new `comment`.
+    Pass the `templates` returned by `get_followup_templates` to render
+    many emails with the same templates.
+    """
+    if templates is None:
+        templates = get_followup_templates()
+    text_message_template, html_message_template = templates
+    key = signed.dumps_comment(
+        follower_comment,
+        fields=signed.MUTE_KEY_FIELDS,
+        extra_key=settings.COMMENTS_XTD_SALT,
+    )
+    mute_url = reverse("comments-xtd-mute", args=[key])
+    message_context = {
+        "user_name": follower_comment.user_name,
+        "comment": comment,
+        "content_object": comment.content_object,
+        "mute_url": mute_url,
+        "site": comment.site,
+    }
+    text_message = text_message_template.render(message_context)
+    if html_message_template is not None:
+        html_message = html_message_template.render(message_context)
+    else:
+        html_message = None
+    return _("new comment posted"), text_message, html_message
+
+
+def get_comment_followers(comment):
+    """
+    Returns, for every other author that follows up the comments posted to
+    the object of `comment`, their last public comment with follow-up.
+    Followers are read with a single query, one comment per email address.
+    """
+    previous_comments = XtdComment.objects.filter(
+        content_type=comment.content_type,
+        object_pk=comment.object_pk,
+        is_public=True,
+        followup=True,
+    ).exclude(user_email=comment.user_email)
+    last_ids = (
+        previous_comments.order_by()
+        .values("user_email")
+        .annotate(last_id=Max("pk"))
+        .values("last_id")
+    )
+    return XtdComment.objects.filter(pk__in=last_ids).order_by("pk")
+
+
+def notify_comment_followers(comment):
+    followers = list(get_comment_followers(comment))
+
+    if settings.COMMENTS_XTD_FOLLOWUP_OUTBOX:
+        # Leave the emails to the command `send_followup_notifications`.
+        FollowupNotification.objects.bulk_create(
+            FollowupNotification(comment=comment, follower_comment=instance)
+            for instance in followers
+        )
+        return
+
+    templates = get_followup_templates()
+    for instance in followers:
+        subject, text_message, html_message = get_followup_email(
+            comment, instance, templates
+        )
         utils.send_mail(
             subject,
             text_message,
             settings.COMMENTS_XTD_FROM_EMAIL,
             [
-                email,
+                instance.user_email,
             ],
             html=html_message,
         )
@@ -193,8 +224,8 @@ def notify_comment_followers(comment):
 
 def confirm(request, key, template_discarded=None, template_moderated=None):
     try:
-        tmp_comment = signed.loads(
-            str(key), extra_key=settings.COMMENTS_XTD_SALT
+        tmp_comment = signed.loads_comment(
+            key, extra_key=settings.COMMENTS_XTD_SALT
         )
     except (ValueError, signed.BadSignature) as exc:
         return bad_request(request, exc)
@@ -320,8 +351,8 @@ def on_comment_was_posted(sender, comment, request, **kwargs):
             if comment.is_public:
                 notify_comment_followers(new_comment)
     else:
-        key = signed.dumps(
-            comment, compress=True, extra_key=settings.COMMENTS_XTD_SALT
+        key = signed.dumps_comment(
+            comment, extra_key=settings.COMMENTS_XTD_SALT
         )
         site = get_current_site(request)
         send_email_confirmation_request(comment, key, site)
@@ -392,7 +423,7 @@ class SingleTmpCommentView(DetailView):
     template_alias = None
 
     def get_object(self, key):
-        return signed.loads(str(key), extra_key=settings.COMMENTS_XTD_SALT)
+        return signed.loads_comment(key, extra_key=settings.COMMENTS_XTD_SALT)
 
     def get_template_names(self):
         if self.template_alias is None:
@@ -426,15 +457,7 @@ class SingleCommentView(CommentsParamsMixin, JsonResponseMixin, DetailView):
             pk=comment_id,
             site__pk=utils.get_current_site_id(self.request),
         )
-        self.options = utils.get_app_model_config(
-            content_type=comment.content_type
-        )
-
-        if self.check_option is not None:
-            utils.check_option(self.check_option, options=self.options)
-
-        check_input_allowed_str = self.options.pop("check_input_allowed")
-        check_func = import_string(check_input_allowed_str)
+        check_func = self.get_input_check(comment)
         target_obj = comment.content_type.get_object_for_this_type(
             pk=comment.object_pk
         )
@@ -445,6 +468,21 @@ class SingleCommentView(CommentsParamsMixin, JsonResponseMixin, DetailView):
 
         return comment
 
+    def get_input_check(self, comment):
+        """
+        Reads the options of the comment's model, checks `check_option`,
+        and returns the function that checks whether input is allowed.
+        """
+        self.options = utils.get_app_model_config(
+            content_type=comment.content_type
+        )
+
+        if self.check_option is not None:
+            utils.check_option(self.check_option, options=self.options)
+
+        check_input_allowed_str = self.options.pop("check_input_allowed")
+        return import_string(check_input_allowed_str)
+
     def get_template_names(self):
         template_alias = (
             self.template_alias_js if self.is_ajax else self.template_alias
@@ -477,15 +515,27 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
     is_ajax = False
 
     def get_target_object(self, data):
+        with self.target_object_errors(data):
+            model, object_pk = self.get_target_model(data)
+            return model._default_manager.using(self.using).get(pk=object_pk)
+
+    def get_target_model(self, data):
+        """Returns the model and the primary key of the target object."""
         ctype = data.get("content_type")
         object_pk = data.get("object_pk")
         if ctype is None or object_pk is None:
             raise BadRequestError("Missing content_type or object_pk field.")
 
         self.using = self.kwargs.get("using")
+        return apps.get_model(*ctype.split(".", 1)), object_pk
+
+    @contextmanager
+    def target_object_errors(self, data):
+        """Turns the errors reading the target object into BadRequestError."""
+        ctype = data.get("content_type")
+        object_pk = data.get("object_pk")
         try:
-            model = apps.get_model(*ctype.split(".", 1))
-            return model._default_manager.using(self.using).get(pk=object_pk)
+            yield
         except (LookupError, TypeError) as exc:
             raise BadRequestError(
                 f"Invalid content_type value: {escape(ctype)!r}"
@@ -509,14 +559,13 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
 
     def get_form_kwargs(self):
         data = self.request.POST.copy()
-        if self.request.user.is_authenticated:
+        if self.user.is_authenticated:
             if not data.get("name", ""):
                 data["name"] = (
-                    self.request.user.get_full_name()
-                    or self.request.user.get_username()
+                    self.user.get_full_name() or self.user.get_username()
                 )
             if not data.get("email", ""):
-                data["email"] = self.request.user.email
+                data["email"] = self.user.email
         return data
 
     def get_form_class(self):
@@ -527,19 +576,14 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
             form_class = self.get_form_class()
         return form_class(self.target_object, data=self.data)
 
-    def _create_comment(self, form):
-        comment = form.get_comment_object(
-            site_id=get_current_site(self.request).id
-        )
+    def get_comment_object(self, form, site_id):
+        comment = form.get_comment_object(site_id=site_id)
         comment.ip_address = self.request.META.get("REMOTE_ADDR", None) or None
-        if self.request.user.is_authenticated:
-            comment.user = self.request.user
-
-        # Signal that the comment is about to be saved.
-        responses = djc_signals.comment_will_be_posted.send(
-            sender=comment.__class__, comment=comment, request=self.request
-        )
+        if self.user.is_authenticated:
+            comment.user = self.user
+        return comment
 
+    def check_comment_will_be_posted(self, responses):
         for receiver, response in responses:
             if response is False:
                 msg = (
@@ -548,6 +592,17 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
                 )
                 raise BadRequestError(msg)
 
+    def _create_comment(self, form):
+        comment = self.get_comment_object(
+            form, get_current_site(self.request).id
+        )
+
+        # Signal that the comment is about to be saved.
+        responses = djc_signals.comment_will_be_posted.send(
+            sender=comment.__class__, comment=comment, request=self.request
+        )
+        self.check_comment_will_be_posted(responses)
+
         # Save the comment and signal that it was saved
         comment.save()
         djc_signals.comment_was_posted.send(
@@ -635,10 +690,13 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
         except (TypeError, ValueError, XtdComment.DoesNotExist):
             return self.comment_posted()
         else:
-            if self.object.is_public:
-                return self.comment_published()
-            else:
-                return self.comment_moderated()
+            return self.comment_saved_response()
+
+    def comment_saved_response(self):
+        if self.object.is_public:
+            return self.comment_published()
+        else:
+            return self.comment_moderated()
 
     def form_invalid(self, form):
         context = self.get_context_data(form=form)
@@ -715,6 +773,7 @@ class PostCommentView(CommentsParamsMixin, JsonResponseMixin, FormView):
     def post(self, request):
         self.object = None
         self.target_object = None
+        self.user = request.user
         self.data = self.get_form_kwargs()
 
         if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
@@ -749,6 +808,172 @@ class ReplyCommentView(SingleCommentView):
         return self.render_to_response(context)
 
 
+class RepliesView(DetailView):
+    """
+    Renders a slice of the replies of a thread, that `render_xtdcomment_list`
+    leaves out when `COMMENTS_XTD_LIST_MAX_REPLIES` is set. The query string
+    parameter `offset` is the number of direct replies to the top-level
+    comment already rendered, with their nested replies. Returns JSON when requested via XMLHttpRequest.
+    """
+
+    http_method_names = ["get"]
+    context_object_name = "comment"
+    template_alias = "replies"
+
+    def get_parent_comment(self, comment_id):
+        return get_object_or_404(
+            get_model(),
+            pk=comment_id,
+            level=0,
+            is_public=True,
+            site__pk=utils.get_current_site_id(self.request),
+        )
+
+    def get_template_names(self):
+        return get_template_list(
+            self.template_alias,
+            app_label=self.object.content_type.app_label,
+            model=self.object.content_type.model,
+        )
+
+    def get_reply_queryset(self):
+        content_type = self.object.content_type
+        return (
+            get_model()
+            .get_queryset(
+                content_type=content_type,
+                object_pk=self.object.object_pk,
+                site_id=self.object.site_id,
+            )
+            .filter(
+                thread_id=self.object.thread_id,
+                level__gt=0,
+                level__lte=utils.get_max_thread_level(content_type),
+            )
+        )
+
+    def get_reply_list(self, offset):
+        max_replies = (
+            settings.COMMENTS_XTD_LIST_MAX_REPLIES or self.object.nested_count
+        )
+        content_type = self.object.content_type
+        qs = self.get_reply_queryset().order_by(
+            *utils.get_list_order(content_type)
+        )
+        return list(
+            filter_by_thread_branch(qs, offset + 1, offset + 1 + max_replies)
+        )
+
+    def get_more_replies(self, offset, comment_list):
+        """
+        Returns the `offset` of the next slice and the number of replies
+        left out after `comment_list`, or None when there are none.
+        """
+        if not comment_list:
+            return None
+        # Slices end at a branch boundary, so the replies left are the
+        # ones after the last of the slice in tree order.
+        order_field = get_tree_backend().order_field
+        last = max(getattr(comment, order_field) for comment in comment_list)
+        count = (
+            self.get_reply_queryset()
+            .filter(**{f"{order_field}__gt": last})
+            .count()
+        )
+        if not count:
+            return None
+        return {"offset": offset, "count": count}
+
+    def get(self, request, comment_id):
+        self.object = self.get_parent_comment(comment_id)
+        try:
+            offset = int(request.GET.get("offset", 0))
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            return http.HttpResponseBadRequest(_("Invalid offset."))
+
+        comment_list = self.get_reply_list(offset)
+        # Replies whose parent is not in the slice start a thread.
+        comment_ids = {comment.id for comment in comment_list}
+        reply_list = [
+            comment
+            for comment in comment_list
+            if comment.parent_id not in comment_ids
+        ]
+        offset += sum(1 for comment in comment_list if comment.level == 1)
+        more_replies = self.get_more_replies(offset, comment_list)
+
+        content_type = self.object.content_type
+        options = utils.get_app_model_config(content_type=content_type)
+        check_func = import_string(options.pop("check_input_allowed"))
+        target_obj = content_type.get_object_for_this_type(
+            pk=self.object.object_pk
+        )
+        options["max_thread_level"] = utils.get_max_thread_level(content_type)
+        context = self.get_context_data(
+            comments_input_allowed=check_func(target_obj),
+            comment_list=comment_list,
+            reply_list=reply_list,
+            nested_comments_map=utils.get_nested_comments_map(comment_list),
+            more_replies=more_replies,
+            **options,
+        )
+
+        if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
+            html = loader.render_to_string(
+                self.get_template_names(), context, request
+            )
+            return http.JsonResponse(
+                {
+                    "html": html.strip(),
+                    "offset": offset,
+                    "count": more_replies["count"] if more_replies else 0,
+                }
+            )
+        return self.render_to_response(context)
+
+
+async def comment_events(request, content_type, object_pk):
+    """
+    Streams the live events of the comments posted to an object, using
+    Server-Sent Events. Comments are not read from the database: clients
+    wait for the events published to the broker in settings.
+    """
+    broker = events.get_broker()
+    if broker is None:
+        raise http.Http404(_("Comment events are disabled."))
+    app_label, model = content_type.split("-")
+    try:
+        ctype = await sync_to_async(ContentType.objects.get_by_natural_key)(
+            app_label, model
+        )
+    except ContentType.DoesNotExist as exc:
+        raise http.Http404(_("Unknown content type.")) from exc
+    site_id = await sync_to_async(utils.get_current_site_id)(request)
+    channel = events.get_channel(ctype.pk, object_pk, site_id)
+
+    async def stream():
+        # Tell the client to wait a few seconds before reconnecting.
+        yield "retry: 3000\n\n"
+        listener = broker.listen(
+            channel, settings.COMMENTS_XTD_EVENTS_KEEPALIVE
+        )
+        try:
+            async for message in listener:
+                yield ": keep-alive\n\n" if message is None else message
+        finally:
+            await listener.aclose()
+
+    response = http.StreamingHttpResponse(
+        stream(), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Disable the buffering of the response in nginx.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class MuteCommentView(SingleTmpCommentView):
     """Implements the GET request to disable notifications on new comments."""
 
@@ -910,6 +1135,13 @@ class ReactToCommentView(SingleCommentView):
         )
         return created, operation
 
+    def ajax_response(self, created):
+        self.is_ajax = True
+        template_list = self.get_template_names()
+        context = self.get_context_data()
+        status = 201 if created else 200
+        return self.json_response(template_list, context, status)
+
     def get(self, request, comment_id, next=None, **kwargs):
         self.object = self.get_object(comment_id)
         user_reactions_qs = CommentReaction.objects.filter(
@@ -934,11 +1166,7 @@ class ReactToCommentView(SingleCommentView):
             created, operation = self.perform_react()
 
         if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
-            self.is_ajax = True
-            template_list = self.get_template_names()
-            context = self.get_context_data()
-            status = 201 if created else 200
-            return self.json_response(template_list, context, status)
+            return self.ajax_response(created)
 
         if next is None and self.skip_done:
             next = self.object.get_absolute_url()
@@ -998,7 +1226,9 @@ class CommentReactionUserListView(ListView):
 
         self.object_list = self.get_queryset()
 
-        max_users_in_tooltip = settings.COMMENTS_INK_MAX_USERS_IN_TOOLTIP
+        max_users_in_tooltip = getattr(
+            settings, "COMMENTS_XTD_MAX_USERS_IN_TOOLTIP", 10
+        )
         if self.object_list.count() <= max_users_in_tooltip:
             raise http.Http404(_("Not enough users"))
 
@@ -1065,6 +1295,13 @@ class VoteOnCommentView(SingleCommentView):
         )
         return created
 
+    def ajax_response(self, created, **kwargs):
+        self.is_ajax = True
+        template_list = self.get_template_names()
+        context = self.get_context_data(**kwargs)
+        status = 201 if created else 200
+        return self.json_response(template_list, context, status)
+
     def get(self, request, comment_id, next=None, **kwargs):
         self.object = self.get_object(comment_id)
         user_votes_qs = CommentVote.objects.filter(
@@ -1086,12 +1323,8 @@ class VoteOnCommentView(SingleCommentView):
             created = self.perform_vote()
 
         if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
-            self.is_ajax = True
             request.session["djcx_highlight_cid"] = int(comment_id)
-            template_list = self.get_template_names()
-            context = self.get_context_data(**kwargs)
-            status = 201 if created else 200
-            return self.json_response(template_list, context, status)
+            return self.ajax_response(created, **kwargs)
 
         if next is None and self.skip_done:
             next = self.object.get_absolute_url()
@@ -1120,3 +1353,284 @@ class VoteOnCommentDoneView(SingleCommentView):
         self.object = self.get_object(comment_id)
         context = self.get_context_data(object=self.object)
         return self.render_to_response(context)
+
+
+# ---------------------------------------------------------------------
+# Async views, for projects served with ASGI. See COMMENTS_XTD_ASYNC_VIEWS.
+
+
+class AsyncViewMixin:
+    """
+    Dispatch to async handlers. Sync code run by the handlers sends emails
+    in threads, off the request path.
+
+    The user is read with the async ORM before dispatching, as the sync
+    decorators of the parent views, like `login_required`, read
+    `request.user`, and may return a response instead of a coroutine.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        token = utils.send_mail_in_thread.set(True)
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+            return response
+        finally:
+            utils.send_mail_in_thread.reset(token)
+
+    async def aset_session(self, key, value):
+        # SessionBase.aset() is only available from Django 5.1.
+        await sync_to_async(self.request.session.__setitem__)(key, value)
+
+
+class AsyncSingleCommentMixin(AsyncViewMixin):
+    """
+    Read the comment of a `SingleCommentView` with the async ORM. Pages are
+    rendered in a thread, as templates may read related objects.
+    """
+
+    async def aget_object(self, comment_id):
+        site_id = await sync_to_async(utils.get_current_site_id)(self.request)
+        try:
+            comment = await self.model.objects.select_related(
+                "content_type", "thread"
+            ).aget(pk=comment_id, site__pk=site_id)
+        except self.model.DoesNotExist as exc:
+            raise http.Http404(_("No comment found.")) from exc
+        check_func = self.get_input_check(comment)
+        model = comment.content_type.model_class()
+        target_obj = await model._base_manager.aget(pk=comment.object_pk)
+        self.is_input_allowed = await sync_to_async(check_func)(target_obj)
+
+        if not self.is_input_allowed:
+            raise http.Http404(_("Input is not allowed."))
+
+        return comment
+
+    async def get(self, request, *args, **kwargs):
+        return await sync_to_async(super().get)(request, *args, **kwargs)
+
+
+@method_decorator(csrf_protect, name="dispatch")
+class AsyncPostCommentView(AsyncViewMixin, PostCommentView):
+    """
+    Async counterpart of `PostCommentView`, built on the async ORM. The
+    signals of django-comments are sent with `asend`, so their receivers,
+    like the moderators and `on_comment_was_posted` that creates the
+    comment, run in a thread when they are sync. Forms with errors and
+    previews are rendered in a thread too.
+    """
+
+    async def aget_target_object(self, data):
+        with self.target_object_errors(data):
+            model, object_pk = self.get_target_model(data)
+            manager = model._default_manager.using(self.using)
+            return await manager.aget(pk=object_pk)
+
+    async def acreate_comment(self, form):
+        site_id = await sync_to_async(utils.get_current_site_id)(self.request)
+        # The form reads the content type and the target with the sync ORM.
+        comment = await sync_to_async(self.get_comment_object)(form, site_id)
+
+        # Signal that the comment is about to be saved.
+        responses = await djc_signals.comment_will_be_posted.asend(
+            sender=comment.__class__, comment=comment, request=self.request
+        )
+        self.check_comment_will_be_posted(responses)
+
+        # Save the comment and signal that it was saved
+        await comment.asave()
+        await djc_signals.comment_was_posted.asend(
+            sender=comment.__class__, comment=comment, request=self.request
+        )
+        return comment
+
+    async def apost_js_response(self):
+        try:
+            self.object = await XtdComment.objects.select_related(
+                "content_type"
+            ).aget(pk=self.object._get_pk_val())
+        except (TypeError, ValueError, XtdComment.DoesNotExist):
+            return await sync_to_async(self.comment_posted)()
+        else:
+            return await sync_to_async(self.comment_saved_response)()
+
+    async def ahandle_post(self):
+        try:
+            self.target_object = await self.aget_target_object(self.data)
+        except BadRequestError as exc:
+            if not self.is_ajax:
+                return CommentPostBadRequest(exc.why)
+            context = {"error_msg": exc.why}
+            templates = get_template_list("bad_form")
+            return self.json_response(templates, context, status=400)
+
+        form = self.get_form()
+
+        if form.security_errors():
+            if not self.is_ajax:
+                return CommentPostBadRequest(
+                    "The comment form failed security verification: "
+                    f"{escape(str(form.security_errors()))}"
+                )
+            error_msg = "The comment form failed security verification."
+            context = {"error_msg": error_msg}
+            templates = get_template_list("bad_form")
+            return self.json_response(templates, context, status=400)
+
+        if not form.is_valid() or "preview" in self.data:
+            return await sync_to_async(self.form_invalid)(form)
+
+        try:
+            self.object = await self.acreate_comment(form)
+        except BadRequestError as exc:
+            if not self.is_ajax:
+                return CommentPostBadRequest(exc.why)
+            if not settings.DEBUG:  # pragma: no cover
+                msg = "Your comment has been rejected."
+            else:
+                msg = exc.why
+            templates = get_template_list("bad_form")
+            return self.json_response(templates, {"error_msg": msg}, status=400)
+
+        if self.is_ajax:
+            return await self.apost_js_response()
+        return self.form_valid(form)
+
+    async def post(self, request):
+        self.object = None
+        self.target_object = None
+        self.user = await request.auser()
+        self.data = self.get_form_kwargs()
+        self.is_ajax = (
+            request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest"
+        )
+        return await self.ahandle_post()
+
+
+@method_decorator(csrf_protect, name="dispatch")
+class AsyncReactToCommentView(AsyncSingleCommentMixin, ReactToCommentView):
+    """
+    Async counterpart of `ReactToCommentView`. The async ORM doesn't run
+    queries in transactions, so every change is a single conditional query:
+    the author is removed before the counter is decremented, and the
+    reaction is deleted only when its counter gets to 0. A reaction deleted
+    by a concurrent request is created again before adding the author.
+    """
+
+    async def aperform_react(self, user):
+        created = False  # Whether an instance of CommentReaction is created.
+        reaction = self.request.POST["reaction"]
+        creaction_qs = CommentReaction.objects.filter(
+            reaction=reaction, comment=self.object
+        )
+
+        removed, _ = await CommentReactionAuthor.objects.filter(
+            reaction__in=creaction_qs, author=user
+        ).adelete()
+        if removed:
+            await creaction_qs.aupdate(counter=F("counter") - 1)
+            await creaction_qs.filter(counter__lte=0).adelete()
+            operation = "del"
+        else:
+            updated = 0
+            while not updated:
+                manager = CommentReaction.objects
+                reaction_obj, created = await manager.aget_or_create(
+                    reaction=reaction, comment=self.object
+                )
+                updated = await CommentReaction.objects.filter(
+                    pk=reaction_obj.pk
+                ).aupdate(counter=F("counter") + 1)
+            await reaction_obj.authors.aadd(user)
+            operation = "add"
+
+        await djcx_signals.comment_got_a_reaction.asend(
+            sender=self.object.__class__,
+            comment=self.object,
+            reaction=reaction,
+            created=created,
+            operation=operation,
+            request=self.request,
+        )
+        return created, operation
+
+    async def post(self, request, comment_id, next=None, **kwargs):
+        self.object = await self.aget_object(comment_id)
+        created, operation = await self.aperform_react(await request.auser())
+
+        if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
+            return await sync_to_async(self.ajax_response)(created)
+
+        if next is None and self.skip_done:
+            next = self.object.get_absolute_url()
+
+        next_redirect_url = self.get_next_redirect_url(
+            next or "comments-xtd-react-done",
+            c=self.object.pk,
+        )
+        await self.aset_session("reaction_op", operation)
+        return http.HttpResponseRedirect(next_redirect_url)
+
+
+@method_decorator(csrf_protect, name="dispatch")
+class AsyncVoteOnCommentView(AsyncSingleCommentMixin, VoteOnCommentView):
+    """
+    Async counterpart of `VoteOnCommentView`. The async ORM doesn't run
+    queries in transactions, so the score is updated with an F expression.
+    """
+
+    async def aget_object(self, comment_id):
+        comment = await super().aget_object(comment_id)
+        if comment.level > 0:
+            raise http.Http404("Input is not allowed")
+        return comment
+
+    async def aperform_vote(self, user):
+        vote = self.request.POST["vote"]
+        vote_obj, created = await CommentVote.objects.aget_or_create(
+            vote=vote, comment=self.object, author=user
+        )
+
+        if created:
+            delta = CommentVote.VALUE[vote]
+            deleted, _ = await CommentVote.objects.filter(
+                vote=INVERSE_VOTE[vote], comment=self.object, author=user
+            ).adelete()
+            if deleted:
+                delta += VOTE_VALUE[vote]
+        else:
+            delta = -VOTE_VALUE[vote]
+            await vote_obj.adelete()
+
+        await CommentThread.objects.filter(pk=self.object.thread_id).aupdate(
+            score=F("score") + delta
+        )
+        await self.object.thread.arefresh_from_db(fields=["score"])
+
+        await djcx_signals.comment_got_a_vote.asend(
+            sender=self.object.__class__,
+            comment=self.object,
+            vote=vote,
+            created=created,
+            request=self.request,
+        )
+        return created
+
+    async def post(self, request, comment_id, next=None, **kwargs):
+        self.object = await self.aget_object(comment_id)
+        created = await self.aperform_vote(await request.auser())
+
+        if request.META.get("HTTP_X_REQUESTED_WITH") == "XMLHttpRequest":
+            await self.aset_session("djcx_highlight_cid", int(comment_id))
+            return await sync_to_async(self.ajax_response)(created, **kwargs)
+
+        if next is None and self.skip_done:
+            next = self.object.get_absolute_url()
+
+        next_redirect_url = self.get_next_redirect_url(
+            next or "comments-xtd-vote-done", c=self.object.pk
+        )
+        return http.HttpResponseRedirect(next_redirect_url)